@@ -20,6 +20,10 @@ def create_app():
     app.config['SUPABASE_URL'] = os.getenv('SUPABASE_URL')
     app.config['SUPABASE_JWT_SECRET'] = os.getenv('SUPABASE_JWT_SECRET')
 
+    # One shared Supabase client (and its keep-alive connections) per worker
+    from src.utils.supabase_pool import init_app as init_supabase_pool
+    init_supabase_pool(app)
+
     # CORS configuration for frontend
     CORS(app,
          supports_credentials=True,
@@ -55,10 +59,12 @@ def create_app():
     from src.routes.reddit import blp as reddit_blp
     from src.routes.leads import blp as leads_blp
     from src.routes.onboarding import blp as onboarding_blp
+    from src.routes.admin import blp as admin_blp
     api.register_blueprint(product_blp)
     api.register_blueprint(reddit_blp)
     api.register_blueprint(leads_blp)
     api.register_blueprint(onboarding_blp)
+    api.register_blueprint(admin_blp)
 
     return app
 
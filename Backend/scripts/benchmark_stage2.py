@@ -0,0 +1,163 @@
+"""
+Compare stage-2 comment generation modes: one monolithic call for all
+shortlisted posts, the same call streamed (comments handed out as they
+close; STAGE2_MODE=stream) and parallel per-post units (STAGE2_MODE=parallel).
+
+Run from Backend/ with real provider keys in the environment:
+
+    python -m scripts.benchmark_stage2 --input stage2_sample.json --runs 3
+    python -m scripts.benchmark_stage2 --product-id <id> --save-input stage2_sample.json
+
+The input file holds {"product": {...}, "posts": [...]}, where posts are
+shortlisted payloads with top_comments as enrich_with_comments builds them.
+With --product-id the sample is produced by the live selection pipeline.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+# Benchmark rows stay out of the llm_usage table, and repeated runs must hit the provider
+os.environ.setdefault('LLM_TELEMETRY_PERSIST', '0')
+
+from src.utils.models import get_model
+from src.utils.llm_telemetry import llm_telemetry
+from src.utils.lead_pipeline import (
+    select_lead_posts, enrich_with_comments, generate_lead_comments, generate_comments_parallel, STAGE2_POSTS_PER_CALL, STAGE2_WORKERS
+)
+from src.utils.prompt_generator import lead_generation_prompt_2
+from src.utils.llm_schemas import LEAD_COMMENTS
+from src.utils.reddit_helpers import iter_new_posts_metadata
+
+
+def load_live_sample(product_id):
+    from src.utils.supabase_pool import get_supabase
+    supabase = get_supabase()
+    product = supabase.table('products').select('*').eq('id', product_id).execute().data[0]
+    subreddits = [row['subreddit'] for row in supabase.table('lead_subreddits').select('subreddit').eq('product_id', product_id).execute().data]
+    unformatted_posts, posts, selected_indexes, _ = select_lead_posts(product, get_model(), iter_new_posts_metadata(subreddits))
+    return product, enrich_with_comments(unformatted_posts, posts, selected_indexes)
+
+
+def usage_totals():
+    stats = llm_telemetry.stats()['by_stage']
+    return {
+        'calls': sum(s['calls'] for s in stats),
+        'input_tokens': sum(s['input_tokens'] for s in stats),
+        'output_tokens': sum(s['output_tokens'] for s in stats),
+        'cost_usd': sum(s['cost_usd'] for s in stats),
+    }
+
+
+def measure(label, run):
+    """Wall time to first and last comment, comment count and usage delta of one run"""
+    before = usage_totals()
+    started = time.monotonic()
+    first_at, count = None, 0
+    for _ in run():
+        count += 1
+        if first_at is None:
+            first_at = time.monotonic() - started
+    elapsed = time.monotonic() - started
+    after = usage_totals()
+    return {
+        'mode': label,
+        'seconds': elapsed,
+        'first_comment_seconds': first_at,
+        'comments': count,
+        **{key: after[key] - before[key] for key in after},
+    }
+
+
+def monolithic(product, posts):
+    def run():
+        answer = get_model().structured_completion(lead_generation_prompt_2(product, posts), LEAD_COMMENTS)
+        for comment in answer.comments:
+            yield comment.post_id, comment.comment
+    return run
+
+
+def stream(product, posts):
+    def run():
+        return generate_lead_comments(product, get_model(), posts, mode='stream')
+    return run
+
+
+def parallel(product, posts, posts_per_call, workers):
+    def run():
+        return generate_comments_parallel(product, get_model(), posts, posts_per_call=posts_per_call, max_workers=workers)
+    return run
+
+
+def rotated(modes, run_number):
+    """
+    The modes in the order of one run: each run starts one mode later, so over
+    a multiple of len(modes) runs every mode takes every position equally
+    often and warm-up or provider-side drift doesn't favour one of them
+    """
+    shift = run_number % len(modes)
+    return modes[shift:] + modes[:shift]
+
+
+def summarize(results):
+    by_mode = {}
+    for result in results:
+        by_mode.setdefault(result['mode'], []).append(result)
+
+    print(f"{'mode':<12}{'p50 s':>8}{'max s':>8}{'first s':>9}{'comments':>10}{'calls':>7}{'in tok':>9}{'out tok':>9}{'cost $':>11}")
+    for mode, rows in by_mode.items():
+        firsts = [row['first_comment_seconds'] for row in rows if row['first_comment_seconds'] is not None]
+        print(
+            f"{mode:<12}"
+            f"{statistics.median(row['seconds'] for row in rows):>8.2f}"
+            f"{max(row['seconds'] for row in rows):>8.2f}"
+            f"{(statistics.median(firsts) if firsts else float('nan')):>9.2f}"
+            f"{statistics.mean(row['comments'] for row in rows):>10.1f}"
+            f"{statistics.mean(row['calls'] for row in rows):>7.1f}"
+            f"{statistics.mean(row['input_tokens'] for row in rows):>9.0f}"
+            f"{statistics.mean(row['output_tokens'] for row in rows):>9.0f}"
+            f"{statistics.mean(row['cost_usd'] for row in rows):>11.6f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--input', help='JSON file with {"product": ..., "posts": [...]}')
+    source.add_argument('--product-id', help='build the sample with the live selection pipeline')
+    parser.add_argument('--save-input', help='write the sample used to this file')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--posts-per-call', type=int, default=STAGE2_POSTS_PER_CALL)
+    parser.add_argument('--workers', type=int, default=STAGE2_WORKERS)
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input, 'r', encoding='utf-8') as file:
+            sample = json.load(file)
+        product, posts = sample['product'], sample['posts']
+    else:
+        product, posts = load_live_sample(args.product_id)
+
+    if args.save_input:
+        with open(args.save_input, 'w', encoding='utf-8') as file:
+            json.dump({'product': product, 'posts': posts}, file, indent=2, ensure_ascii=False)
+
+    print(f"{len(posts)} shortlisted posts, {args.runs} runs per mode, {args.posts_per_call} posts per parallel call")
+    modes = [
+        ('monolithic', monolithic(product, posts)),
+        ('stream', stream(product, posts)),
+        ('parallel', parallel(product, posts, args.posts_per_call, args.workers)),
+    ]
+    results = []
+    for run_number in range(args.runs):
+        for label, run in rotated(modes, run_number):
+            results.append(measure(label, run))
+    summarize(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+from flask.views import MethodView
+from flask_smorest import Blueprint
+from flask import jsonify
+from dotenv import load_dotenv
+from src.utils.auth import verify_cron_token
+from src.utils.reddit_rate_limiter import reddit_rate_limiter
+from src.utils.reddit_helpers import listing_cache, reddit_pool
+from src.utils.llm_cache import llm_cache
+from src.utils.models import get_model
+from src.utils.prompt_templates import prompt_templates
+from src.utils.llm_telemetry import llm_telemetry
+from src.utils.lexical_prefilter import prefilter_stats
+from src.utils.semantic_prefilter import product_vectors
+from src.utils.near_duplicates import near_duplicates
+from src.utils.supabase_pool import get_supabase_pool, default_pool
+
+load_dotenv()
+
+blp = Blueprint('Admin', __name__, description='Admin Operations')
+
+@blp.route('/admin/reddit-stats')
+class RedditStats(MethodView):
+    @verify_cron_token
+    def get(self):
+        """Reddit scheduler queue depth / wait times, client pool and listing cache counters"""
+        return jsonify({
+            'rate_limiter': reddit_rate_limiter.stats(),
+            'client_pool': reddit_pool.stats(),
+            'listing_cache': listing_cache.stats(),
+        })
+
+
+@blp.route('/admin/llm-stats')
+class LLMStats(MethodView):
+    @verify_cron_token
+    def get(self):
+        """LLM response cache counters, provider routing (circuits, latency, hedges) and prompt template sizes"""
+        return jsonify({
+            'response_cache': llm_cache.stats(),
+            'routing': get_model().routing_snapshot(),
+            'context_caches': get_model().context_caches.stats(),
+            'prefilter': prefilter_stats.stats(),
+            'semantic_prefilter': product_vectors.stats(),
+            'near_duplicates': near_duplicates.stats(),
+            'prompt_template_tokens': prompt_templates.static_token_counts(),
+        })
+
+
+@blp.route('/admin/llm-usage')
+class LLMUsage(MethodView):
+    @verify_cron_token
+    def get(self):
+        """Tokens, latency, retries and cost of LLM calls per endpoint/stage and per user"""
+        return jsonify(llm_telemetry.stats())
+
+
+@blp.route('/admin/supabase-stats')
+class SupabaseStats(MethodView):
+    @verify_cron_token
+    def get(self):
+        """Shared Supabase client of this worker: age, handouts and PostgREST request counters"""
+        return jsonify({
+            'app_pool': get_supabase_pool().stats(),
+            'background_pool': default_pool.stats(),
+        })
@@ -1,21 +1,24 @@
 from flask.views import MethodView
 from flask_smorest import Blueprint
-from flask import jsonify, request, g, current_app
+from flask import jsonify, request, g
 from dotenv import load_dotenv
 from src.utils.auth import verify_supabase_token
-from src.utils.prompt_generator import lead_generation_prompt, lead_generation_prompt_2
-from src.utils.models import Model
-from supabase import create_client, Client
-from src.utils.reddit_helpers import list_new_posts_metadata, fetch_comments_for_posts
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.utils.models import get_model
+from src.utils.retry_policy import LLMUnavailableError
+from supabase import Client
+from src.utils.supabase_pool import get_supabase
+from src.utils.reddit_helpers import iter_new_posts_metadata
+from src.utils.lead_pipeline import select_lead_posts, enrich_with_comments, generate_lead_comments
+from src.utils.lead_writer import ProgressiveLeadWriter, scheduling_interval, existing_lead_ids
+from src.utils.lead_verdicts import VerdictStore
+from src.utils.subreddit_registry import filter_live_subreddits
+from src.utils.subreddit_cursors import load_subreddit_cursors, advance_subreddit_cursors, save_subreddit_cursors
+from src.utils.llm_telemetry import llm_tags
+from src.utils.llm_schemas import StructuredOutputError
 import os
-import json
-import uuid
 import datetime
-import random
 import logging
 from typing import Optional, List, Dict, Any
-from flask import current_app
 import traceback
 
 import logging
@@ -25,27 +28,6 @@ load_dotenv()
 
 blp = Blueprint('Leads', __name__, description='Lead Operations')
 
-def check_existing_reddit_posts(supabase, user_id, new_leads):
-    """
-    Check for existing Reddit post IDs to prevent duplicate leads.
-    Returns only leads that don't already exist for this user.
-    """
-    if not new_leads:
-        return []
-    
-    # Get existing Reddit post IDs for this user
-    existing_result = supabase.table('leads').select('reddit_post_id').eq('uid', user_id).execute()
-    existing_post_ids = {lead['reddit_post_id'] for lead in existing_result.data if lead.get('reddit_post_id')}
-    
-    # Filter out duplicates
-    unique_leads = []
-    for lead in new_leads:
-        if lead.get('reddit_post_id') and lead['reddit_post_id'] not in existing_post_ids:
-            unique_leads.append(lead)
-    
-    logger.info(f"Found {len(new_leads)} total leads, {len(unique_leads)} are unique (skipped {len(new_leads) - len(unique_leads)} duplicates)")
-    return unique_leads
-
 @blp.route('/lead-generation')
 class LeadGeneration(MethodView):
     @verify_supabase_token
@@ -53,12 +35,11 @@ class LeadGeneration(MethodView):
         data = request.get_json()
         product_id = data.get('product_id')
 
-        supabase_url = current_app.config['SUPABASE_URL']
-        supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
-        supabase: Client = create_client(supabase_url, supabase_key)
+        supabase: Client = get_supabase()
         
         result = supabase.table('lead_subreddits').select('*').eq('product_id', product_id).execute()
-        subreddits = [lead['subreddit'] for lead in result.data]
+        # Skip subreddits the registry knows are dead, banned or private
+        subreddits = filter_live_subreddits(supabase, [lead['subreddit'] for lead in result.data])
 
         if not subreddits:
             return jsonify({'error': 'No subreddits found for this product. Please add subreddits first.'}), 400
@@ -67,175 +48,73 @@ class LeadGeneration(MethodView):
         product_result = supabase.table('products').select('*').eq('id', product_id).execute()
         product_data = product_result.data[0]
         
-        # Phase 1: fetch lightweight post metadata only (no comments)
-        unformatted_posts, posts = list_new_posts_metadata(subreddits)
-        
-        logger.info(f"Processing {len(posts)} posts from {len(subreddits)} subreddits")
+        # Borrow the shared Model instance for all batches
+        model = get_model()
+
+        # Phase 1: stream lightweight post metadata (no comments) straight into
+        # batched AI checks (max 3 concurrent) while other subreddits still load
+        # Posts judged on earlier runs for this product revision skip the LLM,
+        # and posts that are already leads are never selected again
+        user_id = g.current_user['id']
+        existing_ids = existing_lead_ids(supabase, user_id)
+        unformatted_posts, posts, selected_indexes, _ = select_lead_posts(
+            product_data, model, iter_new_posts_metadata(subreddits),
+            verdicts=VerdictStore(supabase, product_data), existing_leads=existing_ids
+        )
+        selected_posts = [posts[idx] for idx in selected_indexes]
+
+        logger.info(f"Processed {len(posts)} posts from {len(subreddits)} subreddits")
 
-        # Process posts in batches of 10 with parallel AI checks (max 3 concurrent)
-        batch_size = 10
-        selected_posts = []
-        selected_indexes: List[int] = []
-        
-        # Create one Model instance to reuse for all batches
-        model = Model()
-        
-        def process_batch(batch_data):
-            batch, batch_start_idx = batch_data
-            messages = lead_generation_prompt(product_data, batch)
-            response = model.gemini_lead_checking(messages)
-            
-            try:
-                response_data = json.loads(response)
-                post_ids = response_data.get('selected_post_ids', [])
-                logger.debug(f"Batch starting at index {batch_start_idx}: AI selected {post_ids}")
-                # Adjust post_ids to global indices
-                global_post_ids = [batch_start_idx + pid for pid in post_ids]
-                return global_post_ids
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse AI response for batch starting at {batch_start_idx}: {e}")
-                logger.debug(f"Raw response: {response}")
-                return []
-        
-        # Prepare batches with their starting indices
-        batches = []
-        for i in range(0, len(posts), batch_size):
-            batch = posts[i:i + batch_size]
-            batches.append((batch, i))
-        
-        # Process batches in parallel with max 3 concurrent workers
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            # Submit all batch processing tasks
-            future_to_batch = {executor.submit(process_batch, batch_data): batch_data for batch_data in batches}
-            
-            # Collect results as they complete
-            for future in as_completed(future_to_batch):
-                batch_data = future_to_batch[future]
-                try:
-                    global_post_ids = future.result()
-                    for post_id in global_post_ids:
-                        if post_id < len(posts):
-                            selected_posts.append(posts[post_id])
-                            selected_indexes.append(post_id)
-                except Exception as e:
-                    logger.error(f"Error processing batch {batch_data[1]}: {e}")
-        
         # Phase 2: fetch comments only for shortlisted posts and enrich selected posts
-        try:
-            selected_reddit_ids = [unformatted_posts[idx]['reddit_post_id'] for idx in selected_indexes]
-            comments_by_post_id = fetch_comments_for_posts(selected_reddit_ids, comments_per_post=3)
-        except Exception as e:
-            logger.error(f"Failed to fetch comments for shortlisted posts: {e}")
-            comments_by_post_id = {}
+        selected_posts_with_comments = enrich_with_comments(unformatted_posts, posts, selected_indexes)
 
-        selected_posts_with_comments = []
-        for idx in selected_indexes:
-            try:
-                base = posts[idx]
-                reddit_id = unformatted_posts[idx]['reddit_post_id']
-                enriched = {**base, "top_comments": comments_by_post_id.get(reddit_id, [])}
-                selected_posts_with_comments.append(enriched)
-            except Exception as e:
-                logger.error(f"Error enriching post {idx} with comments: {e}")
-
-        messages = lead_generation_prompt_2(product_data, selected_posts_with_comments)
-
-        response = model.gemini_chat_completion(messages)
-        response_data = json.loads(response)
-        comments = response_data.get('comments', [])
-
-        logger.info(f"Generated {len(comments)} comments from {len(selected_posts)} selected posts")
-
-        generated_leads = []
-        for comment in comments:
-            for key, value in comment.items():
-                new_post = {}
-                unformatted_post = unformatted_posts[int(key)]
-                new_post['id'] = str(uuid.uuid4())
-                new_post['comment'] = value
-                new_post['selftext'] = unformatted_post['selftext']
-                new_post['title'] = unformatted_post['title']
-                new_post['url'] = unformatted_post['url']
-                new_post['reddit_post_id'] = unformatted_post.get('reddit_post_id')  # Add Reddit post ID
-                new_post['score'] = unformatted_post['score']
-                new_post['read'] = False
-                new_post['num_comments'] = unformatted_post['num_comments']
-                new_post['author'] = unformatted_post['author']
-                new_post['subreddit'] = unformatted_post['subreddit']
-                new_post['date'] = unformatted_post['date']
-                new_post['created_at'] = datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
-                generated_leads.append(new_post)
-
-        # Check for duplicates before inserting
-        user_id = g.current_user['id']
-        unique_leads = check_existing_reddit_posts(supabase, user_id, generated_leads)
-        
-        if not unique_leads:
-            return jsonify({'message': 'No new leads found. All leads already exist.', 'leads': []})
-        
-        leads_to_insert = []
 
-        # Calculate scheduling intervals using dynamic algorithm
-        base_interval_minutes = 120.0 / len(unique_leads)
-        base_interval_minutes = max(5.0, min(45.0, base_interval_minutes))  # Min 5 min, max 45 min
-        
-        scheduled_time = datetime.datetime.now(datetime.timezone.utc)
-        time_now = datetime.datetime.now(datetime.timezone.utc)
-
-        for i, lead in enumerate(unique_leads):            
-            lead_data = {
-                'id': lead['id'],
-                'uid': user_id,
-                'comment': lead['comment'],
-                'selftext': lead['selftext'],
-                'title': lead['title'],
-                'url': lead['url'],
-                'reddit_post_id': lead['reddit_post_id'],  # Include Reddit post ID
-                'score': lead['score'],
-                'read': lead['read'],
-                'num_comments': lead['num_comments'],
-                'author': lead['author'],
-                'subreddit': lead['subreddit'],
-                'date': lead['date'],
-                'scheduled_at': scheduled_time.strftime('%Y-%m-%dT%H:%M:%S')
-            }
-            leads_to_insert.append(lead_data)
-
-            # Calculate random delay between 0.7x and 1.3x of base interval
-            min_delay = base_interval_minutes * 0.7
-            max_delay = base_interval_minutes * 1.3
-            random_delay = random.uniform(min_delay, max_delay)
-            
-            # Add cumulative delay for this lead
-            total_delay_minutes = (i * base_interval_minutes) + random_delay
-            scheduled_time = time_now + datetime.timedelta(minutes=total_delay_minutes)
-        
-        if leads_to_insert:
-            try:
-                supabase.table('leads').insert(leads_to_insert).execute()
-                logger.info(f"Saved {len(leads_to_insert)} unique leads to database")
-            except Exception as e:
-                logger.error(f"Error saving leads to database: {e}")
+        # Stream the answer: each lead is built, deduplicated against the user's
+        # existing leads, scheduled and saved as soon as its comment closes
+        writer = ProgressiveLeadWriter(
+            supabase, user_id, scheduling_interval(len(selected_posts_with_comments)), existing_ids=existing_ids
+        )
+        try:
+            with llm_tags(stage='comment_generation', product_id=product_id):
+                for post_index, comment in generate_lead_comments(product_data, model, selected_posts_with_comments):
+                    if not 0 <= post_index < len(unformatted_posts):
+                        logger.warning(f"Invalid post index: {post_index}")
+                        continue
+                    writer.add(unformatted_posts[post_index], comment)
+        except LLMUnavailableError as e:
+            logger.error(f"Comment generation unavailable: {e}")
+            if not writer.leads:
+                return jsonify({'error': 'AI service temporarily unavailable. Please try again.'}), 503
+        except StructuredOutputError as e:
+            # Leads already written from the stream are kept
+            logger.error(f"Failed to parse generated comments: {e}")
+            if not writer.leads:
+                return jsonify({'error': 'AI returned an invalid answer. Please try again.'}), 502
+        finally:
+            writer.flush()
+
+        logger.info(f"Generated {len(writer.leads) + writer.skipped_duplicates} comments from {len(selected_posts)} selected posts")
+
+        if not writer.leads:
+            return jsonify({'message': 'No new leads found. All leads already exist.', 'leads': []})
 
         return jsonify({
-            'message': f'Generated {len(unique_leads)} new leads (skipped {len(generated_leads) - len(unique_leads)} duplicates)',
-            'leads': unique_leads
+            'message': f'Generated {len(writer.leads)} new leads (skipped {writer.skipped_duplicates} duplicates)',
+            'leads': writer.leads
         })
-    
 
 @blp.route('/get-leads')
 class GetLeads(MethodView):
     @verify_supabase_token
     def get(self):
         try:
-            supabase_url = current_app.config['SUPABASE_URL']
             supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
             
             if not supabase_key:
                 logger.error("SUPABASE_SERVICE_ROLE_KEY not found in environment")
                 return jsonify({'error': 'Database configuration error'}), 500
                 
-            supabase: Client = create_client(supabase_url, supabase_key)
+            supabase: Client = get_supabase()
 
             user_id = g.current_user['id']
             logger.info(f"Fetching leads for user {user_id}")
@@ -275,14 +154,13 @@ class MarkLeadAsRead(MethodView):
             if not lead_id:
                 return jsonify({'error': 'lead_id is required'}), 400
 
-            supabase_url = current_app.config['SUPABASE_URL']
             supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
             
             if not supabase_key:
                 logger.error("SUPABASE_SERVICE_ROLE_KEY not found in environment")
                 return jsonify({'error': 'Database configuration error'}), 500
                 
-            supabase: Client = create_client(supabase_url, supabase_key)
+            supabase: Client = get_supabase()
 
             user_id = g.current_user['id']
             logger.info(f"Marking lead {lead_id} as read for user {user_id}")
@@ -319,14 +197,13 @@ class MarkLeadAsUnread(MethodView):
             if not lead_id:
                 return jsonify({'error': 'lead_id is required'}), 400
 
-            supabase_url = current_app.config['SUPABASE_URL']
             supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
             
             if not supabase_key:
                 logger.error("SUPABASE_SERVICE_ROLE_KEY not found in environment")
                 return jsonify({'error': 'Database configuration error'}), 500
                 
-            supabase: Client = create_client(supabase_url, supabase_key)
+            supabase: Client = get_supabase()
 
             user_id = g.current_user['id']
             logger.info(f"Marking lead {lead_id} as unread for user {user_id}")
@@ -363,14 +240,13 @@ class DeleteLead(MethodView):
             if not lead_id:
                 return jsonify({'error': 'lead_id is required'}), 400
 
-            supabase_url = current_app.config['SUPABASE_URL']
             supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
             
             if not supabase_key:
                 logger.error("SUPABASE_SERVICE_ROLE_KEY not found in environment")
                 return jsonify({'error': 'Database configuration error'}), 500
                 
-            supabase: Client = create_client(supabase_url, supabase_key)
+            supabase: Client = get_supabase()
 
             user_id = g.current_user['id']
             logger.info(f"Deleting lead {lead_id} for user {user_id}")
@@ -411,14 +287,13 @@ def generate_leads(user_id):
             logger.error(f"Invalid user_id provided: {user_id}")
             return {"error": "Invalid user_id", "success": False}
         
-        supabase_url = current_app.config['SUPABASE_URL']
         supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
         
         if not supabase_key:
             logger.error("SUPABASE_SERVICE_ROLE_KEY not found in environment")
             return {"error": "Database configuration error", "success": False}
             
-        supabase: Client = create_client(supabase_url, supabase_key)
+        supabase: Client = get_supabase()
 
         # Get product for the user with better error handling
         try:
@@ -440,7 +315,8 @@ def generate_leads(user_id):
             logger.error(f"Database error fetching subreddits for product {product_id}: {e}")
             return {"error": "Database error", "success": False}
             
-        subreddits = [lead['subreddit'] for lead in result.data]
+        # Skip subreddits the registry knows are dead, banned or private
+        subreddits = filter_live_subreddits(supabase, [lead['subreddit'] for lead in result.data])
 
         if not subreddits:
             logger.warning(f"No subreddits found for product {product_id}")
@@ -459,195 +335,86 @@ def generate_leads(user_id):
         
         product_data = product_result.data[0]
         
+        # Only list posts newer than what the previous cron pass already evaluated
+        subreddit_cursors = load_subreddit_cursors(supabase, product_id)
+
+        # Borrow the shared Model instance for all batches
+        model = get_model()
+
         # Get posts with error handling
         try:
-            # Phase 1: fetch lightweight post metadata only (no comments)
-            unformatted_posts, posts = list_new_posts_metadata(subreddits)
+            # Phase 1: stream lightweight post metadata (no comments) straight into
+            # batched AI checks (max 3 concurrent) while other subreddits still load
+            post_stream = iter_new_posts_metadata(subreddits, cursors=subreddit_cursors)
+            # Posts judged on earlier runs for this product revision skip the LLM,
+            # and posts that are already leads are never selected again
+            verdicts = VerdictStore(supabase, product_data)
+            existing_ids = existing_lead_ids(supabase, user_id)
+            unformatted_posts, posts, selected_indexes, judged_indexes = select_lead_posts(
+                product_data, model, post_stream, verdicts=verdicts, existing_leads=existing_ids
+            )
         except Exception as e:
-            logger.error(f"Error fetching Reddit posts: {e}")
+            logger.error(f"Error fetching and classifying Reddit posts: {e}")
             return {"error": "Failed to fetch Reddit posts", "success": False}
 
-        # Remove file writing - use logging instead
         logger.info(f"Fetched {len(posts)} posts from {len(subreddits)} subreddits")
+        selected_posts = [posts[idx] for idx in selected_indexes]
 
-        # Process posts in batches with parallel AI checks (max 3 concurrent)
-        batch_size = 10
-        selected_posts = []
-        selected_indexes: List[int] = []
-        
-        # Create one Model instance to reuse for all batches
-        model = Model()
-        
-        def process_batch(batch_data):
-            batch, batch_start_idx = batch_data
-            messages = lead_generation_prompt(product_data, batch)
-            
-            try:
-                response = model.gemini_lead_checking(messages)
-                response_data = json.loads(response)
-                post_ids = response_data.get('selected_post_ids', [])
-                logger.info(f"Batch starting at index {batch_start_idx}: AI returned {post_ids}")
-                # Adjust post_ids to global indices
-                global_post_ids = [batch_start_idx + pid for pid in post_ids]
-                return global_post_ids
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse AI response for batch starting at {batch_start_idx}: {e}")
-                logger.error(f"Raw response: {response}")
-                return []
-            except Exception as e:
-                logger.error(f"Error processing batch {batch_start_idx//batch_size}: {e}")
-                return []
-        
-        # Prepare batches with their starting indices
-        batches = []
-        for i in range(0, len(posts), batch_size):
-            batch = posts[i:i + batch_size]
-            batches.append((batch, i))
-        
-        # Process batches in parallel with max 3 concurrent workers
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            # Submit all batch processing tasks
-            future_to_batch = {executor.submit(process_batch, batch_data): batch_data for batch_data in batches}
-            
-            # Collect results as they complete
-            for future in as_completed(future_to_batch):
-                batch_data = future_to_batch[future]
-                try:
-                    global_post_ids = future.result()
-                    for post_id in global_post_ids:
-                        if post_id < len(posts):  # Bounds checking
-                            selected_posts.append(posts[post_id])
-                            selected_indexes.append(post_id)
-                except Exception as e:
-                    logger.error(f"Error processing batch {batch_data[1]}: {e}")
+        # Judged posts are never sent to classification again; each cursor stops
+        # short of the oldest post whose batch failed, so that post is listed again
+        advanced_cursors = advance_subreddit_cursors(subreddit_cursors, unformatted_posts, judged_indexes)
+        save_subreddit_cursors(supabase, product_id, subreddit_cursors, advanced_cursors)
         
         if not selected_posts:
             logger.warning(f"No posts selected by AI for user {user_id}")
             return {"error": "No suitable posts found", "success": False}
 
         # Phase 2: fetch comments only for shortlisted posts and enrich selected posts
-        try:
-            selected_reddit_ids = [unformatted_posts[idx]['reddit_post_id'] for idx in selected_indexes]
-            comments_by_post_id = fetch_comments_for_posts(selected_reddit_ids, comments_per_post=3)
-        except Exception as e:
-            logger.error(f"Failed to fetch comments for shortlisted posts: {e}")
-            comments_by_post_id = {}
-
-        selected_posts_with_comments = []
-        for idx in selected_indexes:
-            try:
-                base = posts[idx]
-                reddit_id = unformatted_posts[idx]['reddit_post_id']
-                enriched = {**base, "top_comments": comments_by_post_id.get(reddit_id, [])}
-                selected_posts_with_comments.append(enriched)
-            except Exception as e:
-                logger.error(f"Error enriching post {idx} with comments: {e}")
+        selected_posts_with_comments = enrich_with_comments(unformatted_posts, posts, selected_indexes)
 
-        messages = lead_generation_prompt_2(product_data, selected_posts_with_comments)
 
+        # Stream the answer: each lead is built, deduplicated against the user's
+        # existing leads, scheduled and saved as soon as its comment closes
+        writer = ProgressiveLeadWriter(
+            supabase, user_id, scheduling_interval(len(selected_posts_with_comments)), existing_ids=existing_ids
+        )
         try:
-            response = model.gemini_chat_completion(messages)
-            response_data = json.loads(response)
-            comments = response_data.get('comments', [])
-        except Exception as e:
-            logger.error(f"Error generating comments: {e}")
-            return {"error": "Failed to generate comments", "success": False}
-
-        # Handle case where comments might be a JSON string
-        if isinstance(comments, str):
-            try:
-                comments = json.loads(comments)
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse comments string: {e}")
-                comments = []
-
-        generated_leads = []
-        for comment in comments:
-            for key, value in comment.items():
-                try:
-                    post_index = int(key)
-                    if post_index >= len(unformatted_posts):
+            with llm_tags(stage='comment_generation', product_id=product_id):
+                for post_index, comment in generate_lead_comments(product_data, model, selected_posts_with_comments):
+                    if not 0 <= post_index < len(unformatted_posts):
                         logger.warning(f"Invalid post index: {post_index}")
                         continue
-                        
-                    unformatted_post = unformatted_posts[post_index]
-                    new_post = {
-                        'id': str(uuid.uuid4()),
-                        'comment': value,
-                        'selftext': unformatted_post['selftext'],
-                        'title': unformatted_post['title'],
-                        'url': unformatted_post['url'],
-                        'reddit_post_id': unformatted_post.get('reddit_post_id'),
-                        'score': unformatted_post['score'],
-                        'read': False,
-                        'num_comments': unformatted_post['num_comments'],
-                        'author': unformatted_post['author'],
-                        'subreddit': unformatted_post['subreddit'],
-                        'date': unformatted_post['date'],
-                        'created_at': datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
-                    }
-                    generated_leads.append(new_post)
-                except (ValueError, KeyError, IndexError) as e:
-                    logger.error(f"Error processing comment {key}: {e}")
-                    continue
-
-        # Check for duplicates before inserting
-        if not generated_leads:
+                    try:
+                        writer.add(unformatted_posts[post_index], comment)
+                    except (KeyError, IndexError) as e:
+                        logger.error(f"Error processing comment {post_index}: {e}")
+        except LLMUnavailableError as e:
+            logger.error(f"Comment generation unavailable for user {user_id}: {e}")
+            if not writer.leads:
+                return {"error": "AI service unavailable", "success": False}
+        except StructuredOutputError as e:
+            logger.error(f"Failed to parse generated comments for user {user_id}: {e}")
+            if not writer.leads:
+                return {"error": "AI returned an invalid answer", "success": False}
+        except Exception as e:
+            logger.error(f"Error generating comments: {e}")
+            if not writer.leads:
+                return {"error": "Failed to generate comments", "success": False}
+        finally:
+            writer.flush()
+
+        if not writer.leads:
+            if writer.skipped_duplicates:
+                logger.info(f"No new leads found for user {user_id}. All leads already exist.")
+                return {"message": "No new leads found", "success": True, "data": []}
             logger.warning(f"No leads generated for user {user_id}")
             return {"error": "No leads generated", "success": False}
-        
-        unique_leads = check_existing_reddit_posts(supabase, user_id, generated_leads)
-        
-        if not unique_leads:
-            logger.info(f"No new leads found for user {user_id}. All leads already exist.")
-            return {"message": "No new leads found", "success": True, "data": []}
-        
-        leads_to_insert = []
 
-        # Calculate scheduling intervals using dynamic algorithm
-        base_interval_minutes = 120.0 / len(unique_leads)
-        base_interval_minutes = max(5.0, min(45.0, base_interval_minutes))  # Min 5 min, max 45 min
-        
-        scheduled_time = datetime.datetime.now(datetime.timezone.utc)
-        time_now = datetime.datetime.now(datetime.timezone.utc)
-
-        for i, lead in enumerate(unique_leads):            
-            lead_data = {
-                'id': lead['id'],
-                'uid': user_id,
-                'comment': lead['comment'],
-                'selftext': lead['selftext'],
-                'title': lead['title'],
-                'url': lead['url'],
-                'reddit_post_id': lead['reddit_post_id'],
-                'score': lead['score'],
-                'read': lead['read'],
-                'num_comments': lead['num_comments'],
-                'author': lead['author'],
-                'subreddit': lead['subreddit'],
-                'date': lead['date'],
-                'scheduled_at': scheduled_time.strftime('%Y-%m-%dT%H:%M:%S')
-            }
-            leads_to_insert.append(lead_data)
-
-            # Calculate random delay between 0.7x and 1.3x of base interval
-            min_delay = base_interval_minutes * 0.7
-            max_delay = base_interval_minutes * 1.3
-            random_delay = random.uniform(min_delay, max_delay)
-            
-            # Add cumulative delay for this lead
-            total_delay_minutes = (i * base_interval_minutes) + random_delay
-            scheduled_time = time_now + datetime.timedelta(minutes=total_delay_minutes)
-        
-        if leads_to_insert:
-            try:
-                supabase.table('leads').insert(leads_to_insert).execute()
-                logger.info(f"Successfully saved {len(leads_to_insert)} unique leads to database for user {user_id}")
-            except Exception as e:
-                logger.error(f"Error saving leads to database: {e}")
-                return {"error": "Failed to save leads", "success": False}
+        if writer.failed and not writer.saved:
+            return {"error": "Failed to save leads", "success": False}
 
-        return {"success": True, "data": unique_leads, "count": len(unique_leads)}
+        logger.info(f"Successfully saved {writer.saved} unique leads to database for user {user_id}")
+        return {"success": True, "data": writer.leads, "count": len(writer.leads)}
         
     except Exception as e:
         logger.error(f"Unexpected error in generate_leads for user {user_id}: {e}")
@@ -668,9 +435,7 @@ class NextLeadSearch(MethodView):
         if token != cron_token:
             return jsonify({'error': 'Invalid token'}), 401
 
-        supabase_url = current_app.config['SUPABASE_URL']
-        supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
-        supabase: Client = create_client(supabase_url, supabase_key)
+        supabase: Client = get_supabase()
         
         current_time = datetime.datetime.now(datetime.timezone.utc)
         
@@ -681,7 +446,9 @@ class NextLeadSearch(MethodView):
 
         for past_search_time in past_search_times:
             try:
-                result = generate_leads(past_search_time['user_id'])
+                # Cron runs have no signed-in user; tag the LLM spend with the user served
+                with llm_tags(user_id=past_search_time['user_id']):
+                    result = generate_leads(past_search_time['user_id'])
                 if result and result.get('success'):
                     logger.info(f"Generated leads for user {past_search_time['user_id']}: {result.get('count', 0)} leads")
                 else:
@@ -711,14 +478,13 @@ class MoveLeads(MethodView):
             if token != cron_token:
                 return jsonify({'error': 'Invalid token'}), 401
 
-            supabase_url = current_app.config['SUPABASE_URL']
             supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
             
             if not supabase_key:
                 logger.error("SUPABASE_SERVICE_ROLE_KEY not found in environment")
                 return jsonify({'error': 'Database configuration error'}), 500
                 
-            supabase: Client = create_client(supabase_url, supabase_key)
+            supabase: Client = get_supabase()
 
             now_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
 
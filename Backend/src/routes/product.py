@@ -1,14 +1,18 @@
 from flask.views import MethodView
 from flask_smorest import Blueprint
-from flask import jsonify, request, g, current_app
+from flask import jsonify, request, g
 from dotenv import load_dotenv
 from src.utils.auth import verify_supabase_token
 from src.utils.prompt_generator import generate_product_details_prompt, lead_subreddits_for_product_prompt
-from src.utils.models import Model
-from supabase import create_client, Client
+from src.utils.models import get_model, LLM_CACHE_TTL_DAY
+from src.utils.retry_policy import LLMUnavailableError
+from supabase import Client
+from src.utils.supabase_pool import get_supabase
 from src.utils.website_scraper import get_website_content
-import os
-import json
+from src.utils.subreddit_registry import filter_live_subreddits
+from src.utils.lead_verdicts import invalidate_verdicts, REVISION_FIELDS
+from src.utils.semantic_prefilter import product_vectors
+from src.utils.llm_schemas import PRODUCT_DETAILS, SUBREDDIT_SUGGESTIONS, StructuredOutputError
 
 load_dotenv()
 
@@ -26,9 +30,17 @@ class GenerateProductDetails(MethodView):
 
         messages = generate_product_details_prompt(website_content)
 
-        model = Model()
-        response = model.gemini_chat_completion(messages)
-        return response
+        model = get_model()
+        try:
+            # Same website content -> same product details
+            details = model.structured_completion(messages, PRODUCT_DETAILS, cache_ttl=LLM_CACHE_TTL_DAY)
+        except LLMUnavailableError as e:
+            print(f"Product details generation unavailable: {e}")
+            return jsonify({'error': 'AI service temporarily unavailable. Please try again.'}), 503
+        except StructuredOutputError as e:
+            print(f"Failed to parse AI response: {e}")
+            return jsonify({'error': 'AI returned an invalid answer. Please try again.'}), 502
+        return jsonify(details._asdict())
 
 @blp.route('/create_product')
 class CreateProduct(MethodView):
@@ -58,14 +70,15 @@ class CreateProduct(MethodView):
             }
             
             # Insert product into database
-            supabase_url = current_app.config['SUPABASE_URL']
-            supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
-            supabase: Client = create_client(supabase_url, supabase_key)
+            supabase: Client = get_supabase()
 
             if supabase.table('products').select('*').eq('user_id', user_id).execute().data:
                 old_product_id = supabase.table('products').select('*').eq('user_id', user_id).execute().data[0]['id']
                 supabase.table('products').delete().eq('user_id', user_id).execute()
                 supabase.table('lead_subreddits').delete().eq('product_id', old_product_id).execute()
+                invalidate_verdicts(supabase, old_product_id)
+                get_model().context_caches.invalidate_product(old_product_id)
+                product_vectors.drop(old_product_id)
             
             result = supabase.table('products').insert(product_data).execute()
             
@@ -74,26 +87,25 @@ class CreateProduct(MethodView):
             
             # Get the created product ID
             product_id = result.data[0]['id']
+            # Precompute the vector the semantic prefilter ranks posts against
+            product_vectors.refresh(result.data[0])
             
             # Generate subreddit recommendations
             print(f"Generating subreddits for product: {product_data['name']}")
             messages = lead_subreddits_for_product_prompt(product_data)
-            model = Model()
-            response = model.gemini_chat_completion(messages)
-            print(f"AI Response: {response}")
+            model = get_model()
             
             # Parse the AI response to extract subreddits
             try:
-                response_data = json.loads(response)
-                subreddits = response_data.get('subreddits', [])
+                subreddits = list(model.structured_completion(messages, SUBREDDIT_SUGGESTIONS, cache_ttl=LLM_CACHE_TTL_DAY).subreddits)
                 print(f"Extracted subreddits: {subreddits}")
+
+                # Drop suggested subreddits that don't exist or can't be read (checked in parallel)
+                live_subreddits = filter_live_subreddits(supabase, subreddits)
                 
                 # Save each subreddit as a lead
                 leads_data = []
-                for subreddit in subreddits:
-                    # Clean the subreddit name (remove 'r/' prefix if present)
-                    clean_subreddit = subreddit.replace('r/', '') if subreddit.startswith('r/') else subreddit
-                    
+                for clean_subreddit in live_subreddits:
                     leads_data.append({
                         'product_id': product_id,
                         'subreddit': clean_subreddit
@@ -108,9 +120,10 @@ class CreateProduct(MethodView):
                 else:
                     print("No subreddits to save")
                 
-            except json.JSONDecodeError as e:
+            except StructuredOutputError as e:
                 print(f"Failed to parse AI response: {e}")
-                print(f"Raw response: {response}")
+            except LLMUnavailableError as e:
+                print(f"Subreddit generation unavailable, product saved without subreddits: {e}")
             except Exception as e:
                 print(f"Error saving subreddits: {e}")
                 import traceback
@@ -135,9 +148,7 @@ class GetProducts(MethodView):
             user_id = g.current_user['id']
             
             # Query products for the user
-            supabase_url = current_app.config['SUPABASE_URL']
-            supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
-            supabase: Client = create_client(supabase_url, supabase_key)
+            supabase: Client = get_supabase()
             result = supabase.table('products').select('*').eq('user_id', user_id).order('created_at', desc=True).execute()
             
             if result.data is not None:
@@ -167,9 +178,7 @@ class EditProduct(MethodView):
             # Get user ID from authenticated token
             user_id = g.current_user['id']
 
-            supabase_url = current_app.config['SUPABASE_URL']
-            supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
-            supabase: Client = create_client(supabase_url, supabase_key)
+            supabase: Client = get_supabase()
 
             # Get current product data
             product_result = supabase.table('products').select('*').eq('id', product_id).eq('user_id', user_id).execute()
@@ -199,6 +208,12 @@ class EditProduct(MethodView):
                 if not update_result.data:
                     return jsonify({'error': 'Failed to update product'}), 500
 
+                # Classification verdicts and cached system prompts depend on these fields; drop them when any changed
+                if any(field in update_data and update_data[field] != current_product.get(field) for field in REVISION_FIELDS):
+                    invalidate_verdicts(supabase, product_id)
+                    get_model().context_caches.invalidate_product(product_id)
+                    product_vectors.refresh(update_result.data[0])
+
             # If URL changed, regenerate subreddits
             if url_changed:
                 # Delete old subreddits
@@ -215,20 +230,18 @@ class EditProduct(MethodView):
 
                 # Generate new subreddits
                 messages = lead_subreddits_for_product_prompt(product_data_for_subreddits)
-                model = Model()
-                response = model.gemini_chat_completion(messages)
+                model = get_model()
                 
                 # Parse the AI response to extract subreddits
                 try:
-                    response_data = json.loads(response)
-                    subreddits = response_data.get('subreddits', [])
+                    subreddits = list(model.structured_completion(messages, SUBREDDIT_SUGGESTIONS, cache_ttl=LLM_CACHE_TTL_DAY).subreddits)
+
+                    # Drop suggested subreddits that don't exist or can't be read (checked in parallel)
+                    live_subreddits = filter_live_subreddits(supabase, subreddits)
                     
                     # Save each subreddit as a lead
                     leads_data = []
-                    for subreddit in subreddits:
-                        # Clean the subreddit name (remove 'r/' prefix if present)
-                        clean_subreddit = subreddit.replace('r/', '') if subreddit.startswith('r/') else subreddit
-                        
+                    for clean_subreddit in live_subreddits:
                         leads_data.append({
                             'product_id': product_id,
                             'subreddit': clean_subreddit
@@ -240,9 +253,10 @@ class EditProduct(MethodView):
                         print(f"Updated {len(leads_data)} leads for product {product_id}")
 
                     
-                except json.JSONDecodeError as e:
+                except StructuredOutputError as e:
                     print(f"Failed to parse AI response: {e}")
-                    print(f"Raw response: {response}")
+                except LLMUnavailableError as e:
+                    print(f"Subreddit generation unavailable: {e}")
                 except Exception as e:
                     print(f"Error saving new leads: {e}")
 
@@ -1,13 +1,14 @@
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
-from flask import jsonify, request, g, current_app
+from flask import jsonify, request, g
 from dotenv import load_dotenv
-import json
-import os
 from src.utils.auth import verify_supabase_token
 from src.utils.prompt_generator import reddit_post_generator_prompt, comment_karma_prompt
-from src.utils.models import Model
-from supabase import create_client, Client
+from src.utils.models import get_model, LLM_CACHE_TTL_DAY
+from src.utils.retry_policy import LLMUnavailableError
+from src.utils.llm_schemas import GENERATED_POSTS, KARMA_TITLE, StructuredOutputError
+from supabase import Client
+from src.utils.supabase_pool import get_supabase
 from src.utils.reddit_helpers import get_rising_posts, create_karma_post
 import uuid
 
@@ -30,9 +31,7 @@ class GenerateRedditPost(MethodView):
             user_id = g.current_user['id']
             
             # Fetch product details from Supabase
-            supabase_url = current_app.config['SUPABASE_URL']
-            supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
-            supabase: Client = create_client(supabase_url, supabase_key)
+            supabase: Client = get_supabase()
             
             # Get product details, ensuring it belongs to the authenticated user
             result = supabase.table('products').select('*').eq('id', product_id).eq('user_id', user_id).execute()
@@ -52,46 +51,18 @@ class GenerateRedditPost(MethodView):
 
             messages = reddit_post_generator_prompt(user_prompt)
 
-            model = Model()
-            response = model.gemini_chat_completion(messages)
-
-            # Parse the AI response to extract post data (handle multiple shapes)
-            try:
-                parsed = json.loads(response)
-            except json.JSONDecodeError as e:
-                print(f"Failed to parse AI response: {e}")
-                print(f"Raw response: {response}")
-                parsed = None
-
-            # Determine posts list from parsed structure
-            posts_list = []
-            if isinstance(parsed, dict):
-                maybe_posts = parsed.get('response')
-                if isinstance(maybe_posts, list):
-                    posts_list = maybe_posts
-                elif isinstance(maybe_posts, str):
-                    # Some models return the posts array as a JSON string
-                    try:
-                        posts_list = json.loads(maybe_posts)
-                    except Exception:
-                        posts_list = []
-            elif isinstance(parsed, list):
-                posts_list = parsed
+            model = get_model()
+            generated = model.structured_completion(messages, GENERATED_POSTS)
 
             posts_to_insert = []
-            for item in posts_list:
-                if not isinstance(item, dict):
-                    continue
-                subreddit_value = item.get('Subreddit', '') or ''
-                if isinstance(subreddit_value, str):
-                    subreddit_value = subreddit_value.replace('r/', '')
+            for item in generated.posts:
                 post_entry = {
                     'id': str(uuid.uuid4()),
                     'user_id': user_id,
                     'product_id': product_id,
-                    'subreddit': subreddit_value,
-                    'title': item.get('Title', '') or '',
-                    'description': item.get('Post', '') or '',
+                    'subreddit': item.subreddit.replace('r/', ''),
+                    'title': item.title,
+                    'description': item.body,
                     'read': False
                 }
                 posts_to_insert.append(post_entry)
@@ -106,7 +77,13 @@ class GenerateRedditPost(MethodView):
                     # Continue even if database save fails
 
             return jsonify({'response': posts_to_insert})
-            
+
+        except LLMUnavailableError as e:
+            print(f"Reddit post generation unavailable: {e}")
+            return jsonify({'error': 'AI service temporarily unavailable. Please try again.'}), 503
+        except StructuredOutputError as e:
+            print(f"Failed to parse AI response: {e}")
+            return jsonify({'error': 'AI returned an invalid answer. Please try again.'}), 502
         except Exception as e:
             print(f"Error generating reddit post: {str(e)}")
             return jsonify({'error': 'Internal server error'}), 500
@@ -115,9 +92,7 @@ class GenerateRedditPost(MethodView):
 class GetRedditPosts(MethodView):
     @verify_supabase_token
     def get(self):
-        supabase_url = current_app.config['SUPABASE_URL']
-        supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
-        supabase: Client = create_client(supabase_url, supabase_key)
+        supabase: Client = get_supabase()
 
         user_id = g.current_user['id']
         result = supabase.table('posts').select('*').eq('user_id', user_id).execute()
@@ -132,9 +107,7 @@ class MarkRedditPostAsRead(MethodView):
         data = request.get_json()
         post_id = data.get('post_id')
 
-        supabase_url = current_app.config['SUPABASE_URL']
-        supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
-        supabase: Client = create_client(supabase_url, supabase_key)
+        supabase: Client = get_supabase()
 
         result = supabase.table('posts').update({'read': True}).eq('id', post_id).execute()
         return jsonify(result.data)
@@ -148,8 +121,12 @@ class CreateKarmaComment(MethodView):
 
         messages = comment_karma_prompt(posts)
 
-        model = Model()
-        response = model.gemini_chat_completion(messages)
+        model = get_model()
+        try:
+            response = model.gemini_chat_completion(messages)
+        except LLMUnavailableError as e:
+            print(f"Karma comment generation unavailable: {e}")
+            return jsonify({'error': 'AI service temporarily unavailable. Please try again.'}), 503
 
         return jsonify({'response': response})
 
@@ -161,20 +138,26 @@ class CreateKarmaPost(MethodView):
         try:
             messages, subreddit, webp_base64 = create_karma_post()
 
-            model = Model()
-            response = model.gemini_chat_completion(messages)
-            post = json.loads(response)
+            model = get_model()
+            # Same image -> same title
+            post = model.structured_completion(messages, KARMA_TITLE, cache_ttl=LLM_CACHE_TTL_DAY)
 
             # Convert base64 to data URL for display
             image_data_url = f"data:image/webp;base64,{webp_base64}"
 
             return jsonify({
-                'title': post['title'],
+                'title': post.title,
                 'subreddit': subreddit,
-                'description': post.get('description', None),
+                'description': None,
                 'image_url': image_data_url
             })
-            
+
+        except LLMUnavailableError as e:
+            print(f"Karma post generation unavailable: {e}")
+            return jsonify({'error': 'AI service temporarily unavailable. Please try again.'}), 503
+        except StructuredOutputError as e:
+            print(f"Failed to parse AI response: {e}")
+            return jsonify({'error': 'AI returned an invalid answer. Please try again.'}), 502
         except Exception as e:
             print(f"Error in create_karma_post: {str(e)}")
             return jsonify({'error': 'Internal server error'}), 500
@@ -187,9 +170,7 @@ class MarkRedditPostAsRead(MethodView):
         data = request.get_json()
         post_id = data.get('post_id')
 
-        supabase_url = current_app.config['SUPABASE_URL']
-        supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
-        supabase: Client = create_client(supabase_url, supabase_key)
+        supabase: Client = get_supabase()
 
         result = supabase.table('posts').update({'read': True}).eq('id', post_id).execute()
         return jsonify(result.data)
@@ -203,9 +184,7 @@ class MarkRedditPostAsUnread(MethodView):
         data = request.get_json()
         post_id = data.get('post_id')
         
-        supabase_url = current_app.config['SUPABASE_URL']
-        supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
-        supabase: Client = create_client(supabase_url, supabase_key)
+        supabase: Client = get_supabase()
 
         result = supabase.table('posts').update({'read': False}).eq('id', post_id).execute()
         return jsonify(result.data)
@@ -218,9 +197,7 @@ class DeleteRedditPost(MethodView):
         data = request.get_json()
         post_id = data.get('post_id')
         
-        supabase_url = current_app.config['SUPABASE_URL']
-        supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
-        supabase: Client = create_client(supabase_url, supabase_key)
+        supabase: Client = get_supabase()
 
         result = supabase.table('posts').delete().eq('id', post_id).execute()
         return jsonify(result.data)
\ No newline at end of file
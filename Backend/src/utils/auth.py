@@ -46,4 +46,22 @@ def verify_supabase_token(f):
         # Call the actual function after successful authentication
         return f(*args, **kwargs)
 
-    return decorated_function 
\ No newline at end of file
+    return decorated_function
+
+def verify_cron_token(f):
+    """Decorator to verify the shared CRON_TOKEN used by scheduled and admin calls"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({'error': 'Missing or invalid Authorization header'}), 401
+
+        token = auth_header.split(' ')[1]
+        cron_token = os.getenv('CRON_TOKEN')
+
+        if not cron_token or token != cron_token:
+            return jsonify({'error': 'Invalid token'}), 401
+
+        return f(*args, **kwargs)
+
+    return decorated_function
@@ -0,0 +1,206 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from src.utils.cost_calculator import get_tokenizer
+from src.utils.llm_telemetry import current_tags
+
+logger = logging.getLogger(__name__)
+
+# Which provider keeps cached system prompts: 'gemini', 'stub' (in-process, for tests) or 'off'
+LLM_CONTEXT_CACHE_PROVIDER = os.getenv('LLM_CONTEXT_CACHE_PROVIDER', 'gemini')
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv('CONTEXT_CACHE_TTL_SECONDS', '3600'))
+# Gemini refuses explicit caches below its minimum prompt size; shorter prompts go uncached.
+# The lead-selection system prompt carries a shared block of worked examples
+# that keeps it above the minimum. The stage-2 prompt (~550 tokens, one call
+# per run) stays below it.
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv('CONTEXT_CACHE_MIN_TOKENS', '1024'))
+# A prompt whose cache couldn't be created isn't tried again for this long
+CONTEXT_CACHE_RETRY_AFTER_SECONDS = int(os.getenv('CONTEXT_CACHE_RETRY_AFTER_SECONDS', '300'))
+# Handles are dropped a little before the provider expires them
+CONTEXT_CACHE_EXPIRY_MARGIN_SECONDS = 60
+
+
+class GeminiContextCacheProvider:
+    """Explicit Gemini context caches holding a system instruction"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, model: str, system_prompt: str, ttl_seconds: int) -> str:
+        from google.genai import types
+        cache = self.client.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                system_instruction=system_prompt,
+                ttl=f"{ttl_seconds}s",
+            ),
+        )
+        return cache.name
+
+    def delete(self, name: str) -> None:
+        self.client.caches.delete(name=name)
+
+
+class StubContextCacheProvider:
+    """In-process stand-in for a provider cache, so the registry can be exercised without network"""
+
+    def __init__(self):
+        self.contents: Dict[str, Dict[str, Any]] = {}
+        self.created = 0
+        self.deleted = 0
+
+    def create(self, model: str, system_prompt: str, ttl_seconds: int) -> str:
+        name = f"cachedContents/stub-{uuid.uuid4().hex[:12]}"
+        self.contents[name] = {"model": model, "system_prompt": system_prompt, "ttl_seconds": ttl_seconds}
+        self.created += 1
+        return name
+
+    def delete(self, name: str) -> None:
+        if self.contents.pop(name, None) is not None:
+            self.deleted += 1
+
+
+class CachedContextHandle:
+    def __init__(self, name: str, product_id: Optional[str], tokens: int, expires_at: float):
+        self.name = name
+        self.product_id = product_id
+        self.tokens = tokens
+        self.expires_at = expires_at
+        self.uses = 0
+
+
+class ContextCacheRegistry:
+    """
+    Provider cache handles for system prompts, reused across batches and cron cycles.
+
+    Handles are keyed by (model, system prompt hash): the prompt embeds the
+    product fields, so a product edit yields a new key, and
+    invalidate_product() deletes the old handles right away. Saved tokens are
+    counted on every reuse.
+
+    Prompts that are too small, or whose cache creation failed, are
+    remembered, so they aren't tokenized or sent to the provider on every call.
+    """
+
+    def __init__(self,
+                 provider=None,
+                 ttl_seconds: int = CONTEXT_CACHE_TTL_SECONDS,
+                 min_tokens: int = CONTEXT_CACHE_MIN_TOKENS):
+        self.provider = provider
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self._handles: Dict[tuple, CachedContextHandle] = {}
+        # key -> (time until which the prompt goes uncached without asking the provider, reason)
+        self._uncached: Dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.skipped_small = 0
+        self.skipped_failed = 0
+        self.failures = 0
+        self.saved_tokens = 0
+        # Cached input tokens the providers reported, by provider (explicit
+        # caches plus Gemini's implicit and Groq's automatic prefix caching)
+        self.provider_cached_tokens: Dict[str, int] = {}
+
+    @staticmethod
+    def _key(model: str, system_prompt: str) -> tuple:
+        return model, hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()
+
+    def get_or_create(self, model: str, system_prompt: str) -> Optional[str]:
+        """Name of a cached content holding `system_prompt`, or None when it can't or shouldn't be cached"""
+        if self.provider is None or not system_prompt:
+            return None
+
+        key = self._key(model, system_prompt)
+        now = time.time()
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is not None and handle.expires_at > now:
+                handle.uses += 1
+                self.reused += 1
+                self.saved_tokens += handle.tokens
+                return handle.name
+            uncached = self._uncached.get(key)
+            if uncached is not None and uncached[0] > now:
+                if uncached[1] == 'small':
+                    self.skipped_small += 1
+                else:
+                    self.skipped_failed += 1
+                return None
+
+        tokens = len(get_tokenizer().encode(system_prompt))
+        if tokens < self.min_tokens:
+            with self._lock:
+                self.skipped_small += 1
+                # The prompt won't grow, so it is measured once per TTL
+                self._skip(key, now + self.ttl_seconds, 'small', now)
+            return None
+
+        # Concurrent batches may both create a handle; the later one replaces the earlier
+        try:
+            name = self.provider.create(model, system_prompt, self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Could not create context cache for {model}: {e}")
+            with self._lock:
+                self.failures += 1
+                self._skip(key, now + CONTEXT_CACHE_RETRY_AFTER_SECONDS, 'failed', now)
+            return None
+
+        handle = CachedContextHandle(name, current_tags().get('product_id'), tokens,
+                                     now + self.ttl_seconds - CONTEXT_CACHE_EXPIRY_MARGIN_SECONDS)
+        with self._lock:
+            self._handles[key] = handle
+            self.created += 1
+        return name
+
+    def _skip(self, key: tuple, until: float, reason: str, now: float) -> None:
+        # Called with the lock held; expired entries are dropped so the map stays small
+        for stale in [k for k, (expires_at, _) in self._uncached.items() if expires_at <= now]:
+            del self._uncached[stale]
+        self._uncached[key] = (until, reason)
+
+    def record_usage(self, provider: str, usage: Optional[Dict[str, int]]) -> None:
+        """Count the cached input tokens an answer reported"""
+        if usage and usage.get('cached_tokens'):
+            with self._lock:
+                self.provider_cached_tokens[provider] = self.provider_cached_tokens.get(provider, 0) + usage['cached_tokens']
+
+    def discard(self, name: str) -> None:
+        """Forget a handle the provider no longer accepts (e.g. expired early)"""
+        with self._lock:
+            for key, handle in list(self._handles.items()):
+                if handle.name == name:
+                    del self._handles[key]
+
+    def invalidate_product(self, product_id) -> None:
+        """Delete every handle created for a product, e.g. after its fields changed"""
+        with self._lock:
+            stale = [(key, handle) for key, handle in self._handles.items() if handle.product_id == product_id]
+            for key, _ in stale:
+                del self._handles[key]
+
+        for _, handle in stale:
+            try:
+                self.provider.delete(handle.name)
+            except Exception as e:
+                logger.warning(f"Could not delete context cache {handle.name}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "provider": type(self.provider).__name__ if self.provider is not None else None,
+                "handles": len(self._handles),
+                "created": self.created,
+                "reused": self.reused,
+                "skipped_small": self.skipped_small,
+                "skipped_failed": self.skipped_failed,
+                "failures": self.failures,
+                "saved_tokens": self.saved_tokens,
+                "provider_cached_tokens": dict(self.provider_cached_tokens),
+            }
@@ -1,19 +1,44 @@
+import threading
 import tiktoken
 from typing import List, Dict, Any
 
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+def get_tokenizer():
+    """Load the cl100k_base encoding once per process and share it"""
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                _tokenizer = tiktoken.get_encoding("cl100k_base")
+    return _tokenizer
+
 class GeminiCostCalculator:
-    """Cost calculator for Gemini models with current pricing"""
+    """Cost calculator for the models we call (Gemini and Groq) with current pricing"""
     
     GEMINI_PRICING = {
         "gemini-2.5-flash": {
             "input": 0.3 / 1_000_000,  # $0.3 per 1M tokens
+            "cached_input": 0.075 / 1_000_000,  # $0.075 per 1M cached tokens
             "output": 2.5 / 1_000_000,   # $2.5 per 1M tokens
         },
+        "openai/gpt-oss-20b": {
+            "input": 0.075 / 1_000_000,  # $0.075 per 1M tokens (Groq)
+            "cached_input": 0.0375 / 1_000_000,  # $0.0375 per 1M cached tokens
+            "output": 0.3 / 1_000_000,   # $0.3 per 1M tokens
+        },
+        "openai/gpt-oss-120b": {
+            "input": 0.15 / 1_000_000,  # $0.15 per 1M tokens (Groq)
+            "cached_input": 0.075 / 1_000_000,  # $0.075 per 1M cached tokens
+            "output": 0.6 / 1_000_000,   # $0.6 per 1M tokens
+        },
     }
     
     def __init__(self, model: str = "gemini-2.5-flash"):
         self.model = model
-        self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        self.tokenizer = get_tokenizer()
     
     def count_tokens(self, text: str) -> int:
         """Count tokens in a text string"""
@@ -36,8 +61,9 @@ class GeminiCostCalculator:
     def calculate_cost(self, 
                       input_tokens: int = 0, 
                       output_tokens: int = 0,
-                      messages: List[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """Calculate the cost for a Gemini API call"""
+                      messages: List[Dict[str, Any]] = None,
+                      cached_tokens: int = 0) -> Dict[str, Any]:
+        """Calculate the cost for an API call; `cached_tokens` is the part of the input served from the provider cache"""
         
         # If messages provided, count input tokens
         if messages:
@@ -50,7 +76,8 @@ class GeminiCostCalculator:
         pricing = self.GEMINI_PRICING[self.model]
         
         # Calculate costs
-        input_cost = input_tokens * pricing["input"]
+        cached_tokens = min(cached_tokens, input_tokens)
+        input_cost = (input_tokens - cached_tokens) * pricing["input"] + cached_tokens * pricing["cached_input"]
         output_cost = output_tokens * pricing["output"]
         total_cost = input_cost + output_cost
         
@@ -58,6 +85,7 @@ class GeminiCostCalculator:
             "model": self.model,
             "input_tokens": input_tokens,
             "output_tokens": output_tokens,
+            "cached_tokens": cached_tokens,
             "input_cost": input_cost,
             "output_cost": output_cost,
             "total_cost": total_cost,
@@ -1,9 +1,8 @@
 from PIL import Image
 import io
-import os
 import uuid
-from supabase import create_client, Client
-from flask import current_app
+from supabase import Client
+from src.utils.supabase_pool import get_supabase
 
 def convert_to_webp(image_data, quality=100, optimize=True):
     # Open the image from bytes
@@ -23,9 +22,7 @@ def convert_to_webp(image_data, quality=100, optimize=True):
 def upload_image_to_storage(image_data, user_id, filename=None):
     try:
         # Initialize Supabase client
-        supabase_url = current_app.config['SUPABASE_URL']
-        supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
-        supabase: Client = create_client(supabase_url, supabase_key)
+        supabase: Client = get_supabase()
         
         # Generate filename if not provided
         if not filename:
@@ -54,9 +51,7 @@ def upload_image_to_storage(image_data, user_id, filename=None):
 
 def get_signed_url(storage_path, expires_in=3600):
     try:
-        supabase_url = current_app.config['SUPABASE_URL']
-        supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
-        supabase: Client = create_client(supabase_url, supabase_key)
+        supabase: Client = get_supabase()
         
         # Get signed URL
         result = supabase.storage.from_('photos').create_signed_url(
@@ -71,9 +66,7 @@ def get_signed_url(storage_path, expires_in=3600):
 
 def get_storage_url(storage_path):
     try:
-        supabase_url = current_app.config['SUPABASE_URL']
-        supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
-        supabase: Client = create_client(supabase_url, supabase_key)
+        supabase: Client = get_supabase()
         
         # Get public URL
         result = supabase.storage.from_('photos').get_public_url(storage_path)
@@ -0,0 +1,102 @@
+import json
+import logging
+from typing import Any, List
+
+logger = logging.getLogger(__name__)
+
+
+class JsonArrayItemParser:
+    """
+    Incremental parser for a streamed JSON document of the form
+    `{"<key>": [item, item, ...], ...}`.
+
+    feed() takes text chunks as they arrive and returns every object item of
+    the `key` array that closed within them, so callers can act on each item
+    before the document ends. Only brackets, strings and escapes are tracked;
+    each finished item is decoded with json.loads. `text` is the whole answer
+    received so far, for callers that fall back to decoding it at once.
+
+    Only the text of an unfinished item or key is kept for scanning, so a long
+    answer fed in many small chunks is parsed in linear time.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self._chunks: List[str] = []
+        # Unparsed-but-needed text, starting at absolute position _buffer_start
+        self._buffer = ""
+        self._buffer_start = 0
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._string_start = -1
+        self._last_key = None
+        self._last_string = None
+        self._array_depth = None
+        self._item_start = -1
+        self.emitted = 0
+
+    def feed(self, chunk: str) -> List[Any]:
+        if not chunk:
+            return []
+        self._chunks.append(chunk)
+        items = []
+        text = self._buffer + chunk
+        start = self._buffer_start
+        end = start + len(text)
+        for pos in range(self._pos, end):
+            char = text[pos - start]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1 and self._stack[0] == '{':
+                        self._last_string = text[self._string_start - start:pos + 1 - start]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char == ':' and len(self._stack) == 1 and self._last_string is not None:
+                try:
+                    self._last_key = json.loads(self._last_string)
+                except ValueError:
+                    self._last_key = None
+            elif char in '{[':
+                if char == '[' and len(self._stack) == 1 and self._last_key == self.key:
+                    self._array_depth = len(self._stack) + 1
+                elif char == '{' and self._array_depth is not None and len(self._stack) == self._array_depth:
+                    self._item_start = pos
+                self._stack.append(char)
+            elif char in '}]':
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if char == '}' and self._item_start >= 0 and len(self._stack) == self._array_depth:
+                    try:
+                        items.append(json.loads(text[self._item_start - start:pos + 1 - start]))
+                    except ValueError as e:
+                        logger.warning(f"Skipping undecodable streamed item: {e}")
+                    self._item_start = -1
+                elif char == ']' and self._array_depth is not None and len(self._stack) == self._array_depth - 1:
+                    self._array_depth = None
+        self._pos = end
+        self.emitted += len(items)
+
+        # Keep the open item, or the open key string, for the next chunk
+        keep_from = end
+        if self._item_start >= 0:
+            keep_from = self._item_start
+        elif self._in_string and len(self._stack) == 1:
+            keep_from = self._string_start
+        self._buffer = text[keep_from - start:]
+        self._buffer_start = keep_from
+        return items
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
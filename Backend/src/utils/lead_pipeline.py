@@ -0,0 +1,366 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from typing import Any, Dict, Iterable, List, Tuple
+
+from src.utils.prompt_generator import (
+    lead_generation_prompt, lead_generation_prompt_2, encode_posts_compact, serialize_posts, measure_post_encoding_savings, COMPACT_POST_ENCODING
+)
+from src.utils.reddit_helpers import format_post_metadata, fetch_comments_for_posts
+from src.utils.retry_policy import LLMUnavailableError
+from src.utils.llm_telemetry import llm_tags, submit_in_context
+from src.utils.lexical_prefilter import LexicalPrefilter, prefilter_stats, LEXICAL_PREFILTER
+from src.utils.semantic_prefilter import SemanticPrefilter, SEMANTIC_PREFILTER
+from src.utils.near_duplicates import near_duplicates, post_text, NEAR_DUPLICATE_FILTER
+from src.utils.json_stream import JsonArrayItemParser
+from src.utils.llm_schemas import POST_SELECTION, LEAD_COMMENTS, StructuredOutputError, decode_lead_comment, correction_messages
+
+logger = logging.getLogger(__name__)
+
+# Batches are packed up to a token budget of post payload, capped at a post count
+CLASSIFICATION_BATCH_SIZE = int(os.getenv('CLASSIFICATION_MAX_POSTS_PER_BATCH', '20'))
+CLASSIFICATION_TOKEN_BUDGET = int(os.getenv('CLASSIFICATION_TOKEN_BUDGET', '2500'))
+CLASSIFICATION_WORKERS = 3
+
+# Stage 2: 'stream' sends every shortlisted post in one streamed call;
+# 'parallel' fans out small per-post units under the global LLM limit
+STAGE2_MODE = os.getenv('STAGE2_MODE', 'stream')
+STAGE2_POSTS_PER_CALL = int(os.getenv('STAGE2_POSTS_PER_CALL', '2'))
+STAGE2_WORKERS = int(os.getenv('STAGE2_WORKERS', '4'))
+STAGE2_UNIT_ATTEMPTS = int(os.getenv('STAGE2_UNIT_ATTEMPTS', '2'))
+
+
+def post_payload_tokens(model, post):
+    """Tokens a post adds to the classification prompt, counted as the prompt serializes it"""
+    payload = encode_posts_compact([post]) if COMPACT_POST_ENCODING else serialize_posts([post], compact=False)
+    return model.cost_calculator.count_tokens(payload)
+
+
+class _BatchCounter:
+    """Counts the batches a stream of posts packs into, without sending any"""
+
+    def __init__(self, batch_size, token_budget):
+        self.batch_size = batch_size
+        self.token_budget = token_budget
+        self.batches = 0
+        self._posts = 0
+        self._tokens = 0
+
+    def add(self, post_tokens):
+        if self._posts and self._tokens + post_tokens > self.token_budget:
+            self.batches += 1
+            self._posts, self._tokens = 0, 0
+        self._posts += 1
+        self._tokens += post_tokens
+        if self._posts >= self.batch_size:
+            self.batches += 1
+            self._posts, self._tokens = 0, 0
+
+    def total(self):
+        return self.batches + (1 if self._posts else 0)
+
+
+def classify_batch(product_data, model, posts, batch_indexes):
+    """
+    Ask the classifier which posts of one batch are lead opportunities.
+
+    Posts are renumbered 0..n-1 inside the batch so the model only ever sees
+    local ids; the selected local ids are mapped back through `batch_indexes`
+    to global post indexes. Returns None when the answer still can't be parsed
+    after the structured-output retry.
+    """
+    batch = [{**posts[idx], "post_id": local_id} for local_id, idx in enumerate(batch_indexes)]
+    messages = lead_generation_prompt(product_data, batch)
+    if COMPACT_POST_ENCODING and logger.isEnabledFor(logging.DEBUG):
+        savings = measure_post_encoding_savings(product_data, batch)
+        logger.debug(f"Batch starting at index {batch_indexes[0]}: compact encoding saved {savings['saved_tokens']} of {savings['json_tokens']} tokens")
+    try:
+        selection = model.structured_completion(messages, POST_SELECTION, classification=True)
+    except StructuredOutputError as e:
+        logger.error(f"Failed to parse AI response for batch starting at index {batch_indexes[0]}: {e}")
+        return None
+
+    logger.debug(f"Batch starting at index {batch_indexes[0]}: AI selected {selection.selected_post_ids}")
+    return [batch_indexes[local_id] for local_id in selection.selected_post_ids if 0 <= local_id < len(batch_indexes)]
+
+
+def select_lead_posts(product_data,
+                      model,
+                      post_stream: Iterable[List[Dict[str, Any]]],
+                      batch_size: int = CLASSIFICATION_BATCH_SIZE,
+                      token_budget: int = CLASSIFICATION_TOKEN_BUDGET,
+                      max_workers: int = CLASSIFICATION_WORKERS,
+                      verdicts=None,
+                      prefilter=None,
+                      duplicates=None,
+                      existing_leads=None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[int], List[int]]:
+    """
+    Stream listed posts into classification.
+
+    `post_stream` yields lists of listed posts (see iter_new_posts_metadata). Posts
+    get global indexes in arrival order, and a classification batch is submitted
+    as soon as the waiting posts fill `token_budget` tokens (or reach
+    `batch_size` posts), while other subreddits are still loading. A single post
+    larger than the budget goes out alone. Returns (unformatted_posts, posts,
+    selected_indexes, judged_indexes), both index lists sorted.
+
+    judged_indexes are the posts that got a verdict this run (reused, or from
+    a batch that finished) or were dropped as near-duplicates or by the
+    prefilter. Posts of batches the classifier gave up on, or whose answer
+    couldn't be parsed, are left out so callers can list them again.
+
+    With a `verdicts` store (see src.utils.lead_verdicts), posts already judged
+    for this product revision reuse their verdict and skip the LLM, and new
+    verdicts are recorded once their batch finishes.
+
+    Posts whose reddit_post_id is in `existing_leads` (the user's leads, see
+    existing_lead_ids) are judged but never classified or selected, so a
+    cached "selected" verdict doesn't send the same post to comment
+    generation on every run.
+
+    Unjudged posts that are near-copies (MinHash/LSH over title + selftext) of
+    a post seen earlier in the run or in recent runs of the product are
+    dropped, keeping the first copy as the cluster's representative;
+    `duplicates` is the NearDuplicateIndex to check against (the product's
+    rolling index unless NEAR_DUPLICATE_FILTER is off).
+
+    The remaining posts of each subreddit then go through a local relevance
+    `prefilter` (by default a SemanticPrefilter when SEMANTIC_PREFILTER is on,
+    else a LexicalPrefilter when LEXICAL_PREFILTER is on; both are off unless
+    configured), and only the posts it keeps are classified. Dropped posts are
+    rejected without being recorded as verdicts, but they are judged, so
+    cursors advance past them for good.
+    """
+    if prefilter is None:
+        if SEMANTIC_PREFILTER:
+            prefilter = SemanticPrefilter(product_data)
+        elif LEXICAL_PREFILTER:
+            prefilter = LexicalPrefilter(product_data)
+    if duplicates is None and NEAR_DUPLICATE_FILTER:
+        duplicates = near_duplicates.for_product(product_data.get('id'))
+
+    unformatted_posts: List[Dict[str, Any]] = []
+    posts: List[Dict[str, Any]] = []
+    selected_indexes: List[int] = []
+    judged_indexes: List[int] = []
+    pending: List[int] = []
+    pending_tokens = 0
+    future_to_batch = {}
+    # Batches the run would have sent without the prefilter
+    unfiltered_batches = _BatchCounter(batch_size, token_budget)
+    dropped = 0
+    duplicates_checked, duplicates_dropped = 0, 0
+
+    # Batches run on executor threads; submit_in_context carries the tags over
+    with llm_tags(stage='classification', product_id=product_data.get('id')), ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def submit(batch_indexes):
+            future = submit_in_context(executor, classify_batch, product_data, model, posts, batch_indexes)
+            future_to_batch[future] = batch_indexes
+
+        for subreddit_posts in post_stream:
+            known = verdicts.lookup([post['reddit_post_id'] for post in subreddit_posts]) if verdicts is not None else {}
+            unjudged = []
+            for unformatted in subreddit_posts:
+                idx = len(unformatted_posts)
+                unformatted_posts.append(unformatted)
+                posts.append(format_post_metadata(unformatted, idx))
+                if existing_leads and unformatted['reddit_post_id'] in existing_leads:
+                    judged_indexes.append(idx)
+                    continue
+                if unformatted['reddit_post_id'] in known:
+                    if known[unformatted['reddit_post_id']]:
+                        selected_indexes.append(idx)
+                    judged_indexes.append(idx)
+                    continue
+                if duplicates is not None:
+                    duplicates_checked += 1
+                    if duplicates.check_and_add(unformatted['reddit_post_id'], post_text(unformatted)) is not None:
+                        duplicates_dropped += 1
+                        judged_indexes.append(idx)
+                        continue
+                unjudged.append(idx)
+
+            if prefilter is not None:
+                kept = {unjudged[i] for i in prefilter.select([unformatted_posts[idx] for idx in unjudged])}
+            else:
+                kept = set(unjudged)
+
+            for idx in unjudged:
+                post_tokens = post_payload_tokens(model, posts[idx])
+                unfiltered_batches.add(post_tokens)
+                if idx not in kept:
+                    dropped += 1
+                    judged_indexes.append(idx)
+                    continue
+
+                if pending and pending_tokens + post_tokens > token_budget:
+                    submit(pending)
+                    pending, pending_tokens = [], 0
+                pending.append(idx)
+                pending_tokens += post_tokens
+                if len(pending) >= batch_size:
+                    submit(pending)
+                    pending, pending_tokens = [], 0
+
+        if pending:
+            submit(pending)
+
+        for future in as_completed(future_to_batch):
+            batch_indexes = future_to_batch[future]
+            try:
+                batch_selected = future.result()
+                if batch_selected is None:
+                    continue
+                selected_indexes.extend(batch_selected)
+                judged_indexes.extend(batch_indexes)
+                if verdicts is not None:
+                    selected = set(batch_selected)
+                    verdicts.record({unformatted_posts[idx]['reddit_post_id']: idx in selected for idx in batch_indexes})
+            except LLMUnavailableError as e:
+                logger.warning(f"Classifier gave up on batch starting at index {batch_indexes[0]}: {e}")
+            except Exception as e:
+                logger.error(f"Error processing batch starting at index {batch_indexes[0]}: {e}")
+
+    if verdicts is not None:
+        verdicts.flush()
+
+    if duplicates is not None:
+        near_duplicates.count(duplicates_checked, duplicates_dropped)
+        logger.info(f"Dropped {duplicates_dropped} near-duplicate posts")
+
+    if prefilter is not None:
+        calls_avoided = max(0, unfiltered_batches.total() - len(future_to_batch))
+        prefilter_stats.add(getattr(prefilter, 'name', type(prefilter).__name__), scored=dropped + sum(len(b) for b in future_to_batch.values()), dropped=dropped, calls_avoided=calls_avoided)
+        logger.info(f"{type(prefilter).__name__} dropped {dropped} posts, avoiding {calls_avoided} classification calls")
+
+    logger.info(f"Classified {len(posts)} posts in {len(future_to_batch)} batches, selected {len(selected_indexes)}")
+    return unformatted_posts, posts, sorted(set(selected_indexes)), sorted(judged_indexes)
+
+
+def enrich_with_comments(unformatted_posts, posts, selected_indexes, comments_per_post=3):
+    """Fetch top comments for the shortlisted posts and attach them to their payloads"""
+    try:
+        selected_reddit_ids = [unformatted_posts[idx]['reddit_post_id'] for idx in selected_indexes]
+        num_comments_by_id = {unformatted_posts[idx]['reddit_post_id']: unformatted_posts[idx]['num_comments'] for idx in selected_indexes}
+        comments_by_post_id = fetch_comments_for_posts(selected_reddit_ids, comments_per_post=comments_per_post, num_comments_by_id=num_comments_by_id)
+    except Exception as e:
+        logger.error(f"Failed to fetch comments for shortlisted posts: {e}")
+        comments_by_post_id = {}
+
+    selected_posts_with_comments = []
+    for idx in selected_indexes:
+        try:
+            reddit_id = unformatted_posts[idx]['reddit_post_id']
+            selected_posts_with_comments.append({**posts[idx], "top_comments": comments_by_post_id.get(reddit_id, [])})
+        except Exception as e:
+            logger.error(f"Error enriching post {idx} with comments: {e}")
+
+    return selected_posts_with_comments
+
+
+def stream_generated_comments(model, messages, post_ids, deadline=None):
+    """
+    Stream the schema-constrained stage-2 answer and yield (post_index, comment)
+    as soon as each `{"post_id", "comment"}` item closes. Each post index is
+    yielded once, and only if it is one of the `post_ids` sent in the prompt.
+
+    If the stream produced no items and the whole answer doesn't decode
+    either, the prompt is asked once more without streaming (see
+    Model.structured_completion) instead of yielding nothing.
+    """
+    parser = JsonArrayItemParser('comments')
+    seen = set()
+
+    def unpack(comments):
+        for comment in comments:
+            if comment.post_id not in post_ids:
+                logger.warning(f"Skipping comment for post {comment.post_id}, which wasn't shortlisted")
+                continue
+            if comment.post_id in seen:
+                continue
+            seen.add(comment.post_id)
+            yield comment.post_id, comment.comment
+
+    def decode_items(items):
+        for item in items:
+            try:
+                yield decode_lead_comment(item)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Skipping streamed comment that doesn't match the schema: {e!r}")
+
+    for chunk in model.gemini_chat_completion(messages, deadline=deadline, stream=True, schema=LEAD_COMMENTS):
+        yield from unpack(decode_items(parser.feed(chunk)))
+    if parser.emitted:
+        return
+
+    try:
+        answer = LEAD_COMMENTS.decode(parser.text or "{}")
+    except StructuredOutputError as e:
+        logger.warning(f"Streamed comments didn't decode, asking again: {e}")
+        answer = model.structured_completion(correction_messages(messages, parser.text, e), LEAD_COMMENTS, deadline=deadline)
+    yield from unpack(answer.comments)
+
+
+def generate_comments_unit(product_data, model, unit_posts):
+    """
+    Comments for one small unit of shortlisted posts, as {post_index: comment}.
+
+    Raises StructuredOutputError (a ValueError) when the answer still can't be
+    parsed after the structured-output retry, so the unit can be retried.
+    """
+    messages = lead_generation_prompt_2(product_data, unit_posts, min_posts=0)
+    answer = model.structured_completion(messages, LEAD_COMMENTS)
+    unit_ids = {post['post_id'] for post in unit_posts}
+    return {comment.post_id: comment.comment for comment in answer.comments if comment.post_id in unit_ids}
+
+
+def generate_comments_parallel(product_data, model, posts_with_comments,
+                               posts_per_call=STAGE2_POSTS_PER_CALL,
+                               max_workers=STAGE2_WORKERS,
+                               max_attempts=STAGE2_UNIT_ATTEMPTS):
+    """
+    Fan stage-2 generation out over units of `posts_per_call` posts and yield
+    (post_index, comment) as units finish. A unit whose call fails or whose
+    answer can't be parsed is retried on its own, up to `max_attempts`; the
+    other units' leads are kept either way. Provider calls share the
+    process-wide LLM_MAX_CONCURRENT_CALLS limit.
+    """
+    units = [posts_with_comments[i:i + posts_per_call] for i in range(0, len(posts_with_comments), posts_per_call)]
+    failed_units = 0
+    last_error = None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_unit = {
+            submit_in_context(executor, generate_comments_unit, product_data, model, unit): (unit, 1)
+            for unit in units
+        }
+        while future_to_unit:
+            done, _ = wait(future_to_unit, return_when=FIRST_COMPLETED)
+            for future in done:
+                unit, attempt = future_to_unit.pop(future)
+                try:
+                    generated = future.result()
+                except (LLMUnavailableError, ValueError) as e:
+                    unit_ids = [post['post_id'] for post in unit]
+                    if attempt < max_attempts:
+                        logger.warning(f"Retrying comment unit {unit_ids} (attempt {attempt}): {e}")
+                        retry = submit_in_context(executor, generate_comments_unit, product_data, model, unit)
+                        future_to_unit[retry] = (unit, attempt + 1)
+                    else:
+                        failed_units += 1
+                        last_error = e
+                        logger.error(f"Giving up on comment unit {unit_ids}: {e}")
+                    continue
+                yield from generated.items()
+
+    logger.info(f"Generated comments in {len(units)} units ({failed_units} failed)")
+    if units and failed_units == len(units) and isinstance(last_error, LLMUnavailableError):
+        raise last_error
+
+
+def generate_lead_comments(product_data, model, posts_with_comments, mode=None):
+    """Stage 2 in the configured STAGE2_MODE; yields (post_index, comment) as they become available"""
+    if (mode or STAGE2_MODE) == 'parallel':
+        return generate_comments_parallel(product_data, model, posts_with_comments)
+    post_ids = {post['post_id'] for post in posts_with_comments}
+    return stream_generated_comments(model, lead_generation_prompt_2(product_data, posts_with_comments), post_ids)
@@ -0,0 +1,97 @@
+import datetime
+import hashlib
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Table: lead_verdicts(product_id, product_revision, reddit_post_id, selected, evaluated_at)
+# with a unique constraint on (product_id, product_revision, reddit_post_id).
+VERDICT_TABLE = 'lead_verdicts'
+
+# Product fields the classification prompt depends on
+REVISION_FIELDS = ('name', 'description', 'target_audience', 'problem_solved')
+
+# PostgREST puts in_() filters in the URL, so bulk lookups are chunked
+LOOKUP_CHUNK_SIZE = 200
+
+
+def product_revision(product_data):
+    """Hash of the product fields that shape classification; changes whenever they do"""
+    fields = {field: product_data.get(field) or '' for field in REVISION_FIELDS}
+    encoded = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:16]
+
+
+def invalidate_verdicts(supabase, product_id):
+    """Forget every verdict of a product, e.g. after its description or audience changed"""
+    try:
+        supabase.table(VERDICT_TABLE).delete().eq('product_id', product_id).execute()
+    except Exception as e:
+        logger.error(f"Error invalidating lead verdicts for product {product_id}: {e}")
+
+
+class VerdictStore:
+    """Selected/rejected classification verdicts of one product revision.
+
+    Lookups hit the table in bulk; new verdicts are buffered and written by flush().
+    """
+
+    def __init__(self, supabase, product_data):
+        self.supabase = supabase
+        self.product_id = product_data['id']
+        self.revision = product_revision(product_data)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.reused = 0
+
+    def lookup(self, reddit_post_ids):
+        """Return reddit_post_id -> selected for the posts already judged"""
+        verdicts = {}
+        ids = [pid for pid in dict.fromkeys(reddit_post_ids) if pid]
+        for i in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+            chunk = ids[i:i + LOOKUP_CHUNK_SIZE]
+            try:
+                result = self.supabase.table(VERDICT_TABLE).select('reddit_post_id, selected') \
+                    .eq('product_id', self.product_id) \
+                    .eq('product_revision', self.revision) \
+                    .in_('reddit_post_id', chunk) \
+                    .execute()
+            except Exception as e:
+                logger.error(f"Error loading lead verdicts for product {self.product_id}: {e}")
+                continue
+            for row in result.data or []:
+                verdicts[row['reddit_post_id']] = bool(row['selected'])
+
+        with self._lock:
+            self.reused += len(verdicts)
+        return verdicts
+
+    def record(self, verdicts):
+        """Buffer reddit_post_id -> selected verdicts from a finished classification batch"""
+        with self._lock:
+            self._pending.update(verdicts)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        now_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        rows = [
+            {
+                'product_id': self.product_id,
+                'product_revision': self.revision,
+                'reddit_post_id': pid,
+                'selected': selected,
+                'evaluated_at': now_iso,
+            }
+            for pid, selected in pending.items()
+        ]
+        try:
+            self.supabase.table(VERDICT_TABLE).upsert(rows, on_conflict='product_id,product_revision,reddit_post_id').execute()
+            logger.info(f"Stored {len(rows)} lead verdicts for product {self.product_id}")
+        except Exception as e:
+            logger.error(f"Error saving lead verdicts for product {self.product_id}: {e}")
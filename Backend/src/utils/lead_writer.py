@@ -0,0 +1,114 @@
+import datetime
+import logging
+import os
+import random
+import uuid
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Streamed leads are inserted in batches of this size (the immediate ones right away)
+LEAD_INSERT_BATCH_SIZE = int(os.getenv('LEAD_INSERT_BATCH_SIZE', '5'))
+
+
+def scheduling_interval(lead_count):
+    """Base minutes between scheduled leads: spread over ~2 hours, 5 to 45 min apart"""
+    if lead_count <= 0:
+        return 30.0
+    return max(5.0, min(45.0, 120.0 / lead_count))
+
+
+def build_lead(unformatted_post, comment):
+    return {
+        'id': str(uuid.uuid4()),
+        'comment': comment,
+        # The leads table keeps the first 1000 characters of the post, as before
+        'selftext': unformatted_post['selftext'][:1000],
+        'title': unformatted_post['title'],
+        'url': unformatted_post['url'],
+        'reddit_post_id': unformatted_post.get('reddit_post_id'),
+        'score': unformatted_post['score'],
+        'read': False,
+        'num_comments': unformatted_post['num_comments'],
+        'author': unformatted_post['author'],
+        'subreddit': unformatted_post['subreddit'],
+        'date': unformatted_post['date'],
+        'created_at': datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def existing_lead_ids(supabase, user_id):
+    """reddit_post_ids the user already has a lead for"""
+    try:
+        existing = supabase.table('leads').select('reddit_post_id').eq('uid', user_id).execute()
+        return {lead['reddit_post_id'] for lead in existing.data or [] if lead.get('reddit_post_id')}
+    except Exception as e:
+        logger.error(f"Error loading existing leads for user {user_id}: {e}")
+        return set()
+
+
+class ProgressiveLeadWriter:
+    """
+    Builds, deduplicates, schedules and inserts leads one at a time as their
+    comments stream in.
+
+    Posts that already have a lead for the user are skipped (their ids are
+    loaded once up front, unless the caller passes `existing_ids`). The first `immediate` leads are due now; lead k
+    after them is due at k * base + a 0.7x-1.3x jitter of base. The final
+    count isn't known mid-stream, so callers derive `base_interval_minutes`
+    from the number of posts sent to generation.
+    """
+
+    def __init__(self, supabase, user_id, base_interval_minutes, immediate=1, batch_size=LEAD_INSERT_BATCH_SIZE, existing_ids=None):
+        self.supabase = supabase
+        self.user_id = user_id
+        self.base_interval_minutes = base_interval_minutes
+        self.immediate = immediate
+        self.batch_size = batch_size
+        self.start = datetime.datetime.now(datetime.timezone.utc)
+        self.leads: List[Dict[str, Any]] = []
+        self.skipped_duplicates = 0
+        self.saved = 0
+        self.failed = 0
+        self._pending: List[Dict[str, Any]] = []
+
+        self._existing_ids = set(existing_ids) if existing_ids is not None else existing_lead_ids(supabase, user_id)
+
+    def _scheduled_at(self, position):
+        if position < self.immediate:
+            return self.start
+        base = self.base_interval_minutes
+        delay = (position - self.immediate) * base + random.uniform(base * 0.7, base * 1.3)
+        return self.start + datetime.timedelta(minutes=delay)
+
+    def add(self, unformatted_post, comment) -> Optional[Dict[str, Any]]:
+        """Build and queue the lead for one generated comment; None if the post is already a lead"""
+        reddit_post_id = unformatted_post.get('reddit_post_id')
+        if not reddit_post_id or reddit_post_id in self._existing_ids:
+            self.skipped_duplicates += 1
+            return None
+        self._existing_ids.add(reddit_post_id)
+
+        lead = build_lead(unformatted_post, comment)
+        position = len(self.leads)
+        self.leads.append(lead)
+        row = {key: value for key, value in lead.items() if key != 'created_at'}
+        row['uid'] = self.user_id
+        row['scheduled_at'] = self._scheduled_at(position).strftime('%Y-%m-%dT%H:%M:%S')
+        self._pending.append(row)
+
+        if position < self.immediate or len(self._pending) >= self.batch_size:
+            self.flush()
+        return lead
+
+    def flush(self):
+        rows, self._pending = self._pending, []
+        if not rows:
+            return
+        try:
+            self.supabase.table('leads').insert(rows).execute()
+            self.saved += len(rows)
+            logger.info(f"Saved {len(rows)} leads for user {self.user_id}")
+        except Exception as e:
+            self.failed += len(rows)
+            logger.error(f"Error saving leads to database: {e}")
@@ -0,0 +1,171 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+# Off by default: dropped posts count as judged, so subreddit cursors move
+# past them and a post the prefilter misjudged is never classified
+LEXICAL_PREFILTER = os.getenv('LEXICAL_PREFILTER', '0') == '1'
+
+# Share of each subreddit's unjudged posts that reach the LLM classifier,
+# never fewer than PREFILTER_MIN_KEEP (or all of them, if there are fewer).
+# Shared by the lexical and semantic prefilters
+PREFILTER_KEEP_FRACTION = float(os.getenv('PREFILTER_KEEP_FRACTION', '0.5'))
+PREFILTER_MIN_KEEP = int(os.getenv('PREFILTER_MIN_KEEP', '5'))
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# The product name says less about a post than the problem it solves
+PRODUCT_FIELD_WEIGHTS = {
+    'name': 1.0,
+    'description': 1.0,
+    'target_audience': 1.5,
+    'problem_solved': 2.0,
+}
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most
+my myself no nor not now of off on once only or other our ours ourselves out over own same she
+should so some such than that the their theirs them themselves then there these they this those
+through to too under until up very was we were what when where which while who whom why will with
+would you your yours yourself yourselves im ive dont cant get got anyone someone something really
+also like one would use using want need make thing things know
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords, with plural 's' folded"""
+    tokens = []
+    for token in _TOKEN_RE.findall((text or "").lower()):
+        if len(token) < 2 or token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class PrefilterStats:
+    """Process-wide counters of the local prefilters (lexical or semantic, whichever ran)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs: Counter = Counter()
+        self.last_prefilter = None
+        self.posts_scored = 0
+        self.posts_dropped = 0
+        self.llm_calls_avoided = 0
+
+    def add(self, prefilter: str, scored: int = 0, dropped: int = 0, calls_avoided: int = 0) -> None:
+        with self._lock:
+            self.runs[prefilter] += 1
+            self.last_prefilter = prefilter
+            self.posts_scored += scored
+            self.posts_dropped += dropped
+            self.llm_calls_avoided += calls_avoided
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "lexical_enabled": LEXICAL_PREFILTER,
+                "last_prefilter": self.last_prefilter,
+                "runs_by_prefilter": dict(self.runs),
+                "keep_fraction": PREFILTER_KEEP_FRACTION,
+                "min_keep": PREFILTER_MIN_KEEP,
+                "posts_scored": self.posts_scored,
+                "posts_dropped": self.posts_dropped,
+                "llm_calls_avoided": self.llm_calls_avoided,
+            }
+
+
+prefilter_stats = PrefilterStats()
+
+
+class RankingPrefilter:
+    """
+    Keeps the best-scoring share of each batch of posts. Subclasses provide
+    score(posts), one relevance score per post.
+    """
+
+    name = 'ranking'
+
+    def __init__(self, keep_fraction: float = PREFILTER_KEEP_FRACTION, min_keep: int = PREFILTER_MIN_KEEP):
+        self.keep_fraction = keep_fraction
+        self.min_keep = min_keep
+
+    def score(self, posts: Sequence[Dict[str, Any]]) -> np.ndarray:
+        raise NotImplementedError
+
+    def select(self, posts: Sequence[Dict[str, Any]]) -> List[int]:
+        """Positions (into `posts`) of the best-scoring posts worth an LLM look, in input order"""
+        if not posts:
+            return []
+        scores = self.score(posts)
+        keep = min(len(posts), max(self.min_keep, math.ceil(self.keep_fraction * len(posts))))
+        # Stable sort keeps listing order among equal scores
+        ranked = np.argsort(-scores, kind='stable')[:keep]
+        return sorted(int(i) for i in ranked)
+
+
+class LexicalPrefilter(RankingPrefilter):
+    """
+    BM25 relevance of posts (title + selftext) to a product profile.
+
+    The query is the weighted bag of words of the product's name, description,
+    target audience and problem solved. Document frequencies accumulate over
+    every post seen in the run, so later subreddits are scored against better
+    statistics than the first.
+    """
+
+    name = 'lexical'
+
+    def __init__(self, product_data: Dict[str, Any],
+                 keep_fraction: float = PREFILTER_KEEP_FRACTION,
+                 min_keep: int = PREFILTER_MIN_KEEP):
+        super().__init__(keep_fraction, min_keep)
+
+        query = Counter()
+        for field, weight in PRODUCT_FIELD_WEIGHTS.items():
+            for token in tokenize(product_data.get(field) or ""):
+                query[token] += weight
+        self.terms = list(query)
+        self.term_index = {term: i for i, term in enumerate(self.terms)}
+        self.query_weights = np.array([query[term] for term in self.terms], dtype=np.float64)
+
+        self.doc_count = 0
+        self.total_length = 0
+        self.doc_freq = np.zeros(len(self.terms), dtype=np.float64)
+
+    def score(self, posts: Sequence[Dict[str, Any]]) -> np.ndarray:
+        """BM25 score of each post; also folds the posts into the corpus statistics"""
+        tf = np.zeros((len(posts), len(self.terms)), dtype=np.float64)
+        lengths = np.zeros(len(posts), dtype=np.float64)
+        for row, post in enumerate(posts):
+            tokens = tokenize(f"{post.get('title', '')} {post.get('selftext', '')}")
+            lengths[row] = len(tokens)
+            for token in tokens:
+                col = self.term_index.get(token)
+                if col is not None:
+                    tf[row, col] += 1
+
+        self.doc_count += len(posts)
+        self.total_length += int(lengths.sum())
+        self.doc_freq += (tf > 0).sum(axis=0)
+        if not self.terms or not posts:
+            return np.zeros(len(posts), dtype=np.float64)
+
+        avg_length = max(self.total_length / self.doc_count, 1.0)
+        idf = np.log1p((self.doc_count - self.doc_freq + 0.5) / (self.doc_freq + 0.5))
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / avg_length)
+        saturated = tf * (BM25_K1 + 1) / (tf + norm[:, None])
+        return saturated @ (idf * self.query_weights)
@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class _InFlight:
+    """A fetch in progress that other callers for the same key can wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ListingCache:
+    """Process-wide TTL + LRU cache with single-flight filling.
+
+    Concurrent callers that miss on the same key share one fetch: the first
+    caller runs `fetch_fn`, the others block until it finishes and reuse its
+    result (or its exception).
+    """
+
+    def __init__(self, ttl_seconds: float = 600, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._in_flight: Dict[Hashable, _InFlight] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared_fetches = 0
+        self.evictions = 0
+
+    def get_or_fetch(self,
+                     key: Hashable,
+                     fetch_fn: Callable[[], Any],
+                     accept: Optional[Callable[[Any], bool]] = None) -> Any:
+        """Return the cached value for `key`, fetching it once if missing or stale.
+
+        `accept` can reject a fresh cached value (e.g. one fetched with a smaller
+        limit), which forces a refill.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic() and (accept is None or accept(value)):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                in_flight = _InFlight()
+                self._in_flight[key] = in_flight
+                owner = True
+                self.misses += 1
+            else:
+                owner = False
+                self.shared_fetches += 1
+
+        if not owner:
+            in_flight.event.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return in_flight.value
+
+        try:
+            value = fetch_fn()
+            in_flight.value = value
+            self.set(key, value)
+            return value
+        except Exception as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            in_flight.event.set()
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared_fetches": self.shared_fetches,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), '..', '..', '.cache', 'llm_responses.sqlite3')
+
+
+def _normalize_content(content):
+    if isinstance(content, str):
+        # Trailing whitespace and indentation of f-string prompts don't change the request
+        return "\n".join(line.strip() for line in content.strip().splitlines())
+    if isinstance(content, list):
+        return [_normalize_content(item) for item in content]
+    if isinstance(content, dict):
+        return {key: _normalize_content(value) for key, value in content.items()}
+    return content
+
+
+def make_cache_key(model: str, messages: List[Dict[str, Any]], config: Optional[Dict[str, Any]] = None) -> str:
+    """Content address of a request: sha256 over (model, normalized messages, generation config)"""
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": message.get("role", "user"), "content": _normalize_content(message.get("content", ""))}
+            for message in messages
+        ],
+        "config": config or {},
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Two-tier (in-memory LRU + SQLite) cache of LLM responses.
+
+    Entries carry their own expiry so each call site can pick a TTL. The disk
+    tier survives restarts and is shared by every worker on the host.
+    """
+
+    def __init__(self,
+                 path: str = DEFAULT_CACHE_PATH,
+                 memory_entries: int = 256,
+                 disk_entries: int = 10000,
+                 default_ttl: float = 86400):
+        self.path = os.path.abspath(path)
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.default_ttl = default_ttl
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_ready = False
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def _connect(self):
+        if not self._disk_ready:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5)
+        if not self._disk_ready:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)")
+            self._disk_ready = True
+        return conn
+
+    def _remember(self, key: str, response: str, expires_at: float) -> None:
+        with self._lock:
+            self._memory[key] = (response, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[0]
+                del self._memory[key]
+
+        try:
+            with self._disk_lock:
+                with closing(self._connect()) as conn:
+                    row = conn.execute("SELECT response, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            row = None
+
+        if row is not None and row[1] > now:
+            self._remember(key, row[0], row[1])
+            with self._lock:
+                self.disk_hits += 1
+            return row[0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, response: str, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.default_ttl)
+        self._remember(key, response, expires_at)
+
+        try:
+            with self._disk_lock:
+                with closing(self._connect()) as conn, conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO responses (key, response, expires_at, created_at) VALUES (?, ?, ?, ?)",
+                        (key, response, expires_at, now),
+                    )
+                    conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+                    # Size bound: keep only the newest disk_entries rows
+                    conn.execute(
+                        "DELETE FROM responses WHERE key IN ("
+                        "SELECT key FROM responses ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                        (self.disk_entries,),
+                    )
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+        with self._lock:
+            self.stores += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+llm_cache = LLMResponseCache(
+    path=os.getenv('LLM_CACHE_PATH', DEFAULT_CACHE_PATH),
+    memory_entries=int(os.getenv('LLM_CACHE_MEMORY_ENTRIES', '256')),
+    disk_entries=int(os.getenv('LLM_CACHE_DISK_ENTRIES', '10000')),
+    default_ttl=float(os.getenv('LLM_CACHE_TTL_SECONDS', '86400')),
+)
@@ -0,0 +1,208 @@
+import json
+from typing import Any, Callable, Dict, NamedTuple, Tuple
+
+
+class StructuredOutputError(ValueError):
+    """An answer that isn't valid JSON or doesn't match its response schema"""
+
+    def __init__(self, schema_name: str, message: str):
+        super().__init__(f"{schema_name}: {message}")
+        self.schema_name = schema_name
+
+
+def correction_messages(messages, rejected_text, error):
+    """`messages` followed by the rejected answer and a request to answer again within the schema"""
+    return messages + [
+        {"role": "assistant", "content": rejected_text or ""},
+        {"role": "user", "content": f"That answer was rejected ({error}). Reply again with only JSON that matches the required schema."},
+    ]
+
+
+# ===== Typed Records =====
+
+class SubredditSuggestions(NamedTuple):
+    subreddits: Tuple[str, ...]
+
+
+class PostSelection(NamedTuple):
+    selected_post_ids: Tuple[int, ...]
+
+
+class LeadComment(NamedTuple):
+    post_id: int
+    comment: str
+
+
+class LeadComments(NamedTuple):
+    comments: Tuple[LeadComment, ...]
+
+
+class GeneratedPost(NamedTuple):
+    subreddit: str
+    title: str
+    body: str
+    reasoning: str
+
+
+class GeneratedPosts(NamedTuple):
+    posts: Tuple[GeneratedPost, ...]
+
+
+class KarmaTitle(NamedTuple):
+    title: str
+
+
+class ProductDetails(NamedTuple):
+    target_audience: str
+    description: str
+    problem_solved: str
+
+
+# ===== Schemas =====
+
+def _object(properties: Dict[str, Any]) -> Dict[str, Any]:
+    # Strict structured outputs want every property required and nothing extra
+    return {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False}
+
+
+def _array(items: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "array", "items": items}
+
+
+_STRING = {"type": "string"}
+_INTEGER = {"type": "integer"}
+
+
+def to_gemini_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """The OpenAPI subset Gemini's response_schema takes: upper-case types, no additionalProperties"""
+    converted = {}
+    for key, value in schema.items():
+        if key == 'additionalProperties':
+            continue
+        if key == 'type':
+            converted[key] = value.upper()
+        elif key == 'properties':
+            converted[key] = {name: to_gemini_schema(sub) for name, sub in value.items()}
+            # Fields are generated in this order, which keeps streamed items parseable early
+            converted['property_ordering'] = list(value)
+        elif key == 'items':
+            converted[key] = to_gemini_schema(value)
+        else:
+            converted[key] = value
+    return converted
+
+
+class ResponseSchema:
+    """
+    JSON schema of one prompt's answer plus the decoder that turns a parsed
+    answer into its typed record.
+
+    The schema is sent to the provider's structured-output mode (Gemini
+    response_schema, Groq json_schema); decode() still checks the answer,
+    since a failover or cached answer may not have been constrained.
+    """
+
+    def __init__(self, name: str, json_schema: Dict[str, Any], decoder: Callable[[Any], Any]):
+        self.name = name
+        self.json_schema = json_schema
+        self.gemini_schema = to_gemini_schema(json_schema)
+        self._decoder = decoder
+
+    def decode(self, text: str):
+        try:
+            document = json.loads(text)
+        except (TypeError, ValueError) as e:
+            raise StructuredOutputError(self.name, f"invalid JSON: {e}")
+        return self.decode_document(document)
+
+    def decode_document(self, document: Any):
+        try:
+            return self._decoder(document)
+        except (KeyError, TypeError, ValueError) as e:
+            raise StructuredOutputError(self.name, f"answer doesn't match the schema: {e!r}")
+
+    def groq_response_format(self) -> Dict[str, Any]:
+        return {"type": "json_schema", "json_schema": {"name": self.name, "schema": self.json_schema, "strict": True}}
+
+    def cache_config(self) -> Dict[str, Any]:
+        """Part of the response cache key, so answers to other schemas are never served"""
+        return {"response_schema": self.json_schema}
+
+
+def _expect(value, kind, field):
+    if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+        raise TypeError(f"{field} is {type(value).__name__}, expected {kind.__name__}")
+    return value
+
+
+def _post_id(value) -> int:
+    # Ids written as numeric strings ("3") are accepted, anything else is not
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    post_id = _expect(value, int, "post_id")
+    if post_id < 0:
+        raise ValueError(f"post_id {post_id} is negative")
+    return post_id
+
+
+def _decode_subreddits(document):
+    subreddits = _expect(_expect(document, dict, "answer")['subreddits'], list, "subreddits")
+    return SubredditSuggestions(tuple(_expect(name, str, "subreddit") for name in subreddits))
+
+
+def _decode_post_selection(document):
+    ids = _expect(_expect(document, dict, "answer")['selected_post_ids'], list, "selected_post_ids")
+    return PostSelection(tuple(_post_id(pid) for pid in ids))
+
+
+def decode_lead_comment(item) -> LeadComment:
+    item = _expect(item, dict, "comment item")
+    return LeadComment(_post_id(item['post_id']), _expect(item['comment'], str, "comment"))
+
+
+def _decode_lead_comments(document):
+    comments = _expect(_expect(document, dict, "answer")['comments'], list, "comments")
+    return LeadComments(tuple(decode_lead_comment(item) for item in comments))
+
+
+def _decode_generated_posts(document):
+    posts = _expect(_expect(document, dict, "answer")['posts'], list, "posts")
+    decoded = []
+    for item in posts:
+        item = _expect(item, dict, "post")
+        decoded.append(GeneratedPost(
+            subreddit=_expect(item['Subreddit'], str, "Subreddit"),
+            title=_expect(item['Title'], str, "Title"),
+            body=_expect(item['Post'], str, "Post"),
+            reasoning=_expect(item['Reasoning'], str, "Reasoning"),
+        ))
+    return GeneratedPosts(tuple(decoded))
+
+
+def _decode_karma_title(document):
+    return KarmaTitle(_expect(_expect(document, dict, "answer")['title'], str, "title"))
+
+
+def _decode_product_details(document):
+    document = _expect(document, dict, "answer")
+    return ProductDetails(*(_expect(document[field], str, field) for field in ProductDetails._fields))
+
+
+SUBREDDIT_SUGGESTIONS = ResponseSchema(
+    "subreddit_suggestions", _object({"subreddits": _array(_STRING)}), _decode_subreddits
+)
+POST_SELECTION = ResponseSchema(
+    "post_selection", _object({"selected_post_ids": _array(_INTEGER)}), _decode_post_selection
+)
+LEAD_COMMENTS = ResponseSchema(
+    "lead_comments", _object({"comments": _array(_object({"post_id": _INTEGER, "comment": _STRING}))}), _decode_lead_comments
+)
+GENERATED_POSTS = ResponseSchema(
+    "generated_posts",
+    _object({"posts": _array(_object({"Subreddit": _STRING, "Title": _STRING, "Post": _STRING, "Reasoning": _STRING}))}),
+    _decode_generated_posts
+)
+KARMA_TITLE = ResponseSchema("karma_title", _object({"title": _STRING}), _decode_karma_title)
+PRODUCT_DETAILS = ResponseSchema(
+    "product_details", _object({field: _STRING for field in ProductDetails._fields}), _decode_product_details
+)
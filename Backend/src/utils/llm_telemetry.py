@@ -0,0 +1,283 @@
+import contextvars
+import datetime
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from flask import g, has_request_context, request
+
+from src.utils.cost_calculator import GeminiCostCalculator
+
+logger = logging.getLogger(__name__)
+
+# Table: llm_usage(created_at, provider, model, endpoint, stage, user_id, product_id,
+#                  input_tokens, output_tokens, cached_tokens, latency_ms, attempts,
+#                  cost_usd, success, from_cache, usage_estimated, error)
+USAGE_TABLE = 'llm_usage'
+
+# Rows are written in batches, whichever comes first
+LLM_TELEMETRY_BATCH_SIZE = int(os.getenv('LLM_TELEMETRY_BATCH_SIZE', '50'))
+LLM_TELEMETRY_FLUSH_SECONDS = float(os.getenv('LLM_TELEMETRY_FLUSH_SECONDS', '30'))
+# Unflushed rows kept while the table is unreachable; the oldest are dropped first
+LLM_TELEMETRY_MAX_BUFFER = int(os.getenv('LLM_TELEMETRY_MAX_BUFFER', '5000'))
+LLM_TELEMETRY_PERSIST = os.getenv('LLM_TELEMETRY_PERSIST', '1') == '1'
+
+TAG_FIELDS = ('endpoint', 'stage', 'user_id', 'product_id')
+
+_call_tags: contextvars.ContextVar = contextvars.ContextVar('llm_call_tags', default={})
+
+
+def current_tags() -> Dict[str, Any]:
+    """Tags of the current call: explicit llm_tags() first, then the Flask request"""
+    tags = dict(_call_tags.get())
+    if has_request_context():
+        tags.setdefault('endpoint', request.endpoint)
+        user = getattr(g, 'current_user', None)
+        if user and user.get('id'):
+            tags.setdefault('user_id', user['id'])
+    return tags
+
+
+@contextmanager
+def llm_tags(**tags):
+    """
+    Tag every LLM call made inside the block, e.g. `with llm_tags(stage='classification'):`.
+
+    Tags nest (inner values win) and snapshot the request's endpoint and user,
+    so work handed to executors via submit_in_context() keeps them.
+    """
+    merged = {**current_tags(), **{key: value for key, value in tags.items() if value is not None}}
+    token = _call_tags.set(merged)
+    try:
+        yield merged
+    finally:
+        _call_tags.reset(token)
+
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """executor.submit() that runs `fn` under the caller's context, so its LLM calls keep their tags"""
+    context = contextvars.copy_context()
+    return executor.submit(context.run, fn, *args, **kwargs)
+
+
+def usage_from_gemini(response) -> Optional[Dict[str, int]]:
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return None
+    return {
+        'input_tokens': getattr(usage, 'prompt_token_count', None) or 0,
+        # Thinking tokens are billed as output
+        'output_tokens': (getattr(usage, 'candidates_token_count', None) or 0) + (getattr(usage, 'thoughts_token_count', None) or 0),
+        'cached_tokens': getattr(usage, 'cached_content_token_count', None) or 0,
+    }
+
+
+def usage_from_openai(response) -> Optional[Dict[str, int]]:
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return None
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return {
+        'input_tokens': getattr(usage, 'prompt_tokens', None) or 0,
+        'output_tokens': getattr(usage, 'completion_tokens', None) or 0,
+        'cached_tokens': getattr(details, 'cached_tokens', None) or 0,
+    }
+
+
+def _new_bucket() -> Dict[str, Any]:
+    return {
+        'calls': 0,
+        'failures': 0,
+        'cache_hits': 0,
+        'attempts': 0,
+        'input_tokens': 0,
+        'output_tokens': 0,
+        'cached_tokens': 0,
+        'cost_usd': 0.0,
+        'cache_savings_usd': 0.0,
+        'latency_ms_total': 0.0,
+        'latency_ms_max': 0.0,
+    }
+
+
+class LLMTelemetry:
+    """
+    Usage, latency, retries and cost of every LLM call.
+
+    Calls are aggregated in memory per (endpoint, stage, provider, model) and
+    per user, and buffered rows are written to USAGE_TABLE in batches by a
+    background thread.
+    """
+
+    def __init__(self,
+                 batch_size: int = LLM_TELEMETRY_BATCH_SIZE,
+                 flush_interval: float = LLM_TELEMETRY_FLUSH_SECONDS,
+                 max_buffer: int = LLM_TELEMETRY_MAX_BUFFER,
+                 persist: bool = LLM_TELEMETRY_PERSIST):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.persist = persist
+        self._by_stage: Dict[tuple, Dict[str, Any]] = {}
+        self._by_user: Dict[str, Dict[str, Any]] = {}
+        self._buffer: List[Dict[str, Any]] = []
+        self._calculators: Dict[str, GeminiCostCalculator] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self.flushed_rows = 0
+        self.dropped_rows = 0
+
+    def _cost(self, model: str, input_tokens: int, output_tokens: int, cached_tokens: int) -> float:
+        calculator = self._calculators.get(model)
+        if calculator is None:
+            if model not in GeminiCostCalculator.GEMINI_PRICING:
+                return 0.0
+            calculator = self._calculators.setdefault(model, GeminiCostCalculator(model))
+        return calculator.calculate_cost(input_tokens=input_tokens, output_tokens=output_tokens, cached_tokens=cached_tokens)['total_cost']
+
+    @staticmethod
+    def _cache_savings(model: str, cached_tokens: int) -> float:
+        """What the provider-cached input tokens would have cost at the full input price"""
+        pricing = GeminiCostCalculator.GEMINI_PRICING.get(model)
+        if pricing is None:
+            return 0.0
+        return cached_tokens * (pricing['input'] - pricing['cached_input'])
+
+    def record(self,
+               provider: str,
+               model: str,
+               latency: float,
+               attempts: int = 1,
+               usage: Optional[Dict[str, int]] = None,
+               success: bool = True,
+               from_cache: bool = False,
+               usage_estimated: bool = False,
+               error: Optional[str] = None) -> None:
+        """Record one finished call; `latency` is wall seconds including retries"""
+        usage = usage or {}
+        input_tokens = usage.get('input_tokens', 0)
+        output_tokens = usage.get('output_tokens', 0)
+        cached_tokens = usage.get('cached_tokens', 0)
+        cost = 0.0 if from_cache else self._cost(model, input_tokens, output_tokens, cached_tokens)
+        cache_savings = self._cache_savings(model, cached_tokens)
+        latency_ms = round(latency * 1000, 1)
+        tags = current_tags()
+
+        row = {
+            'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'provider': provider,
+            'model': model,
+            **{field: tags.get(field) for field in TAG_FIELDS},
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'cached_tokens': cached_tokens,
+            'latency_ms': latency_ms,
+            'attempts': attempts,
+            'cost_usd': cost,
+            'success': success,
+            'from_cache': from_cache,
+            'usage_estimated': usage_estimated,
+            'error': error[:500] if error else None,
+        }
+
+        with self._lock:
+            buckets = [self._by_stage.setdefault((row['endpoint'], row['stage'], provider, model), _new_bucket())]
+            if row['user_id']:
+                buckets.append(self._by_user.setdefault(row['user_id'], _new_bucket()))
+            for bucket in buckets:
+                bucket['calls'] += 1
+                bucket['failures'] += 0 if success else 1
+                bucket['cache_hits'] += 1 if from_cache else 0
+                bucket['attempts'] += attempts
+                bucket['input_tokens'] += input_tokens
+                bucket['output_tokens'] += output_tokens
+                bucket['cached_tokens'] += cached_tokens
+                bucket['cost_usd'] += cost
+                bucket['cache_savings_usd'] += cache_savings
+                bucket['latency_ms_total'] += latency_ms
+                bucket['latency_ms_max'] = max(bucket['latency_ms_max'], latency_ms)
+
+            if not self.persist:
+                return
+            self._buffer.append(row)
+            if len(self._buffer) > self.max_buffer:
+                overflow = len(self._buffer) - self.max_buffer
+                del self._buffer[:overflow]
+                self.dropped_rows += overflow
+            full = len(self._buffer) >= self.batch_size
+            self._ensure_flusher()
+
+        if full:
+            self._wake.set()
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flush_loop, name='llm-telemetry-flusher', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _client(self):
+        # Imported here so the telemetry module stays importable without the database client
+        from src.utils.supabase_pool import get_supabase
+        return get_supabase()
+
+    def flush(self) -> int:
+        """Write buffered rows to USAGE_TABLE; rows are put back if the insert fails"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+
+            written = 0
+            try:
+                while written < len(rows):
+                    batch = rows[written:written + self.batch_size]
+                    self._client().table(USAGE_TABLE).insert(batch).execute()
+                    written += len(batch)
+            except Exception as e:
+                logger.error(f"Error writing LLM usage rows: {e}")
+                with self._lock:
+                    self._buffer[:0] = rows[written:]
+
+            with self._lock:
+                self.flushed_rows += written
+            return written
+
+    def stats(self) -> Dict[str, Any]:
+        def finish(bucket):
+            summary = dict(bucket)
+            summary['cost_usd'] = round(summary['cost_usd'], 6)
+            summary['cache_savings_usd'] = round(summary['cache_savings_usd'], 6)
+            summary['latency_ms_avg'] = round(summary.pop('latency_ms_total') / summary['calls'], 1) if summary['calls'] else 0.0
+            return summary
+
+        with self._lock:
+            stages = [
+                {'endpoint': endpoint, 'stage': stage, 'provider': provider, 'model': model, **finish(bucket)}
+                for (endpoint, stage, provider, model), bucket in self._by_stage.items()
+            ]
+            users = [{'user_id': user_id, **finish(bucket)} for user_id, bucket in self._by_user.items()]
+            buffered = len(self._buffer)
+
+        return {
+            'by_stage': sorted(stages, key=lambda s: s['cost_usd'], reverse=True),
+            'by_user': sorted(users, key=lambda u: u['cost_usd'], reverse=True),
+            'total_cost_usd': round(sum(s['cost_usd'] for s in stages), 6),
+            'total_cache_savings_usd': round(sum(s['cache_savings_usd'] for s in stages), 6),
+            'buffered_rows': buffered,
+            'flushed_rows': self.flushed_rows,
+            'dropped_rows': self.dropped_rows,
+        }
+
+
+llm_telemetry = LLMTelemetry()
@@ -1,39 +1,199 @@
+import json
 import os
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 from src.utils.cost_calculator import GeminiCostCalculator
+from src.utils.retry_policy import (
+    RetryPolicy, CircuitBreaker, LLMUnavailableError, ConcurrencySlotTimeout, is_retryable
+)
+from src.utils.llm_cache import llm_cache, make_cache_key
+from src.utils.llm_telemetry import llm_telemetry, usage_from_gemini, usage_from_openai, submit_in_context
+from src.utils.context_cache import (
+    ContextCacheRegistry, GeminiContextCacheProvider, StubContextCacheProvider, LLM_CONTEXT_CACHE_PROVIDER
+)
+from src.utils.llm_schemas import StructuredOutputError, correction_messages
 import openai
-import os
 import httpx
 
 load_dotenv() 
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
 
+# Keep-alive pool shared by every Groq call in this process
+GROQ_MAX_CONNECTIONS = int(os.getenv('GROQ_MAX_CONNECTIONS', '20'))
+GROQ_KEEPALIVE_CONNECTIONS = int(os.getenv('GROQ_KEEPALIVE_CONNECTIONS', '10'))
+
+# Retry budgets: jittered exponential backoff bounded by a per-call deadline
+# (each attempt's request timeout is the time left before it), plus one
+# circuit breaker per provider so a failing provider fails fast
+GEMINI_RETRY_POLICY = RetryPolicy(
+    max_attempts=int(os.getenv('GEMINI_MAX_ATTEMPTS', '4')),
+    deadline=float(os.getenv('GEMINI_CALL_DEADLINE_SECONDS', '45')),
+)
+GROQ_RETRY_POLICY = RetryPolicy(
+    max_attempts=int(os.getenv('GROQ_MAX_ATTEMPTS', '4')),
+    deadline=float(os.getenv('GROQ_CALL_DEADLINE_SECONDS', '20')),
+)
+GEMINI_CIRCUIT = CircuitBreaker("gemini")
+GROQ_CIRCUIT = CircuitBreaker("groq")
+
+# Generation settings that take part in the response cache key
+GEMINI_JSON_CONFIG = {"response_mime_type": "application/json", "thinking_budget": 0}
+
+# TTLs for call sites that opt in to the response cache
+LLM_CACHE_TTL_DAY = 86400
+
+# Hedging: a call that outlives its route's observed p95 latency is duplicated
+# to the alternate route, never sooner than HEDGE_MIN_DELAY_SECONDS and only
+# once HEDGE_MIN_SAMPLES latencies have been seen
+LLM_HEDGING = os.getenv('LLM_HEDGING', '1') == '1'
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '0.95'))
+HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', '20'))
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv('HEDGE_MIN_DELAY_SECONDS', '1.0'))
+HEDGE_WORKERS = int(os.getenv('HEDGE_WORKERS', '16'))
+
+# Provider requests in flight at once across the process (every route,
+# hedge and worker); each retry attempt takes a slot only while it runs.
+# Waiting for a slot spends the attempt's deadline like the request does
+LLM_MAX_CONCURRENT_CALLS = int(os.getenv('LLM_MAX_CONCURRENT_CALLS', '8'))
+llm_concurrency = threading.BoundedSemaphore(LLM_MAX_CONCURRENT_CALLS)
+
+
+def _limited(call):
+    def run(timeout):
+        started = time.monotonic()
+        if not llm_concurrency.acquire(timeout=timeout):
+            raise ConcurrencySlotTimeout(f"no free LLM call slot within {timeout:.1f}s")
+        try:
+            return call(max(timeout - (time.monotonic() - started), 0.0))
+        finally:
+            llm_concurrency.release()
+    return run
+
+# Schema-constrained calls whose answer still doesn't decode are asked again,
+# with the rejected answer and the error, up to this many calls in total
+STRUCTURED_OUTPUT_ATTEMPTS = int(os.getenv('STRUCTURED_OUTPUT_ATTEMPTS', '2'))
+
+# Stage-2 generation falls back to the larger gpt-oss model on Groq
+GROQ_GENERATION_MODEL = os.getenv('GROQ_GENERATION_MODEL', 'openai/gpt-oss-120b')
+
+
+class LatencyTracker:
+    """Sliding window of a route's successful call latencies"""
+
+    def __init__(self, window: int = 200, min_samples: int = HEDGE_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float):
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging, or None (never hedge) until enough samples exist"""
+        p = self.percentile(HEDGE_PERCENTILE)
+        return None if p is None else max(p, HEDGE_MIN_DELAY_SECONDS)
+
+
+class ProviderRoute:
+    """One provider/model a JSON request can be sent to"""
+
+    def __init__(self, name, breaker, generate):
+        self.name = name
+        self.breaker = breaker
+        self.generate = generate
+        self.latency = LatencyTracker()
+
+    def stats(self):
+        p50 = self.latency.percentile(0.5)
+        p95 = self.latency.percentile(HEDGE_PERCENTILE)
+        return {
+            "circuit": self.breaker.state,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+def _is_json_answer(text, schema=None) -> bool:
+    """Whether `text` is JSON, and with a `schema`, decodes into its record"""
+    if not text:
+        return False
+    try:
+        if schema is not None:
+            schema.decode(text)
+        else:
+            json.loads(text)
+    except (TypeError, ValueError):
+        return False
+    return True
+
 class Model:
     def __init__(self):
         self.gemini_api_key = GEMINI_API_KEY
+        # The genai client keeps its own pooled HTTP client for the lifetime of the instance
         self.gemini_client = genai.Client(api_key=GEMINI_API_KEY)
 
-        # Initialize OpenAI client for Groq
-        try:
-            self.openai_client = openai.OpenAI(
-                base_url="https://api.groq.com/openai/v1",
-                api_key=GROQ_API_KEY
-            )
-        except TypeError:
-            # Fallback if httpx removed the proxies kwarg in current environment
-            http_client = httpx.Client()
-            self.openai_client = openai.OpenAI(
-                base_url="https://api.groq.com/openai/v1",
-                api_key=GROQ_API_KEY,
-                http_client=http_client
-            )
+        # Initialize OpenAI client for Groq on an explicit keep-alive connection pool.
+        # Passing our own httpx client also sidesteps the removed proxies kwarg.
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=GROQ_MAX_CONNECTIONS,
+                max_keepalive_connections=GROQ_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=60.0,
+            ),
+            timeout=httpx.Timeout(60.0, connect=10.0),
+        )
+        self.openai_client = openai.OpenAI(
+            base_url="https://api.groq.com/openai/v1",
+            api_key=GROQ_API_KEY,
+            http_client=self.http_client
+        )
         
         self.cost_calculator = GeminiCostCalculator("gemini-2.5-flash")
 
+        # Gemini system prompts go through explicit context caches. Groq caches
+        # prompt prefixes on its own, which the system-prompt-first layout of the
+        # lead prompts is built for; both providers' hits are counted by the registry.
+        if LLM_CONTEXT_CACHE_PROVIDER == 'gemini':
+            context_cache_provider = GeminiContextCacheProvider(self.gemini_client)
+        elif LLM_CONTEXT_CACHE_PROVIDER == 'stub':
+            context_cache_provider = StubContextCacheProvider()
+        else:
+            context_cache_provider = None
+        self.context_caches = ContextCacheRegistry(context_cache_provider)
+
+        # Both providers share the circuit of their account; the latency
+        # windows are kept per route since the models differ in speed
+        self.routes = {
+            'gemini': ProviderRoute("gemini", GEMINI_CIRCUIT, self._gemini_generate),
+            'groq_classification': ProviderRoute(
+                "groq:gpt-oss-20b", GROQ_CIRCUIT,
+                lambda messages, deadline, schema=None: self._groq_generate("openai/gpt-oss-20b", messages, deadline, schema)
+            ),
+            'groq_generation': ProviderRoute(
+                f"groq:{GROQ_GENERATION_MODEL.split('/')[-1]}", GROQ_CIRCUIT,
+                lambda messages, deadline, schema=None: self._groq_generate(GROQ_GENERATION_MODEL, messages, deadline, schema)
+            ),
+        }
+        self._hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+        self.routing_stats = {'hedges': {}, 'hedge_wins': {}, 'failovers': {}}
+        # Per response schema: answers that didn't decode, and how many of those a re-ask fixed
+        self.structured_stats = {'parse_failures': {}, 'recovered': {}}
+        self._routing_lock = threading.Lock()
+
 
     def _format_messages_for_gemini(self, messages):
         """Convert messages from OpenAI format to Gemini format"""
@@ -64,48 +224,362 @@ class Model:
         
         return formatted_contents
 
-    def gemini_chat_completion(self, messages): 
+    def _call_with_telemetry(self, provider, model_name, policy, breaker, call, messages, usage_fn, text_fn, deadline=None):
+        """
+        Run `call` under `policy` and record provider usage, wall latency,
+        attempts and cost. Usage the provider doesn't report is estimated
+        with the tokenizer and flagged as such.
+        """
+        attempts = [0]
+
+        def on_attempt(attempt):
+            attempts[0] = attempt
+
+        started = time.monotonic()
+        try:
+            response = policy.call(provider, _limited(call), breaker=breaker, deadline=deadline, on_attempt=on_attempt)
+        except LLMUnavailableError as e:
+            llm_telemetry.record(provider, model_name, time.monotonic() - started, attempts=attempts[0], success=False, error=str(e))
+            raise
+
+        usage = usage_fn(response)
+        estimated = usage is None
+        if estimated:
+            usage = {
+                'input_tokens': self.cost_calculator.count_messages_tokens(messages),
+                'output_tokens': self.cost_calculator.count_tokens(text_fn(response) or ""),
+            }
+        llm_telemetry.record(provider, model_name, time.monotonic() - started, attempts=attempts[0], usage=usage, usage_estimated=estimated)
+        return response
+
+    def _gemini_request(self, messages, stream=False, schema=None):
+        """
+        Build the call(timeout) for one Gemini JSON request.
+
+        A system prompt is served from a context cache when one can be had,
+        and sent inline otherwise. With `stream`, call() opens a streamed
+        answer and returns (first_chunk, remaining_chunks). A `schema`
+        (ResponseSchema) constrains the answer through response_schema.
+        """
+        system_prompt = next((m['content'] for m in messages if m.get('role') == 'system' and isinstance(m.get('content'), str)), None)
+        cached_content = self.context_caches.get_or_create("gemini-2.5-flash", system_prompt) if system_prompt else None
 
-        formatted_contents = self._format_messages_for_gemini(messages)
         # Format messages for Gemini API
-        delay = [0, 5, 10, 15, 20]
-        # ===== Generate Response with Retry Logic =====
-        for i in delay:
-            try: 
-                response = self.gemini_client.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=formatted_contents,
-                    config=types.GenerateContentConfig(
-                        response_mime_type="application/json",
-                        thinking_config=types.ThinkingConfig(thinking_budget=0) # Disables thinking
-                    )
+        inline_contents = self._format_messages_for_gemini(messages)
+        cached_contents = self._format_messages_for_gemini([m for m in messages if m.get('role') != 'system']) if cached_content else None
+
+        def generate(contents, timeout, cache_name=None):
+            request = dict(
+                model="gemini-2.5-flash",
+                contents=contents,
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json",
+                    response_schema=schema.gemini_schema if schema is not None else None,
+                    thinking_config=types.ThinkingConfig(thinking_budget=0), # Disables thinking
+                    cached_content=cache_name,
+                    # The rest of the retry deadline, in milliseconds
+                    http_options=types.HttpOptions(timeout=max(int(timeout * 1000), 1))
                 )
-                return response.text
-            except Exception as e:
-                print(f"Error generating response: {e}")
-                time.sleep(i)
+            )
+            if not stream:
+                return self.gemini_client.models.generate_content(**request)
+            # Pull the first chunk here so connection and quota errors surface inside the retry policy
+            chunks = iter(self.gemini_client.models.generate_content_stream(**request))
+            return next(chunks, None), chunks
+
+        def call(timeout):
+            nonlocal cached_content
+            if cached_content:
+                try:
+                    return generate(cached_contents, timeout, cached_content)
+                except Exception as e:
+                    if is_retryable(e):
+                        raise
+                    # The cache expired or was deleted under us: drop it and send the prompt inline
+                    self.context_caches.discard(cached_content)
+                    cached_content = None
+            return generate(inline_contents, timeout)
+
+        return call
+
+    def _gemini_generate(self, messages, deadline=None, schema=None):
+        """One Gemini JSON call under its retry policy; returns the raw answer text"""
+        # ===== Generate Response with Retry Logic =====
+        response = self._call_with_telemetry(
+            "gemini", "gemini-2.5-flash", GEMINI_RETRY_POLICY, GEMINI_CIRCUIT, self._gemini_request(messages, schema=schema), messages,
+            usage_from_gemini, lambda r: r.text, deadline=deadline
+        )
+        self.context_caches.record_usage("gemini", usage_from_gemini(response))
+        return response.text or ""
+
+    def _gemini_stream(self, messages, deadline=None, schema=None):
+        """
+        Yield the text chunks of one streamed Gemini JSON answer.
+
+        The retry policy covers opening the stream; a stream that breaks after
+        that raises LLMUnavailableError, since its chunks were already handed out.
+        Only opening the stream counts against LLM_MAX_CONCURRENT_CALLS.
+        """
+        attempts = [0]
+
+        def on_attempt(attempt):
+            attempts[0] = attempt
+
+        started = time.monotonic()
+        try:
+            first, chunks = GEMINI_RETRY_POLICY.call(
+                "gemini", _limited(self._gemini_request(messages, stream=True, schema=schema)), breaker=GEMINI_CIRCUIT, deadline=deadline, on_attempt=on_attempt
+            )
+        except LLMUnavailableError as e:
+            llm_telemetry.record("gemini", "gemini-2.5-flash", time.monotonic() - started, attempts=attempts[0], success=False, error=str(e))
+            raise
+
+        last_chunk, text_parts = first, []
+        try:
+            chunk = first
+            while chunk is not None:
+                if chunk.text:
+                    text_parts.append(chunk.text)
+                    yield chunk.text
+                last_chunk = chunk
+                chunk = next(chunks, None)
+        except Exception as e:
+            GEMINI_CIRCUIT.record_failure()
+            llm_telemetry.record("gemini", "gemini-2.5-flash", time.monotonic() - started, attempts=attempts[0], success=False, error=str(e))
+            raise LLMUnavailableError("gemini", f"stream interrupted: {e}", attempts=attempts[0], last_error=e)
+
+        # Usage arrives with the final chunk
+        usage = usage_from_gemini(last_chunk) if last_chunk is not None else None
+        self.context_caches.record_usage("gemini", usage)
+        estimated = usage is None
+        if estimated:
+            usage = {
+                'input_tokens': self.cost_calculator.count_messages_tokens(messages),
+                'output_tokens': self.cost_calculator.count_tokens("".join(text_parts)),
+            }
+        llm_telemetry.record("gemini", "gemini-2.5-flash", time.monotonic() - started, attempts=attempts[0], usage=usage, usage_estimated=estimated)
+
+    def _stream_with_failover(self, messages, deadline=None, schema=None):
+        """
+        Stream from Gemini, or fall back to one non-streamed answer from the
+        alternate route while Gemini's circuit is open or the stream can't be
+        opened. Hedging doesn't apply to streams.
+        """
+        primary, alternate = self.routes['gemini'], self.routes['groq_generation']
+        if primary.breaker.state != 'open':
+            yielded = False
+            try:
+                for text in self._gemini_stream(messages, deadline, schema):
+                    yielded = True
+                    yield text
+                return
+            except LLMUnavailableError:
+                if yielded:
+                    raise
+        self._count('failovers', alternate)
+        yield self._run_route(alternate, messages, deadline, schema) or "{}"
+
+    def _groq_generate(self, model_name, messages, deadline=None, schema=None):
+        """One Groq JSON-mode (or strict json_schema) call under its retry policy; returns the raw answer text"""
+        response_format = schema.groq_response_format() if schema is not None else {"type": "json_object"}
+
+        def call(timeout):
+            return self.openai_client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                temperature=0.0,
+                stream=False,
+                response_format=response_format,
+                timeout=timeout
+            )
+
+        response = self._call_with_telemetry(
+            "groq", model_name, GROQ_RETRY_POLICY, GROQ_CIRCUIT, call, messages,
+            usage_from_openai, lambda r: r.choices[0].message.content, deadline=deadline
+        )
+        self.context_caches.record_usage("groq", usage_from_openai(response))
+        return response.choices[0].message.content or ""
+
+    # ===== Routing: Hedging and Failover =====
+
+    def _run_route(self, route, messages, deadline, schema=None):
+        started = time.monotonic()
+        text = route.generate(messages, deadline, schema)
+        route.latency.observe(time.monotonic() - started)
+        return text
+
+    def _count(self, counter, route):
+        with self._routing_lock:
+            self.routing_stats[counter][route.name] = self.routing_stats[counter].get(route.name, 0) + 1
+
+    def _route(self, primary, alternate, messages, deadline=None, schema=None):
+        """
+        Run `messages` on `primary`, backed by `alternate`.
+
+        While the primary's circuit is open the call goes straight to the
+        alternate. Once the primary outlives its observed p95 latency the same
+        request is sent to the alternate (hedged), and the first non-empty,
+        valid JSON answer wins. A primary that fails or answers with invalid
+        JSON before the hedge fires fails over to the alternate. With a
+        `schema`, an answer only counts as valid if it decodes into its record.
+        Raises LLMUnavailableError only when both routes gave up.
+        """
+        if not LLM_HEDGING:
+            return self._run_route(primary, messages, deadline, schema) or "{}"
+        if primary.breaker.state == 'open':
+            self._count('failovers', alternate)
+            return self._run_route(alternate, messages, deadline, schema) or "{}"
+
+        futures = {submit_in_context(self._hedge_executor, self._run_route, primary, messages, deadline, schema): primary}
+        pending = set(futures)
+        hedge_after = primary.latency.hedge_delay()
+        hedged = False
+        alternate_reason = None
+        fallback_text = None
+        last_error = None
+
+        while pending:
+            done, pending = wait(pending, timeout=None if hedged else hedge_after, return_when=FIRST_COMPLETED)
+            if not done:
+                # The primary is in its slow tail: race the alternate against it
+                hedged, alternate_reason = True, 'hedges'
+                self._count('hedges', alternate)
+                future = submit_in_context(self._hedge_executor, self._run_route, alternate, messages, deadline, schema)
+                futures[future] = alternate
+                pending.add(future)
                 continue
 
-        return "{}"
+            for future in done:
+                route = futures[future]
+                try:
+                    text = future.result()
+                except LLMUnavailableError as e:
+                    last_error = e
+                    continue
+                if _is_json_answer(text, schema):
+                    # A running loser can't be interrupted mid-request; its answer is dropped
+                    for other in pending:
+                        other.cancel()
+                    if route is alternate and alternate_reason == 'hedges':
+                        self._count('hedge_wins', alternate)
+                    return text
+                if fallback_text is None:
+                    fallback_text = text
+
+            if not pending and not hedged:
+                hedged, alternate_reason = True, 'failovers'
+                self._count('failovers', alternate)
+                future = submit_in_context(self._hedge_executor, self._run_route, alternate, messages, deadline, schema)
+                futures[future] = alternate
+                pending.add(future)
+
+        if fallback_text is not None:
+            return fallback_text or "{}"
+        raise last_error
+
+    def gemini_chat_completion(self, messages, deadline=None, cache_ttl=None, stream=False, schema=None):
+        """
+        Generate a JSON response with Gemini, hedged/failed over to Groq's gpt-oss-120b.
+
+        Returns "{}" when the model answers with nothing, and raises
+        LLMUnavailableError when retries, the deadline or the circuit give up.
+        Passing `cache_ttl` (seconds) opts the call in to the response cache.
+        A `schema` (ResponseSchema) puts both providers in their
+        structured-output modes; see structured_completion for typed records.
+
+        With `stream=True` it returns an iterator of answer text chunks instead
+        (see JsonArrayItemParser); streamed answers are never cached.
+        """
+        if stream:
+            return self._stream_with_failover(messages, deadline=deadline, schema=schema)
+
+        cache_key = None
+        if cache_ttl is not None:
+            config = {**GEMINI_JSON_CONFIG, **schema.cache_config()} if schema is not None else GEMINI_JSON_CONFIG
+            cache_key = make_cache_key("gemini-2.5-flash", messages, config)
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                llm_telemetry.record("gemini", "gemini-2.5-flash", 0.0, attempts=0, from_cache=True)
+                return cached
+
+        text = self._route(self.routes['gemini'], self.routes['groq_generation'], messages, deadline=deadline, schema=schema)
+
+        # Empty or off-schema answers are not cached so the next call asks again
+        if cache_key is not None and text and text != "{}" and (schema is None or _is_json_answer(text, schema)):
+            llm_cache.set(cache_key, text, ttl=cache_ttl)
+        return text
     
-    def gemini_lead_checking(self, messages):
-        # Format messages for Gemini API
-        delay = [0, 5, 10, 15, 20]
+    def gemini_lead_checking(self, messages, deadline=None, schema=None):
+        """
+        Classify posts with Groq's gpt-oss-20b, hedged/failed over to Gemini.
 
-        for i in delay:
-            try:
-                response = self.openai_client.chat.completions.create(
-                    model="openai/gpt-oss-20b",
-                    messages=messages,
-                    temperature=0.0,
-                    stream=False,
-                    response_format={"type": "json_object"}
-                )
+        Returns "{}" when the model answers with nothing, and raises
+        LLMUnavailableError when retries, the deadline or the circuit give up.
+        """
+        return self._route(self.routes['groq_classification'], self.routes['gemini'], messages, deadline=deadline, schema=schema)
+
+    def structured_completion(self, messages, schema, deadline=None, cache_ttl=None, classification=False):
+        """
+        Run a schema-constrained call and return the answer decoded into the
+        schema's typed record.
 
-                return response.choices[0].message.content
-            except Exception as e:
-                print(f"Error generating response: {e}")
-                time.sleep(i)
+        Generation calls go through gemini_chat_completion, `classification`
+        calls through gemini_lead_checking. An answer that still doesn't decode
+        is asked for again, with the rejected answer and the error appended,
+        up to STRUCTURED_OUTPUT_ATTEMPTS calls; then StructuredOutputError is
+        raised. LLMUnavailableError passes through as usual.
+        """
+        attempt_messages = messages
+        for attempt in range(1, STRUCTURED_OUTPUT_ATTEMPTS + 1):
+            if classification:
+                text = self.gemini_lead_checking(attempt_messages, deadline=deadline, schema=schema)
+            else:
+                # Re-asks carry the rejected answer, so only the first attempt may be cached
+                ttl = cache_ttl if attempt == 1 else None
+                text = self.gemini_chat_completion(attempt_messages, deadline=deadline, cache_ttl=ttl, schema=schema)
+            try:
+                record = schema.decode(text)
+            except StructuredOutputError as e:
+                self._count_structured('parse_failures', schema)
+                if attempt == STRUCTURED_OUTPUT_ATTEMPTS:
+                    raise
+                attempt_messages = correction_messages(messages, text, e)
                 continue
+            if attempt > 1:
+                self._count_structured('recovered', schema)
+            return record
+
+    def _count_structured(self, counter, schema):
+        with self._routing_lock:
+            self.structured_stats[counter][schema.name] = self.structured_stats[counter].get(schema.name, 0) + 1
+
+    def routing_snapshot(self):
+        with self._routing_lock:
+            counters = {name: dict(values) for name, values in self.routing_stats.items()}
+            structured = {name: dict(values) for name, values in self.structured_stats.items()}
+        return {
+            'hedging_enabled': LLM_HEDGING,
+            **counters,
+            'structured_output': structured,
+            'routes': {name: route.stats() for name, route in self.routes.items()},
+        }
+
+
+_shared_model = None
+_shared_model_lock = threading.Lock()
+
+
+def get_model():
+    """
+    Return the process-wide Model instance.
 
-        return "{}"
\ No newline at end of file
+    Model holds no per-request state and its clients are thread-safe, so request
+    handlers and executor workers borrow this one instead of building new
+    clients (and TLS connections) per request.
+    """
+    global _shared_model
+    if _shared_model is None:
+        with _shared_model_lock:
+            if _shared_model is None:
+                _shared_model = Model()
+    return _shared_model
@@ -0,0 +1,162 @@
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+NEAR_DUPLICATE_FILTER = os.getenv('NEAR_DUPLICATE_FILTER', '1') == '1'
+# Estimated Jaccard similarity of shingle sets above which two posts are copies
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv('NEAR_DUPLICATE_THRESHOLD', '0.7'))
+# Rolling window of each product's index
+NEAR_DUPLICATE_MAX_ENTRIES = int(os.getenv('NEAR_DUPLICATE_MAX_ENTRIES', '5000'))
+NEAR_DUPLICATE_MAX_AGE_DAYS = float(os.getenv('NEAR_DUPLICATE_MAX_AGE_DAYS', '7'))
+
+# 16 bands of 4 rows: pairs around 0.5 Jaccard start to collide, which leaves
+# room below the threshold; candidates are then confirmed on the full signature
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(20240601)
+_PERM_A = _rng.randint(1, (1 << 31) - 1, size=NUM_PERMUTATIONS).astype(np.uint64)
+_PERM_B = _rng.randint(0, (1 << 31) - 1, size=NUM_PERMUTATIONS).astype(np.uint64)
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def post_text(post: Dict[str, Any]) -> str:
+    selftext = post.get('selftext') or ''
+    # Listings fill empty bodies with a placeholder that would make every link post look alike
+    if selftext == 'No text':
+        selftext = ''
+    return f"{post.get('title', '')} {selftext}"
+
+
+def minhash_signature(text: str) -> Optional[np.ndarray]:
+    """MinHash of the text's word 3-shingles (single words for very short texts), or None if empty"""
+    words = _WORD_RE.findall((text or '').lower())
+    if not words:
+        return None
+    if len(words) < SHINGLE_SIZE:
+        shingles = set(words)
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+    hashed = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+    # (a * x + b) mod p over 32-bit inputs and 31-bit coefficients stays inside uint64
+    permuted = (np.outer(hashed, _PERM_A) + _PERM_B) % _MERSENNE_PRIME
+    return permuted.min(axis=0)
+
+
+class NearDuplicateIndex:
+    """
+    Rolling MinHash/LSH index of one product's recent posts.
+
+    check_and_add() returns the id of an earlier near-identical post, or
+    indexes the new one and returns None. The oldest entries are evicted past
+    NEAR_DUPLICATE_MAX_ENTRIES or NEAR_DUPLICATE_MAX_AGE_DAYS.
+    """
+
+    def __init__(self,
+                 threshold: float = NEAR_DUPLICATE_THRESHOLD,
+                 max_entries: int = NEAR_DUPLICATE_MAX_ENTRIES,
+                 max_age_seconds: float = NEAR_DUPLICATE_MAX_AGE_DAYS * 86400):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._buckets: Dict[tuple, set] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _band_keys(signature: np.ndarray):
+        return [(band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes()) for band in range(LSH_BANDS)]
+
+    def _evict(self, now: float) -> None:
+        while self._entries:
+            post_id, (signature, added_at) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_entries and now - added_at <= self.max_age_seconds:
+                break
+            del self._entries[post_id]
+            for key in self._band_keys(signature):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(post_id)
+                    if not bucket:
+                        del self._buckets[key]
+
+    def check_and_add(self, post_id: str, text: str) -> Optional[str]:
+        signature = minhash_signature(text)
+        if signature is None:
+            return None
+
+        keys = self._band_keys(signature)
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            if post_id in self._entries:
+                return None
+
+            candidates = set()
+            for key in keys:
+                candidates.update(self._buckets.get(key, ()))
+            best_id, best_similarity = None, 0.0
+            for candidate in candidates:
+                similarity = float(np.mean(self._entries[candidate][0] == signature))
+                if similarity > best_similarity:
+                    best_id, best_similarity = candidate, similarity
+            if best_id is not None and best_similarity >= self.threshold:
+                return best_id
+
+            self._entries[post_id] = (signature, now)
+            for key in keys:
+                self._buckets.setdefault(key, set()).add(post_id)
+        return None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class NearDuplicateRegistry:
+    """One rolling index per product, kept across cron cycles, plus a process-wide dropped counter"""
+
+    def __init__(self):
+        self._indexes: Dict[Any, NearDuplicateIndex] = {}
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.dropped = 0
+
+    def for_product(self, product_id) -> NearDuplicateIndex:
+        """The product's index; products without an id (onboarding) get a throwaway one"""
+        if product_id is None:
+            return NearDuplicateIndex()
+        with self._lock:
+            index = self._indexes.get(product_id)
+            if index is None:
+                index = self._indexes[product_id] = NearDuplicateIndex()
+            return index
+
+    def count(self, checked: int, dropped: int) -> None:
+        with self._lock:
+            self.checked += checked
+            self.dropped += dropped
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": NEAR_DUPLICATE_FILTER,
+                "products": len(self._indexes),
+                "indexed_posts": sum(len(index) for index in self._indexes.values()),
+                "checked": self.checked,
+                "dropped": self.dropped,
+            }
+
+
+near_duplicates = NearDuplicateRegistry()
@@ -1,13 +1,93 @@
 import os
+import json
+import math
+from src.utils.cost_calculator import GeminiCostCalculator, get_tokenizer
+from src.utils.prompt_templates import prompt_templates
+
+# Compact, line-oriented post encoding for the lead prompts (set to 0 for indented JSON)
+COMPACT_POST_ENCODING = os.getenv('COMPACT_POST_ENCODING', '1') == '1'
+# Token budgets replacing the fixed 1000-char slice in compact mode
+POST_CONTENT_TOKEN_BUDGET = int(os.getenv('POST_CONTENT_TOKEN_BUDGET', '250'))
+POST_COMMENT_TOKEN_BUDGET = int(os.getenv('POST_COMMENT_TOKEN_BUDGET', '80'))
+# Post text kept in the indented JSON encoding
+POST_CONTENT_MAX_CHARS = 1000
+
+COMPACT_POSTS_LEGEND = (
+    "Posts are listed one block per post. Header: [id=<post_id> s=<score> c=<total comments>] <title>. "
+    "'body:' is the post text, 'tc(<score>):' a top comment. Texts may be truncated with '…'."
+)
+
+# Stage-1 selection cap as a share of the batch: 6 of every 10 posts, as when batches held 10
+LEAD_SELECTION_SHARE = float(os.getenv('LEAD_SELECTION_SHARE', '0.6'))
+
+
+def _truncate_tokens(text, budget):
+    """Collapse whitespace and cut `text` to at most `budget` tokens"""
+    text = " ".join(str(text or "").split())
+    tokenizer = get_tokenizer()
+    tokens = tokenizer.encode(text)
+    if len(tokens) <= budget:
+        return text
+    return tokenizer.decode(tokens[:budget]).rstrip() + "…"
+
+
+def encode_posts_compact(posts, content_token_budget=None, comment_token_budget=None):
+    """
+    Encode post payloads as short line-oriented blocks instead of indented JSON.
+
+    Keys are written once in the legend rather than per post, and `content` and
+    `top_comments` are truncated to token budgets.
+    """
+    content_token_budget = content_token_budget or POST_CONTENT_TOKEN_BUDGET
+    comment_token_budget = comment_token_budget or POST_COMMENT_TOKEN_BUDGET
+
+    blocks = []
+    for post in posts:
+        title = " ".join(str(post.get('title', '')).split())
+        lines = [f"[id={post.get('post_id')} s={post.get('score', 0)} c={post.get('total_comments', 0)}] {title}"]
+        content = post.get('content')
+        if content and content != "No text":
+            lines.append(f"body: {_truncate_tokens(content, content_token_budget)}")
+        for comment in post.get('top_comments', []) or []:
+            lines.append(f"tc({comment.get('score', 0)}): {_truncate_tokens(comment.get('comment', ''), comment_token_budget)}")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def serialize_posts(posts, compact=None):
+    """Serialize post payloads the way the lead prompts embed them"""
+    if compact is None:
+        compact = COMPACT_POST_ENCODING
+    if compact:
+        return f"{COMPACT_POSTS_LEGEND}\n\n{encode_posts_compact(posts)}"
+    posts = [{**post, "content": post["content"][:POST_CONTENT_MAX_CHARS]} if isinstance(post.get("content"), str) else post for post in posts]
+    return json.dumps(posts, indent=2, ensure_ascii=False)
+
+
+def measure_post_encoding_savings(product_data, posts, prompt_fn=None):
+    """
+    Count the prompt tokens of one batch in both encodings.
+
+    Returns {"json_tokens", "compact_tokens", "saved_tokens", "saved_ratio"}.
+    """
+    prompt_fn = prompt_fn or lead_generation_prompt
+    calculator = GeminiCostCalculator()
+    json_tokens = calculator.count_messages_tokens(prompt_fn(product_data, posts, compact=False))
+    compact_tokens = calculator.count_messages_tokens(prompt_fn(product_data, posts, compact=True))
+    saved = json_tokens - compact_tokens
+    return {
+        "json_tokens": json_tokens,
+        "compact_tokens": compact_tokens,
+        "saved_tokens": saved,
+        "saved_ratio": round(saved / json_tokens, 4) if json_tokens else 0.0,
+    }
 
 def reddit_post_generator_prompt(user_prompt):
     # ===== Create User Prompt =====
     current_user_prompt = user_prompt
     
     # ===== Create System Prompt =====
-    config_path = os.path.join(os.path.dirname(__file__), '..', 'config', 'reddit_post_generator_prompt.txt')
-    with open(config_path, 'r', encoding='utf-8') as file:
-        system_prompt = file.read()
+    system_prompt = prompt_templates.text('reddit_post_generator_prompt')
 
     # ===== Create Messages =====
     messages = [
@@ -19,9 +99,7 @@ def reddit_post_generator_prompt(user_prompt):
 
 def generate_product_details_prompt(website_content):
     # ===== Create System Prompt =====
-    config_path = os.path.join(os.path.dirname(__file__), '..', 'config', 'product_details_prompt.txt')
-    with open(config_path, 'r', encoding='utf-8') as file:
-        system_prompt = file.read()
+    system_prompt = prompt_templates.text('product_details_prompt')
 
     # ===== Create Messages =====
     messages = [
@@ -33,9 +111,7 @@ def generate_product_details_prompt(website_content):
     
 def comment_karma_prompt(posts):
     # ===== Create System Prompt =====
-    config_path = os.path.join(os.path.dirname(__file__), '..', 'config', 'karma_helper_prompt.txt')
-    with open(config_path, 'r', encoding='utf-8') as file:
-        system_prompt = file.read()
+    system_prompt = prompt_templates.text('karma_helper_prompt')
     
     # ===== Format Posts Data for Better AI Understanding =====
     formatted_posts = []
@@ -136,38 +212,47 @@ def lead_subreddits_for_product_prompt(product_data):
 
     return messages
 
-def lead_generation_prompt(product_data, posts):
-    config_path = os.path.join(os.path.dirname(__file__), '..', 'config', 'lead_finding_prompt.txt')
-    with open(config_path, 'r', encoding='utf-8') as file:
-        system_prompt_template = file.read()
+def lead_finding_system_prompt(product_data):
+    """
+    The system prompt every classification batch of a product shares: static
+    instructions and worked examples first, the product profile last.
 
-    system_prompt = system_prompt_template.format(
+    It stays the same across batches and cron cycles until the product changes,
+    so it can be served from a provider context cache. The worked examples also
+    lift it above Gemini's minimum size for an explicit cache.
+    """
+    return prompt_templates.render(
+        'lead_finding_prompt',
+        examples=prompt_templates.text('lead_finding_examples'),
         name=product_data['name'],
         target_audience=product_data['target_audience'],
         problem_solved=product_data['problem_solved'],
         description=product_data['description'],
     )
 
-    # Convert JSON posts to string format for AI processing
-    import json
-    formatted_posts_string = json.dumps(posts, indent=2, ensure_ascii=False)
+def lead_generation_prompt(product_data, posts, compact=None, max_posts=None):
+    if max_posts is None:
+        # The cap follows the batch size, so bigger batches don't shortlist fewer posts per post seen
+        max_posts = max(1, math.ceil(len(posts) * LEAD_SELECTION_SHARE))
+    system_prompt = lead_finding_system_prompt(product_data)
+
+    # Convert posts to string format for AI processing
+    formatted_posts_string = serialize_posts(posts, compact)
 
+    # The cap depends on the batch, so it goes here rather than in the cached system prompt
     user_prompt = f"""
-    Analyze these Reddit posts for lead generation opportunities:
+    Analyze these Reddit posts for lead generation opportunities (select at most {max_posts}):
     {formatted_posts_string}
     """
     
     messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
     return messages
 
-def lead_generation_prompt_2(product_data, posts, min_posts=5):
+def lead_generation_prompt_2(product_data, posts, min_posts=5, compact=None):
     # ===== Create System Prompt =====
-    config_path = os.path.join(os.path.dirname(__file__), '..', 'config', 'lead_generation_prompt.txt')
-    with open(config_path, 'r', encoding='utf-8') as file:
-        system_prompt_template = file.read()
-    
-    # Format the prompt with the provided data
-    system_prompt = system_prompt_template.format(
+    # Format the preloaded template with the provided data
+    system_prompt = prompt_templates.render(
+        'lead_generation_prompt',
         name=product_data['name'],
         target_audience=product_data['target_audience'],
         problem_solved=product_data['problem_solved'],
@@ -175,9 +260,8 @@ def lead_generation_prompt_2(product_data, posts, min_posts=5):
         min_posts=min_posts
     )
     
-    # Convert JSON posts to string format for AI processing
-    import json
-    formatted_posts_string = json.dumps(posts, indent=2, ensure_ascii=False)
+    # Convert posts to string format for AI processing
+    formatted_posts_string = serialize_posts(posts, compact)
 
     user_prompt = f"""
     Analyze these Reddit posts for lead generation opportunities:
@@ -0,0 +1,186 @@
+import logging
+import os
+import string
+import threading
+import time
+from typing import Any, Dict, FrozenSet, NamedTuple, Optional, Tuple
+
+from src.utils.cost_calculator import get_tokenizer
+
+logger = logging.getLogger(__name__)
+
+CONFIG_DIR = os.path.join(os.path.dirname(__file__), '..', 'config')
+
+# How often a template's file is stat()ed for changes
+RELOAD_CHECK_SECONDS = float(os.getenv('PROMPT_RELOAD_CHECK_SECONDS', '2'))
+
+# Prompt files sent as they are. Every other file is a str.format template,
+# so a stray brace in one fails its load instead of turning it verbatim
+VERBATIM_TEMPLATES = frozenset({
+    'karma_helper_prompt',
+    'lead_finding_examples',
+    'product_details_prompt',
+    'reddit_post_generator_prompt',
+})
+
+
+class PromptTemplateError(ValueError):
+    """A format template's file doesn't parse, or uses a field that isn't a plain name"""
+
+
+class CompiledTemplate(NamedTuple):
+    """One immutable version of a template file, swapped in whole on reload"""
+    text: str
+    parts: Tuple[Tuple[str, Optional[str], str, Optional[str]], ...]
+    fields: Tuple[str, ...]
+    mtime: float
+
+
+def compile_template(name: str, text: str, verbatim: bool, mtime: float = 0.0) -> CompiledTemplate:
+    if verbatim:
+        return CompiledTemplate(text, ((text, None, '', None),), (), mtime)
+    try:
+        parts = tuple(string.Formatter().parse(text))
+    except ValueError as e:
+        raise PromptTemplateError(f"Prompt template {name} doesn't parse: {e}") from e
+    fields = [field for _, field, _, _ in parts if field is not None]
+    bad = [field for field in fields if not field.isidentifier()]
+    if bad:
+        raise PromptTemplateError(f"Prompt template {name} has fields that aren't plain names: {bad}")
+    return CompiledTemplate(text, parts, tuple(sorted(set(fields))), mtime)
+
+
+class PromptTemplate:
+    """One prompt file, pre-split into static literal parts and format fields.
+
+    Whether the file is a format template or served verbatim is fixed when it
+    is registered. Each load compiles a new CompiledTemplate and replaces the
+    current one in a single assignment, so render() never sees half of a
+    reload; a file that fails to compile raises and the last good version stays.
+    """
+
+    def __init__(self, name: str, path: str, verbatim: bool = False):
+        self.name = name
+        self.path = path
+        self.verbatim = verbatim
+        self.compiled: Optional[CompiledTemplate] = None
+        self._static_tokens: Optional[Tuple[CompiledTemplate, int]] = None
+        self._last_checked = 0.0
+        self._failed_mtime: Optional[float] = None
+        self.load()
+
+    @property
+    def text(self) -> str:
+        return self.compiled.text
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        return self.compiled.fields
+
+    def load(self) -> None:
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, 'r', encoding='utf-8') as file:
+            text = file.read()
+        try:
+            self.compiled = compile_template(self.name, text, self.verbatim, mtime)
+        except PromptTemplateError:
+            self._failed_mtime = mtime
+            raise
+        self._failed_mtime = None
+
+    def reload_if_changed(self) -> bool:
+        """Re-read the file if its mtime moved; raises PromptTemplateError once per bad version"""
+        now = time.monotonic()
+        if now - self._last_checked < RELOAD_CHECK_SECONDS:
+            return False
+        self._last_checked = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False
+        if mtime == self.compiled.mtime or mtime == self._failed_mtime:
+            return False
+        self.load()
+        return True
+
+    @property
+    def static_text(self) -> str:
+        """The literal text of the template with every field left out"""
+        # parse() returns escaped '{{'/'}}' as single braces, exactly as they are sent
+        return "".join(literal for literal, _, _, _ in self.compiled.parts)
+
+    @property
+    def static_token_count(self) -> int:
+        compiled = self.compiled
+        cached = self._static_tokens
+        if cached is None or cached[0] is not compiled:
+            cached = (compiled, len(get_tokenizer().encode(self.static_text)))
+            self._static_tokens = cached
+        return cached[1]
+
+    def render(self, **kwargs: Any) -> str:
+        compiled = self.compiled
+        if self.verbatim:
+            return compiled.text
+
+        formatter = string.Formatter()
+        rendered = []
+        for literal, field, format_spec, conversion in compiled.parts:
+            rendered.append(literal)
+            if field is None:
+                continue
+            value = kwargs[field]
+            if conversion:
+                value = formatter.convert_field(value, conversion)
+            rendered.append(formatter.format_field(value, format_spec or ''))
+        return "".join(rendered)
+
+
+class PromptTemplateRegistry:
+    """Every prompt file under src/config, loaded once and served from memory.
+
+    A template is re-read only when its file's mtime changes (checked at most
+    every RELOAD_CHECK_SECONDS). Files named in `verbatim` are sent as they
+    are; the rest are format templates. An edit that breaks a template is
+    logged and the previous version keeps being served.
+    """
+
+    def __init__(self, config_dir: str = CONFIG_DIR, verbatim: FrozenSet[str] = VERBATIM_TEMPLATES):
+        self.config_dir = os.path.abspath(config_dir)
+        self.verbatim = frozenset(verbatim)
+        self._templates: Dict[str, PromptTemplate] = {}
+        self._lock = threading.Lock()
+        self.load_all()
+
+    def load_all(self) -> None:
+        with self._lock:
+            for filename in sorted(os.listdir(self.config_dir)):
+                if filename.endswith('.txt'):
+                    name = filename[:-len('.txt')]
+                    path = os.path.join(self.config_dir, filename)
+                    self._templates[name] = PromptTemplate(name, path, verbatim=name in self.verbatim)
+
+    def get(self, name: str) -> PromptTemplate:
+        template = self._templates.get(name)
+        if template is None:
+            raise KeyError(f"Unknown prompt template: {name}")
+        with self._lock:
+            try:
+                template.reload_if_changed()
+            except PromptTemplateError as e:
+                logger.error(f"Keeping the previous version of prompt template {name}: {e}")
+        return template
+
+    def text(self, name: str) -> str:
+        return self.get(name).text
+
+    def render(self, template_name: str, /, **kwargs: Any) -> str:
+        # Positional-only, since templates use `name` as a field
+        return self.get(template_name).render(**kwargs)
+
+    def static_token_counts(self) -> Dict[str, int]:
+        """Token count of each template's static part"""
+        return {name: self.get(name).static_token_count for name in sorted(self._templates)}
+
+
+prompt_templates = PromptTemplateRegistry()
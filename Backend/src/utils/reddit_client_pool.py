@@ -0,0 +1,83 @@
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict
+
+
+class RedditClientPool:
+    """Bounded pool of Reddit client instances with per-thread checkout.
+
+    A PRAW client (and its underlying requests session) is not built for heavy
+    concurrent use, so each thread borrows a client for exclusive use and returns
+    it afterwards. Clients are created lazily up to `size` and then reused, which
+    keeps their keep-alive connections and OAuth tokens warm; prawcore refreshes a
+    client's token on the first request after it expires. Nested checkouts on the
+    same thread reuse the client already held.
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int = 4):
+        self._factory = factory
+        self.size = max(1, size)
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.checkouts = 0
+        self.waits = 0
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+                self.waits += 1
+
+        if create:
+            try:
+                return self._factory()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    @contextmanager
+    def client(self):
+        """Check out a client for the current thread"""
+        held = getattr(self._local, 'client', None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        reddit = self._acquire()
+        with self._lock:
+            self.checkouts += 1
+        self._local.client = reddit
+        self._local.depth = 1
+        try:
+            yield reddit
+        finally:
+            self._local.client = None
+            self._local.depth = 0
+            self._idle.put(reddit)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "idle": self._idle.qsize(),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+            }
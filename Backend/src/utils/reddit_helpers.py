@@ -1,69 +1,126 @@
 import praw
+import prawcore
 import os
 from dotenv import load_dotenv
 import random
 import requests
 import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from src.utils.image_handling import convert_to_webp
 from src.utils.prompt_generator import post_karma_prompt
-from flask import jsonify, current_app
-from supabase import create_client, Client
+from src.utils.listing_cache import ListingCache
+from src.utils.reddit_rate_limiter import ScheduledRequestor
+from src.utils.reddit_client_pool import RedditClientPool
+from src.utils.subreddit_cursors import get_subreddit_cursor, is_at_or_before_cursor
+from flask import jsonify
+from supabase import Client
+from src.utils.supabase_pool import get_supabase
 
 load_dotenv()
 
-# Set up Reddit instance
-reddit = praw.Reddit(
-    client_id=os.getenv('REDDIT_CLIENT'),
-    client_secret=os.getenv('REDDIT_SECRET'),
-    user_agent="MarketingAgent/1.0",
+# Concurrency settings for subreddit listing. All listing workers, across every
+# request thread, share one budget of in-flight Reddit requests.
+REDDIT_LISTING_WORKERS = int(os.getenv('REDDIT_LISTING_WORKERS', '5'))
+REDDIT_MAX_CONCURRENT_REQUESTS = int(os.getenv('REDDIT_MAX_CONCURRENT_REQUESTS', '4'))
+# With a cursor, listing pages past the first `limit_per_sub` posts until it
+# reaches the cursor, up to this many posts (100 is one Reddit request)
+REDDIT_CURSOR_MAX_POSTS = int(os.getenv('REDDIT_CURSOR_MAX_POSTS', '100'))
+
+
+def _create_reddit_client():
+    # Every HTTP call is paced by the shared rate limiter
+    return praw.Reddit(
+        client_id=os.getenv('REDDIT_CLIENT'),
+        client_secret=os.getenv('REDDIT_SECRET'),
+        user_agent="MarketingAgent/1.0",
+        requestor_class=ScheduledRequestor,
+        check_for_async=False,
+    )
+
+
+# Pool of Reddit clients; its size is the budget of in-flight Reddit requests
+reddit_pool = RedditClientPool(_create_reddit_client, size=REDDIT_MAX_CONCURRENT_REQUESTS)
+
+# Process-wide cache of subreddit listings shared by every user. Products often map
+# to the same subreddits, so one cron cycle lists each subreddit once.
+listing_cache = ListingCache(
+    ttl_seconds=float(os.getenv('LISTING_CACHE_TTL_SECONDS', '600')),
+    max_entries=int(os.getenv('LISTING_CACHE_MAX_ENTRIES', '1000')),
 )
 
+
+def _snapshot_submission(post):
+    """Copy the listing fields we use out of a PRAW submission into a plain dict"""
+    return {
+        "id": post.id,
+        "name": post.name,
+        "title": post.title,
+        "score": post.score,
+        "num_comments": post.num_comments,
+        "created": post.created,
+        "created_utc": post.created_utc,
+        "selftext": getattr(post, "selftext", None) or "",
+        "over_18": post.over_18,
+        "stickied": post.stickied,
+        "author": post.author.name if post.author else 'deleted',
+    }
+
+
+def get_subreddit_listing(subreddit_name, listing_type='new', limit=10):
+    """
+    Return the `limit` newest entries of a subreddit listing ('new', 'rising', ...)
+    as plain dicts, served from the shared listing cache when fresh.
+    """
+    key = (str(subreddit_name).lower(), listing_type)
+
+    def fetch():
+        # Every listing call draws from the shared Reddit request budget
+        with reddit_pool.client() as reddit:
+            subreddit = reddit.subreddit(subreddit_name)
+            listing = getattr(subreddit, listing_type)(limit=limit)
+            posts = [_snapshot_submission(post) for post in listing]
+        return {"limit": limit, "posts": posts}
+
+    # A cached listing fetched with a smaller limit can't answer a larger request
+    entry = listing_cache.get_or_fetch(key, fetch, accept=lambda cached: cached["limit"] >= limit)
+    return entry["posts"][:limit]
+
 def get_rising_posts():
     subreddits = ['ask', 'help', 'askreddit', 'mildlyinteresting', 'nostupidquestions']
     
     random_subreddit = random.choice(subreddits)
 
-    subreddit = reddit.subreddit(random_subreddit)
+    listing = [post for post in get_subreddit_listing(random_subreddit, 'rising', limit=5) if not post['over_18']]
+    comments_by_post_id = fetch_comments_for_posts(
+        [post['id'] for post in listing],
+        comments_per_post=3,
+        num_comments_by_id={post['id']: post['num_comments'] for post in listing},
+    )
 
     post_content = []
     
-    for post in subreddit.rising(limit=5):
-        if post.over_18 == True:
-            continue
+    for post in listing:
         try:
-            comments = []
-            
             # Construct the proper Reddit comment URL using post ID
             # This ensures we get the comment page URL, not the direct image/media URL
-            comment_url = f"https://www.reddit.com/r/{random_subreddit}/comments/{post.id}/"
-            
-            # Get the post using the comment URL
-            post = reddit.submission(url=comment_url)
-            post.comment_sort = 'top'   
-
-            for comment in post.comments[:3]:
-                new_comment = {
-                    "comment": comment.body,
-                    "score": comment.score
-                }
-                comments.append(new_comment)
+            comment_url = f"https://www.reddit.com/r/{random_subreddit}/comments/{post['id']}/"
 
             rising_post = {
-                "title": post.title,
-                "author": post.author.name if post.author else 'deleted',
-                "score": post.score,
-                "comments": post.num_comments,
-                "created": post.created,
+                "title": post['title'],
+                "author": post['author'],
+                "score": post['score'],
+                "comments": post['num_comments'],
+                "created": post['created'],
                 "url": comment_url,  # Use the comment URL, not the original post.url
-                "selftext": post.selftext[:1000] if post.selftext else "No text",
-                "nsfw": post.over_18,
-                "stickied": post.stickied,
-                "top_comments": comments
+                "selftext": post['selftext'][:1000] if post['selftext'] else "No text",
+                "nsfw": post['over_18'],
+                "stickied": post['stickied'],
+                "top_comments": comments_by_post_id.get(post['id'], [])
             }
             post_content.append(rising_post)
             
         except Exception as e:
-            print(f"Error processing post {post.id}: {str(e)}")
+            print(f"Error processing post {post['id']}: {str(e)}")
             continue
 
     return post_content
@@ -88,9 +145,7 @@ def create_karma_post():
         return messages, random_subreddit, webp_base64
     
 def get_product_lead_subreddits(product_id):
-    supabase_url = current_app.config['SUPABASE_URL']
-    supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
-    supabase: Client = create_client(supabase_url, supabase_key)
+    supabase: Client = get_supabase()
     
     leads_result = supabase.table('lead_subreddits').select('*').eq('product_id', product_id).order('created_at', desc=True).execute()
     
@@ -106,47 +161,35 @@ def lead_posts(subreddits):
     post_content = []
     for subreddit_name in subreddits:
         try:
-            subreddit = reddit.subreddit(subreddit_name)
-            
-            # Test if subreddit exists
-            display_name = subreddit.display_name
-            print(f"✅ Processing subreddit: r/{display_name}")
+            listing = [post for post in get_subreddit_listing(subreddit_name, 'new', limit=10) if not post['over_18']]
+            print(f"✅ Processing subreddit: r/{subreddit_name}")
+
+            comments_by_post_id = fetch_comments_for_posts(
+                [post['id'] for post in listing],
+                comments_per_post=3,
+                num_comments_by_id={post['id']: post['num_comments'] for post in listing},
+            )
             
-            for post in subreddit.new(limit=10):
-                if post.over_18 == True:
-                    continue
-                
-                comments = []
-                
+            for post in listing:
                 # Construct the proper Reddit comment URL using post ID
                 # This ensures we get the comment page URL, not the direct image/media URL
-                comment_url = f"https://www.reddit.com/r/{subreddit_name}/comments/{post.id}/"
+                comment_url = f"https://www.reddit.com/r/{subreddit_name}/comments/{post['id']}/"
                 subreddit_name_clean = str(subreddit_name)
-                # Get the post using the comment URL
-                post = reddit.submission(url=comment_url)
-                post.comment_sort = 'top'   
-
-                for comment in post.comments[:3]:
-                    new_comment = {
-                        "comment": comment.body,
-                        "score": comment.score
-                    }
-                    comments.append(new_comment)
 
                 # Convert epoch to ISO datetime string (YYYY-MM-DDTHH:MM:SS) for Postgres timestamp column using timezone-aware UTC
-                created_iso_date = datetime.datetime.fromtimestamp(post.created_utc, tz=datetime.timezone.utc).isoformat()
+                created_iso_date = datetime.datetime.fromtimestamp(post['created_utc'], tz=datetime.timezone.utc).isoformat()
 
                 lead_post = {
-                    "title": post.title,
-                    "score": post.score,
-                    "comments": post.num_comments,
-                    "created": post.created,
+                    "title": post['title'],
+                    "score": post['score'],
+                    "comments": post['num_comments'],
+                    "created": post['created'],
                     "url": comment_url,
-                    "reddit_post_id": post.id,  # Add Reddit post ID for deduplication
-                    "selftext": post.selftext[:1000] if post.selftext else "No text",
-                    "top_comments": comments,
-                    "num_comments": post.num_comments,
-                    "author": post.author.name if post.author else 'deleted',
+                    "reddit_post_id": post['id'],  # Add Reddit post ID for deduplication
+                    "selftext": post['selftext'][:1000] if post['selftext'] else "No text",
+                    "top_comments": comments_by_post_id.get(post['id'], []),
+                    "num_comments": post['num_comments'],
+                    "author": post['author'],
                     "subreddit": subreddit_name_clean,
                     "date": created_iso_date
                 }
@@ -181,81 +224,222 @@ def lead_posts(subreddits):
     return post_content, formatted_posts
 
 
-def list_new_posts_metadata(subreddits, limit_per_sub=10):
+def _list_subreddit_metadata(subreddit_name, limit_per_sub, cursor=None):
+    """
+    List the newest posts of one subreddit as lightweight dicts (no comments).
+
+    With a `cursor`, listing covers every post newer than the cursor: when the
+    first `limit_per_sub` posts don't reach it, a longer listing (up to
+    REDDIT_CURSOR_MAX_POSTS) is fetched. It stops at the first post that was
+    already evaluated.
+    """
+    subreddit_posts = []
+
+    listing = get_subreddit_listing(subreddit_name, 'new', limit=limit_per_sub)
+    if cursor and _listing_ends_before_cursor(listing, limit_per_sub, cursor):
+        listing = get_subreddit_listing(subreddit_name, 'new', limit=max(limit_per_sub, REDDIT_CURSOR_MAX_POSTS))
+        if _listing_ends_before_cursor(listing, REDDIT_CURSOR_MAX_POSTS, cursor):
+            print(f"⚠️ More than {REDDIT_CURSOR_MAX_POSTS} new posts in r/{subreddit_name} since its cursor; older ones are skipped")
+    print(f"✅ Listing metadata for subreddit: r/{subreddit_name}")
+
+    for post in listing:
+        # Listing is newest-first, so everything from the cursor on was seen last run
+        if is_at_or_before_cursor(post, cursor):
+            break
+        if post['over_18']:
+            continue
+
+        # Build lightweight structures without fetching comments
+        created_iso_date = datetime.datetime.fromtimestamp(post['created_utc'], tz=datetime.timezone.utc).isoformat()
+        comment_url = f"https://www.reddit.com/r/{subreddit_name}/comments/{post['id']}/"
+        subreddit_name_clean = str(subreddit_name)
+
+        subreddit_posts.append({
+            "title": post['title'],
+            "score": post['score'],
+            "comments": post['num_comments'],
+            "created": post['created'],
+            "created_utc": post['created_utc'],
+            "url": comment_url,
+            "reddit_post_id": post['id'],
+            # Full text: the prompts truncate it (to a token budget in compact mode)
+            "selftext": post['selftext'] if post['selftext'] else "No text",
+            "num_comments": post['num_comments'],
+            "author": post['author'],
+            "subreddit": subreddit_name_clean,
+            "date": created_iso_date
+        })
+
+    return subreddit_posts
+
+
+def _listing_ends_before_cursor(listing, limit, cursor):
+    """True when a full newest-first listing has only posts newer than the cursor"""
+    return len(listing) >= limit and not any(is_at_or_before_cursor(post, cursor) for post in listing)
+
+
+def format_post_metadata(unformatted, post_id):
+    """Build the compact post payload sent to classification from a listed post"""
+    return {
+        "post_id": post_id,
+        "title": unformatted["title"],
+        "score": unformatted["score"],
+        "total_comments": unformatted["comments"],
+        "url": unformatted["url"],
+        "content": unformatted["selftext"],
+    }
+
+
+def iter_new_posts_metadata(subreddits, limit_per_sub=10, max_workers=REDDIT_LISTING_WORKERS, cursors=None):
+    """
+    Yield each subreddit's newest posts (lightweight dicts) in the order of
+    `subreddits`, while the later subreddits are still being listed, so
+    downstream stages can start before the slowest subreddit returns.
+
+    The order is fixed, so the same listings always get the same post indexes.
+    Subreddits that fail to list are logged and skipped.
+    """
+    if not subreddits:
+        return
+
+    workers = max(1, min(max_workers, len(subreddits)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_list_subreddit_metadata, subreddit_name, limit_per_sub, get_subreddit_cursor(cursors, subreddit_name))
+            for subreddit_name in subreddits
+        ]
+        for subreddit_name, future in zip(subreddits, futures):
+            try:
+                subreddit_posts = future.result()
+            except Exception as e:
+                print(f"❌ Error listing metadata for r/{subreddit_name}: {str(e)}")
+                continue
+            if subreddit_posts:
+                yield subreddit_posts
+
+
+def list_new_posts_metadata(subreddits, limit_per_sub=10, max_workers=REDDIT_LISTING_WORKERS, cursors=None):
+    """
+    List the newest posts of every subreddit concurrently.
+
+    Subreddits are fetched by a bounded worker pool that shares the global
+    Reddit request budget. Results are assembled in the order of `subreddits`,
+    so the returned (post_content, formatted_posts) pair is deterministic.
+
+    `cursors` (see src.utils.subreddit_cursors) limits each subreddit to posts
+    newer than its last evaluated post.
+    """
     post_content = []
     formatted_posts = []
-    running_index = 0
-    for subreddit_name in subreddits:
+    for subreddit_posts in iter_new_posts_metadata(subreddits, limit_per_sub, max_workers, cursors):
+        for unformatted in subreddit_posts:
+            formatted_posts.append(format_post_metadata(unformatted, len(post_content)))
+            post_content.append(unformatted)
+
+    return post_content, formatted_posts
+
+
+def fetch_subreddit_metadata(subreddit_name, velocity_sample=25):
+    """
+    Look up whether a subreddit exists and is readable, with its size and activity.
+
+    Returns {"status", "subscribers", "posts_per_day"} where status is one of
+    'active', 'not_found', 'banned', 'private' or 'quarantined'.
+    """
+    try:
+        with reddit_pool.client() as reddit:
+            data = reddit.request(method="GET", path=f"r/{subreddit_name}/about/", params={"raw_json": 1})
+    except prawcore.exceptions.Redirect:
+        # Reddit redirects unknown subreddit names to its search page
+        return {"status": "not_found", "subscribers": None, "posts_per_day": None}
+    except (prawcore.exceptions.NotFound, prawcore.exceptions.Forbidden) as e:
         try:
-            subreddit = reddit.subreddit(subreddit_name)
-            # Accessing display_name validates existence/permissions
-            display_name = subreddit.display_name
-            print(f"✅ Listing metadata for subreddit: r/{display_name}")
+            reason = e.response.json().get('reason')
+        except Exception:
+            reason = None
+        if reason in ('banned', 'private', 'quarantined'):
+            status = reason
+        else:
+            status = 'private' if isinstance(e, prawcore.exceptions.Forbidden) else 'not_found'
+        return {"status": status, "subscribers": None, "posts_per_day": None}
 
-            for post in subreddit.new(limit=limit_per_sub):
-                if post.over_18:
-                    continue
+    about = data.get('data', {}) if isinstance(data, dict) else {}
+    if about.get('subreddit_type') == 'private':
+        return {"status": "private", "subscribers": about.get('subscribers'), "posts_per_day": None}
 
-                # Build lightweight structures without fetching comments
-                created_iso_date = datetime.datetime.fromtimestamp(post.created_utc, tz=datetime.timezone.utc).isoformat()
-                comment_url = f"https://www.reddit.com/r/{subreddit_name}/comments/{post.id}/"
-                subreddit_name_clean = str(subreddit_name)
+    # Post velocity from the newest posts; this also warms the shared listing cache
+    posts_per_day = None
+    listing = get_subreddit_listing(subreddit_name, 'new', limit=velocity_sample)
+    if len(listing) >= 2:
+        span_days = (listing[0]['created_utc'] - listing[-1]['created_utc']) / 86400
+        posts_per_day = round(len(listing) / span_days, 2) if span_days > 0 else float(len(listing))
 
-                unformatted = {
-                    "title": post.title,
-                    "score": post.score,
-                    "comments": post.num_comments,
-                    "created": post.created,
-                    "url": comment_url,
-                    "reddit_post_id": post.id,
-                    "selftext": post.selftext[:1000] if getattr(post, "selftext", None) else "No text",
-                    "num_comments": post.num_comments,
-                    "author": post.author.name if post.author else 'deleted',
-                    "subreddit": subreddit_name_clean,
-                    "date": created_iso_date
-                }
-                post_content.append(unformatted)
-
-                formatted = {
-                    "post_id": running_index,
-                    "title": unformatted["title"],
-                    "score": unformatted["score"],
-                    "total_comments": unformatted["comments"],
-                    "url": unformatted["url"],
-                    "content": unformatted["selftext"],
-                }
-                formatted_posts.append(formatted)
-                running_index += 1
+    return {
+        "status": "quarantined" if about.get('quarantine') else "active",
+        "subscribers": about.get('subscribers'),
+        "posts_per_day": posts_per_day,
+    }
 
-        except Exception as e:
-            print(f"❌ Error listing metadata for r/{subreddit_name}: {str(e)}")
+
+def _fetch_top_comments(reddit_post_id, comments_per_post):
+    """Fetch only the top-level top-N comments of a post in a single request."""
+    with reddit_pool.client() as reddit:
+        # depth=1 + limit=N asks Reddit for the first N root comments instead of the whole forest
+        data = reddit.request(
+            method="GET",
+            path=f"comments/{reddit_post_id}/",
+            params={"limit": comments_per_post, "depth": 1, "sort": "top", "raw_json": 1},
+        )
+
+    comments = []
+    comment_listing = data[1]["data"]["children"] if isinstance(data, list) and len(data) > 1 else []
+    for child in comment_listing:
+        if child.get("kind") != "t1":
             continue
+        comment_data = child.get("data", {})
+        comments.append({
+            "comment": comment_data.get("body", ""),
+            "score": comment_data.get("score", 0),
+        })
+        if len(comments) >= comments_per_post:
+            break
 
-    return post_content, formatted_posts
+    return comments
 
 
-def fetch_comments_for_posts(reddit_post_ids, comments_per_post=3):
+def fetch_comments_for_posts(reddit_post_ids, comments_per_post=3, num_comments_by_id=None, max_workers=REDDIT_LISTING_WORKERS):
+    """
+    Hydrate the top comments of many shortlisted posts concurrently.
+
+    `num_comments_by_id` takes the comment counts already known from the listing
+    phase; posts without comments are resolved without a Reddit round trip.
+    Returns a dict of reddit_post_id -> list of {"comment", "score"}.
+    """
     results_by_id = {}
+    num_comments_by_id = num_comments_by_id or {}
 
-    for pid in reddit_post_ids:
-        try:
-            submission = reddit.submission(id=pid)
-            submission.comment_sort = 'top'
-            try:
-                submission.comments.replace_more(limit=0)
-            except Exception:
-                pass
-
-            comments = []
-            for comment in submission.comments[:comments_per_post]:
-                comments.append({
-                    "comment": getattr(comment, "body", ""),
-                    "score": getattr(comment, "score", 0),
-                })
-
-            results_by_id[pid] = comments
-        except Exception as e:
-            print(f"❌ Error fetching comments for {pid}: {str(e)}")
+    pending_ids = []
+    for pid in dict.fromkeys(reddit_post_ids):
+        if num_comments_by_id.get(pid) == 0:
             results_by_id[pid] = []
+        else:
+            pending_ids.append(pid)
+
+    if not pending_ids:
+        return results_by_id
+
+    workers = max(1, min(max_workers, len(pending_ids)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        future_to_id = {
+            executor.submit(_fetch_top_comments, pid, comments_per_post): pid
+            for pid in pending_ids
+        }
+        for future in as_completed(future_to_id):
+            pid = future_to_id[future]
+            try:
+                results_by_id[pid] = future.result()
+            except Exception as e:
+                print(f"❌ Error fetching comments for {pid}: {str(e)}")
+                results_by_id[pid] = []
 
-    return results_by_id
\ No newline at end of file
+    return results_by_id
@@ -0,0 +1,146 @@
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import prawcore
+
+
+class RedditRateLimiter:
+    """Process-wide token bucket for Reddit API calls.
+
+    Callers are served strictly in arrival order. The refill rate follows Reddit's
+    X-Ratelimit-Remaining / X-Ratelimit-Reset headers, so every thread, executor
+    worker and cron run in this process shares the same per-client allowance.
+    """
+
+    def __init__(self, requests_per_minute: float = 90, burst: int = 10):
+        self.default_rate = requests_per_minute / 60.0
+        self.rate = self.default_rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+
+        self._cond = threading.Condition()
+        self._tickets = itertools.count()
+        self._now_serving = 0
+        self._waiting = 0
+
+        self.total_requests = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.throttled_responses = 0
+        self._recent_waits = deque(maxlen=200)
+        self.last_remaining: Optional[float] = None
+        self.last_reset: Optional[float] = None
+
+    def _refill(self, now: float) -> None:
+        # An exhausted window ends at its reset; resume the default pace until new headers arrive
+        if self.rate <= 0 and now >= self._blocked_until:
+            self.rate = self.default_rate
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+
+    def acquire(self) -> float:
+        """Block until this caller may issue one request; returns the seconds waited"""
+        start = time.monotonic()
+        with self._cond:
+            ticket = next(self._tickets)
+            self._waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if ticket == self._now_serving and now >= self._blocked_until and self.tokens >= 1:
+                        self.tokens -= 1
+                        self._now_serving += 1
+                        self._cond.notify_all()
+                        break
+
+                    if ticket != self._now_serving:
+                        timeout = None
+                    elif now < self._blocked_until:
+                        timeout = self._blocked_until - now
+                    else:
+                        timeout = (1 - self.tokens) / self.rate if self.rate > 0 else 1.0
+                    self._cond.wait(timeout)
+            finally:
+                self._waiting -= 1
+
+            waited = time.monotonic() - start
+            self.total_requests += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            self._recent_waits.append(waited)
+        return waited
+
+    def update(self, headers, status_code: Optional[int] = None) -> None:
+        """Adjust the bucket from a Reddit response's rate-limit headers"""
+        remaining = _header_float(headers, 'x-ratelimit-remaining')
+        reset = _header_float(headers, 'x-ratelimit-reset')
+
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+
+            if remaining is not None and reset is not None and reset > 0:
+                self.last_remaining = remaining
+                self.last_reset = reset
+                # Spread what is left of the window evenly until it resets
+                self.rate = max(remaining, 0) / reset
+                self.tokens = min(self.tokens, remaining)
+                if remaining < 1:
+                    self._blocked_until = max(self._blocked_until, now + reset)
+
+            if status_code == 429:
+                self.throttled_responses += 1
+                retry_after = _header_float(headers, 'retry-after') or reset or 60.0
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+                self.tokens = 0
+
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            recent = sorted(self._recent_waits)
+            return {
+                "queue_depth": self._waiting,
+                "tokens": round(self.tokens, 2),
+                "rate_per_second": round(self.rate, 3),
+                "blocked_for_seconds": round(max(0.0, self._blocked_until - time.monotonic()), 2),
+                "total_requests": self.total_requests,
+                "avg_wait_seconds": round(self.total_wait_seconds / self.total_requests, 4) if self.total_requests else 0.0,
+                "p95_wait_seconds": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 4) if recent else 0.0,
+                "max_wait_seconds": round(self.max_wait_seconds, 4),
+                "throttled_responses": self.throttled_responses,
+                "last_ratelimit_remaining": self.last_remaining,
+                "last_ratelimit_reset": self.last_reset,
+            }
+
+
+def _header_float(headers, name):
+    try:
+        value = headers.get(name)
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class ScheduledRequestor(prawcore.Requestor):
+    """prawcore requestor that routes every HTTP call through the shared rate limiter"""
+
+    def request(self, *args, **kwargs):
+        reddit_rate_limiter.acquire()
+        response = super().request(*args, **kwargs)
+        reddit_rate_limiter.update(response.headers, response.status_code)
+        return response
+
+
+reddit_rate_limiter = RedditRateLimiter(
+    requests_per_minute=float(os.getenv('REDDIT_REQUESTS_PER_MINUTE', '90')),
+    burst=int(os.getenv('REDDIT_REQUEST_BURST', '10')),
+)
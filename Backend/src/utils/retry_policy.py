@@ -0,0 +1,229 @@
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Connection and timeout errors of the provider SDKs' HTTP stacks (httpx,
+# openai), matched by name so this module doesn't import them
+TRANSPORT_ERROR_NAMES = frozenset({'TransportError', 'TimeoutException', 'APIConnectionError', 'APITimeoutError'})
+
+
+class LLMUnavailableError(Exception):
+    """A provider call gave up: retries exhausted, deadline hit, or circuit open.
+
+    Distinct from an empty answer, which providers return as a normal result.
+    """
+
+    def __init__(self, provider: str, message: str, attempts: int = 0, last_error: Optional[BaseException] = None):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+        self.attempts = attempts
+        self.last_error = last_error
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """The provider's circuit breaker is open, so the call was not attempted"""
+
+
+class ConcurrencySlotTimeout(TimeoutError):
+    """No local concurrency slot freed up before the call's deadline.
+
+    Says nothing about the provider's health, so it never counts as a breaker
+    failure.
+    """
+
+
+class CircuitBreaker:
+    """Per-provider circuit breaker.
+
+    Opens after `failure_threshold` consecutive failed calls, fails fast for
+    `reset_timeout` seconds, then lets one trial call through (half-open). The
+    trial's outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, provider: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if now - self._opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release(self) -> None:
+        """End a half-open trial that told nothing about the provider's health"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._trial_in_flight or self._consecutive_failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "provider": self.provider,
+                "state": self._state(time.monotonic()),
+                "consecutive_failures": self._consecutive_failures,
+            }
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    for attr in ('status_code', 'code', 'status'):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, 'response', None)
+    value = getattr(response, 'status_code', None)
+    return value if isinstance(value, int) else None
+
+
+def _retry_after_seconds(error: BaseException) -> Optional[float]:
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms') is not None:
+            return float(headers.get('retry-after-ms')) / 1000.0
+        if headers.get('retry-after') is not None:
+            return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def is_transport_error(error: BaseException) -> bool:
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return any(cls.__name__ in TRANSPORT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Transport failures, timeouts, 408, 429 and 5xx are worth retrying.
+    Anything else (bad requests, auth errors, bugs in our own code) is not.
+    """
+    status = _status_code(error)
+    if status is not None:
+        return status == 408 or status == 429 or status >= 500
+    return is_transport_error(error)
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter, Retry-After awareness and a per-call
+    deadline. Each attempt is given the time left before the deadline as its
+    request timeout, so a hung request can't outlive the deadline either.
+
+    A provider's Retry-After is honored in full, never shortened to
+    `max_delay`; when it doesn't fit in the deadline the call gives up at once
+    instead of retrying early into another rate limit.
+    """
+
+    def __init__(self,
+                 max_attempts: int = 4,
+                 base_delay: float = 0.5,
+                 max_delay: float = 8.0,
+                 deadline: float = 30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def backoff(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """Seconds to wait after failed attempt number `attempt` (1-based)"""
+        retry_after = _retry_after_seconds(error) if error is not None else None
+        if retry_after is not None:
+            return max(retry_after, 0.0)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def call(self,
+             provider: str,
+             fn: Callable[[float], Any],
+             breaker: Optional[CircuitBreaker] = None,
+             deadline: Optional[float] = None,
+             on_attempt: Optional[Callable[[int], None]] = None) -> Any:
+        """
+        Run `fn(timeout)` until it succeeds, raising LLMUnavailableError once the
+        attempts or the deadline are used up, or immediately while `breaker` is
+        open. `timeout` is the seconds left before the deadline. `on_attempt`
+        is told the number of every attempt actually made.
+
+        Only retryable errors count as breaker failures; a rejected request
+        says nothing about the provider's health.
+        """
+        deadline_at = time.monotonic() + (deadline if deadline is not None else self.deadline)
+        last_error = None
+
+        for attempt in range(1, self.max_attempts + 1):
+            if breaker is not None and not breaker.allow():
+                raise CircuitOpenError(provider, "circuit open", attempts=attempt - 1, last_error=last_error)
+
+            if on_attempt is not None:
+                on_attempt(attempt)
+            try:
+                result = fn(max(deadline_at - time.monotonic(), 0.0))
+            except ConcurrencySlotTimeout as e:
+                if breaker is not None:
+                    breaker.release()
+                raise LLMUnavailableError(provider, str(e), attempts=attempt, last_error=e)
+            except Exception as e:
+                last_error = e
+                logger.warning(f"Error generating response from {provider} (attempt {attempt}): {e}")
+                if not is_retryable(e):
+                    if breaker is not None:
+                        breaker.release()
+                    raise LLMUnavailableError(provider, f"non-retryable error: {e}", attempts=attempt, last_error=e)
+                if breaker is not None:
+                    breaker.record_failure()
+
+                if attempt == self.max_attempts:
+                    break
+                wait = self.backoff(attempt, e)
+                if time.monotonic() + wait >= deadline_at:
+                    raise LLMUnavailableError(
+                        provider, f"next attempt in {wait:.1f}s would pass the deadline", attempts=attempt, last_error=e
+                    )
+                time.sleep(wait)
+                continue
+
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+        raise LLMUnavailableError(provider, f"gave up after {attempt} attempts", attempts=attempt, last_error=last_error)
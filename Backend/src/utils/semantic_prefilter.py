@@ -0,0 +1,130 @@
+import math
+import os
+import threading
+import zlib
+from typing import Any, Dict, Sequence
+
+import numpy as np
+
+from src.utils.lexical_prefilter import (
+    tokenize, RankingPrefilter, PRODUCT_FIELD_WEIGHTS, PREFILTER_KEEP_FRACTION, PREFILTER_MIN_KEEP
+)
+from src.utils.lead_verdicts import product_revision
+
+# Off by default; when on it replaces the lexical prefilter in select_lead_posts
+SEMANTIC_PREFILTER = os.getenv('SEMANTIC_PREFILTER', '0') == '1'
+SEMANTIC_FEATURES = int(os.getenv('SEMANTIC_FEATURES', str(2 ** 14)))
+
+# Word n-grams carry the meaning; character n-grams inside words catch
+# inflections and spelling variants ("invoice"/"invoicing"/"invoices")
+WORD_NGRAM_WEIGHT = 1.0
+CHAR_NGRAM_SIZE = 4
+CHAR_NGRAM_WEIGHT = 0.5
+
+
+class HashingVectorizer:
+    """
+    Stateless text vectorizer: hashed word uni/bigrams plus character n-grams,
+    sublinear term weights, L2-normalized rows. Needs no vocabulary, model
+    download or GPU, so vectors are comparable across processes and restarts.
+    """
+
+    def __init__(self, n_features: int = SEMANTIC_FEATURES):
+        self.n_features = n_features
+
+    def _features(self, text: str) -> Dict[int, float]:
+        tokens = tokenize(text)
+        grams = []
+        grams.extend((f"w:{token}", WORD_NGRAM_WEIGHT) for token in tokens)
+        grams.extend((f"b:{first} {second}", WORD_NGRAM_WEIGHT) for first, second in zip(tokens, tokens[1:]))
+        for token in tokens:
+            padded = f"<{token}>"
+            grams.extend((f"c:{padded[i:i + CHAR_NGRAM_SIZE]}", CHAR_NGRAM_WEIGHT) for i in range(max(1, len(padded) - CHAR_NGRAM_SIZE + 1)))
+
+        counts: Dict[int, float] = {}
+        for gram, weight in grams:
+            digest = zlib.crc32(gram.encode('utf-8'))
+            # The top bit picks the sign so collisions tend to cancel out
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            index = digest % self.n_features
+            counts[index] = counts.get(index, 0.0) + sign * weight
+        return counts
+
+    def transform(self, texts: Sequence[str], weights: Sequence[float] = None) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for index, value in self._features(text).items():
+                matrix[row, index] = math.copysign(1 + math.log(abs(value)), value) if value else 0.0
+            if weights is not None:
+                matrix[row] *= weights[row]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1.0, norms)
+
+
+vectorizer = HashingVectorizer()
+
+
+def embed_product(product_data: Dict[str, Any]) -> np.ndarray:
+    """Unit vector of a product profile, with its fields weighted like the lexical query"""
+    fields = list(PRODUCT_FIELD_WEIGHTS)
+    vectors = vectorizer.transform([product_data.get(field) or "" for field in fields],
+                                   weights=[PRODUCT_FIELD_WEIGHTS[field] for field in fields])
+    profile = vectors.sum(axis=0)
+    norm = np.linalg.norm(profile)
+    return profile / norm if norm else profile
+
+
+def embed_posts(posts: Sequence[Dict[str, Any]]) -> np.ndarray:
+    return vectorizer.transform([f"{post.get('title', '')}\n{post.get('selftext', '')}" for post in posts])
+
+
+class ProductVectorIndex:
+    """Precomputed product vectors, refreshed when a product is created or edited"""
+
+    def __init__(self):
+        self._vectors: Dict[Any, tuple] = {}
+        self._lock = threading.Lock()
+
+    def refresh(self, product_data: Dict[str, Any]) -> np.ndarray:
+        vector = embed_product(product_data)
+        if product_data.get('id') is not None:
+            with self._lock:
+                self._vectors[product_data['id']] = (product_revision(product_data), vector)
+        return vector
+
+    def get(self, product_data: Dict[str, Any]) -> np.ndarray:
+        """The product's vector, recomputed if it was never built or the product changed since"""
+        with self._lock:
+            entry = self._vectors.get(product_data.get('id'))
+        if entry is not None and entry[0] == product_revision(product_data):
+            return entry[1]
+        return self.refresh(product_data)
+
+    def drop(self, product_id) -> None:
+        with self._lock:
+            self._vectors.pop(product_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"enabled": SEMANTIC_PREFILTER, "products": len(self._vectors), "features": vectorizer.n_features}
+
+
+product_vectors = ProductVectorIndex()
+
+
+class SemanticPrefilter(RankingPrefilter):
+    """Ranks posts by cosine similarity to the product vector"""
+
+    name = 'semantic'
+
+    def __init__(self, product_data: Dict[str, Any],
+                 keep_fraction: float = PREFILTER_KEEP_FRACTION,
+                 min_keep: int = PREFILTER_MIN_KEEP):
+        super().__init__(keep_fraction, min_keep)
+        self.product_vector = product_vectors.get(product_data)
+
+    def score(self, posts: Sequence[Dict[str, Any]]) -> np.ndarray:
+        if not posts:
+            return np.zeros(0, dtype=np.float32)
+        # Rows and the product vector are unit length, so the dot product is the cosine
+        return embed_posts(posts) @ self.product_vector
@@ -0,0 +1,108 @@
+import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Table: subreddit_cursors(product_id, subreddit, last_post_id, last_created_utc, updated_at)
+# with a unique constraint on (product_id, subreddit).
+CURSOR_TABLE = 'subreddit_cursors'
+
+
+def _cursor_key(subreddit_name):
+    return str(subreddit_name).lower()
+
+
+def load_subreddit_cursors(supabase, product_id):
+    """
+    Load the per-subreddit high-water marks of a product.
+
+    Returns a dict of lowercased subreddit -> {"last_post_id", "last_created_utc"}.
+    A failed read returns no cursors, which falls back to a full listing.
+    """
+    try:
+        result = supabase.table(CURSOR_TABLE).select('subreddit, last_post_id, last_created_utc').eq('product_id', product_id).execute()
+    except Exception as e:
+        logger.error(f"Error loading subreddit cursors for product {product_id}: {e}")
+        return {}
+
+    cursors = {}
+    for row in result.data or []:
+        cursors[_cursor_key(row['subreddit'])] = {
+            'last_post_id': row.get('last_post_id'),
+            'last_created_utc': float(row.get('last_created_utc') or 0),
+        }
+    return cursors
+
+
+def get_subreddit_cursor(cursors, subreddit_name):
+    if not cursors:
+        return None
+    return cursors.get(_cursor_key(subreddit_name))
+
+
+def is_at_or_before_cursor(post, cursor):
+    """True once a newest-first listing reaches a post that was already evaluated"""
+    if not cursor:
+        return False
+    if cursor.get('last_post_id') and post.get('id') == cursor['last_post_id']:
+        return True
+    return post.get('created_utc', 0) <= cursor.get('last_created_utc', 0)
+
+
+def advance_subreddit_cursors(cursors, post_content, judged_indexes=None):
+    """
+    Return the cursors moved forward to the newest evaluated post of each subreddit.
+
+    With `judged_indexes` (indexes into `post_content`), a subreddit's cursor
+    only moves up to the newest judged post that is strictly older than its
+    oldest unjudged post, so posts whose classification failed are listed
+    again on the next run.
+    """
+    judged = set(range(len(post_content))) if judged_indexes is None else set(judged_indexes)
+    # Oldest post of each subreddit that still needs a verdict
+    barriers = {}
+    for idx, post in enumerate(post_content):
+        if idx in judged:
+            continue
+        key = _cursor_key(post['subreddit'])
+        barriers[key] = min(barriers.get(key, post['created_utc']), post['created_utc'])
+
+    advanced = {key: dict(value) for key, value in (cursors or {}).items()}
+    for idx, post in enumerate(post_content):
+        if idx not in judged:
+            continue
+        key = _cursor_key(post['subreddit'])
+        if key in barriers and post['created_utc'] >= barriers[key]:
+            continue
+        current = advanced.get(key)
+        if current is None or post['created_utc'] > current['last_created_utc']:
+            advanced[key] = {
+                'last_post_id': post['reddit_post_id'],
+                'last_created_utc': post['created_utc'],
+            }
+    return advanced
+
+
+def save_subreddit_cursors(supabase, product_id, previous_cursors, cursors):
+    """Persist the cursors that moved since `previous_cursors` were loaded"""
+    now_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    rows = []
+    for key, cursor in cursors.items():
+        if (previous_cursors or {}).get(key) == cursor:
+            continue
+        rows.append({
+            'product_id': product_id,
+            'subreddit': key,
+            'last_post_id': cursor['last_post_id'],
+            'last_created_utc': cursor['last_created_utc'],
+            'updated_at': now_iso,
+        })
+
+    if not rows:
+        return
+
+    try:
+        supabase.table(CURSOR_TABLE).upsert(rows, on_conflict='product_id,subreddit').execute()
+        logger.info(f"Advanced {len(rows)} subreddit cursors for product {product_id}")
+    except Exception as e:
+        logger.error(f"Error saving subreddit cursors for product {product_id}: {e}")
@@ -0,0 +1,133 @@
+import datetime
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src.utils.reddit_helpers import fetch_subreddit_metadata
+
+logger = logging.getLogger(__name__)
+
+# Table: subreddit_registry(subreddit PK, status, subscribers, posts_per_day, checked_at)
+REGISTRY_TABLE = 'subreddit_registry'
+
+# Statuses that are never fetched again once recorded
+DEAD_STATUSES = {'not_found', 'banned'}
+# Private/quarantined subreddits can reopen, so they are re-checked occasionally
+UNREADABLE_RECHECK_DAYS = float(os.getenv('SUBREDDIT_UNREADABLE_RECHECK_DAYS', '30'))
+# Live subreddits get fresh subscriber counts and velocity at most this often
+ACTIVE_RECHECK_DAYS = float(os.getenv('SUBREDDIT_ACTIVE_RECHECK_DAYS', '7'))
+VALIDATION_WORKERS = int(os.getenv('SUBREDDIT_VALIDATION_WORKERS', '5'))
+
+_entries = {}
+_lock = threading.Lock()
+
+
+def clean_subreddit_name(subreddit):
+    """Strip an 'r/' prefix and surrounding whitespace from an LLM-suggested name"""
+    name = str(subreddit).strip().strip('/')
+    if name.lower().startswith('r/'):
+        name = name[2:]
+    return name
+
+
+def _key(subreddit_name):
+    return clean_subreddit_name(subreddit_name).lower()
+
+
+def _is_stale(entry):
+    if entry['status'] in DEAD_STATUSES:
+        return False
+    checked_at = entry.get('checked_at')
+    if not checked_at:
+        return True
+    try:
+        checked = datetime.datetime.fromisoformat(checked_at)
+    except ValueError:
+        return True
+    if checked.tzinfo is None:
+        # Stored without an offset (e.g. a timestamp column without time zone): it is UTC
+        checked = checked.replace(tzinfo=datetime.timezone.utc)
+    max_age_days = ACTIVE_RECHECK_DAYS if entry['status'] == 'active' else UNREADABLE_RECHECK_DAYS
+    return datetime.datetime.now(datetime.timezone.utc) - checked > datetime.timedelta(days=max_age_days)
+
+
+def _load_persisted(supabase, keys):
+    missing = [key for key in keys if key not in _entries]
+    if not missing:
+        return
+    try:
+        result = supabase.table(REGISTRY_TABLE).select('*').in_('subreddit', missing).execute()
+    except Exception as e:
+        logger.error(f"Error loading subreddit registry: {e}")
+        return
+    with _lock:
+        for row in result.data or []:
+            _entries[row['subreddit']] = row
+
+
+def _persist(supabase, rows):
+    if not rows:
+        return
+    try:
+        supabase.table(REGISTRY_TABLE).upsert(rows, on_conflict='subreddit').execute()
+    except Exception as e:
+        logger.error(f"Error saving subreddit registry: {e}")
+
+
+def validate_subreddits(supabase, subreddits, max_workers=VALIDATION_WORKERS):
+    """
+    Resolve registry entries for `subreddits`, checking unknown or stale names
+    against Reddit in parallel.
+
+    Returns a dict of cleaned subreddit name -> registry entry. Names that fail
+    to resolve because of a transient error are assumed active for now and
+    retried on the next call.
+    """
+    names = {}
+    for subreddit in subreddits:
+        name = clean_subreddit_name(subreddit)
+        if name:
+            names.setdefault(name.lower(), name)
+
+    _load_persisted(supabase, list(names))
+
+    to_check = [key for key in names if key not in _entries or _is_stale(_entries[key])]
+    fresh_rows = []
+    if to_check:
+        workers = max(1, min(max_workers, len(to_check)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            future_to_key = {executor.submit(fetch_subreddit_metadata, names[key]): key for key in to_check}
+            for future in as_completed(future_to_key):
+                key = future_to_key[future]
+                try:
+                    metadata = future.result()
+                except Exception as e:
+                    logger.warning(f"Could not validate r/{names[key]}: {e}")
+                    continue
+                row = {
+                    'subreddit': key,
+                    'status': metadata['status'],
+                    'subscribers': metadata['subscribers'],
+                    'posts_per_day': metadata['posts_per_day'],
+                    'checked_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                }
+                fresh_rows.append(row)
+
+        with _lock:
+            for row in fresh_rows:
+                _entries[row['subreddit']] = row
+        _persist(supabase, fresh_rows)
+
+        dead = [row['subreddit'] for row in fresh_rows if row['status'] != 'active']
+        if dead:
+            logger.info(f"Negatively cached {len(dead)} unusable subreddits: {dead}")
+
+    default_entry = {'status': 'active', 'subscribers': None, 'posts_per_day': None, 'checked_at': None}
+    return {name: _entries.get(key, {**default_entry, 'subreddit': key}) for key, name in names.items()}
+
+
+def filter_live_subreddits(supabase, subreddits):
+    """Return the cleaned names of `subreddits` that exist and can be listed, in order"""
+    entries = validate_subreddits(supabase, subreddits)
+    return [name for name, entry in entries.items() if entry['status'] == 'active']
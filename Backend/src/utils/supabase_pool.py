@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+from flask import current_app, has_app_context
+from supabase import create_client, Client
+from supabase.client import ClientOptions
+
+load_dotenv()
+
+# Timeouts of the pooled client's PostgREST and storage HTTP clients
+SUPABASE_POSTGREST_TIMEOUT = float(os.getenv('SUPABASE_POSTGREST_TIMEOUT', '30'))
+SUPABASE_STORAGE_TIMEOUT = float(os.getenv('SUPABASE_STORAGE_TIMEOUT', '60'))
+
+POOL_EXTENSION = 'supabase_pool'
+
+
+def supabase_key():
+    return os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
+
+
+class SupabasePool:
+    """
+    One long-lived Supabase client per worker process, shared by every
+    request handler and background thread.
+
+    The client builds its PostgREST and storage HTTP clients once, and their
+    httpx connection pools keep TLS connections alive between requests, so
+    only the first query of a worker pays the handshake. httpx clients are
+    thread-safe, and handlers only use the service key (no per-user auth
+    state), so no checkout is needed. A worker forked after the client was
+    built (e.g. a preloading server) builds its own instead of sharing
+    sockets with its parent.
+    """
+
+    def __init__(self, url: Optional[str] = None, key: Optional[str] = None):
+        self.url = url or os.getenv('SUPABASE_URL')
+        self.key = key or supabase_key()
+        self._client: Optional[Client] = None
+        self._pid = None
+        self._created_at = None
+        self._lock = threading.Lock()
+        self.clients_created = 0
+        self.handouts = 0
+        self.requests = 0
+        self.errors = 0
+
+    def _create(self) -> Client:
+        options = ClientOptions(
+            postgrest_client_timeout=SUPABASE_POSTGREST_TIMEOUT,
+            storage_client_timeout=SUPABASE_STORAGE_TIMEOUT,
+        )
+        client = create_client(self.url, self.key, options=options)
+        # Build the PostgREST client now rather than on the first query, and count its requests
+        session = getattr(client.postgrest, 'session', None)
+        if isinstance(session, httpx.Client):
+            session.event_hooks['request'].append(self._on_request)
+            session.event_hooks['response'].append(self._on_response)
+        return client
+
+    def _on_request(self, request):
+        with self._lock:
+            self.requests += 1
+
+    def _on_response(self, response):
+        if response.status_code >= 500:
+            with self._lock:
+                self.errors += 1
+
+    def client(self) -> Client:
+        pid = os.getpid()
+        with self._lock:
+            self.handouts += 1
+            if self._client is not None and self._pid == pid:
+                return self._client
+
+        with self._lock:
+            if self._client is None or self._pid != pid:
+                self._client = self._create()
+                self._pid = pid
+                self._created_at = time.time()
+                self.clients_created += 1
+            return self._client
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pid": self._pid,
+                "client_age_seconds": round(time.time() - self._created_at, 1) if self._created_at else None,
+                "clients_created": self.clients_created,
+                "handouts": self.handouts,
+                "postgrest_requests": self.requests,
+                "postgrest_server_errors": self.errors,
+            }
+
+
+# Used outside a Flask app context (cron threads, telemetry flusher, scripts)
+default_pool = SupabasePool()
+
+
+def init_app(app):
+    """Give the app its worker-wide pool, built from its own SUPABASE_URL"""
+    app.extensions[POOL_EXTENSION] = SupabasePool(app.config.get('SUPABASE_URL'))
+
+
+def get_supabase_pool() -> SupabasePool:
+    if has_app_context():
+        pool = current_app.extensions.get(POOL_EXTENSION)
+        if pool is not None:
+            return pool
+    return default_pool
+
+
+def get_supabase() -> Client:
+    """The shared Supabase client of the current app (or of the process, outside one)"""
+    return get_supabase_pool().client()
@@ -0,0 +1,121 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the app's modules as `src.…`, like app.py does when run from Backend/
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+class WordTokenizer:
+    """One token per whitespace-separated word"""
+
+    def encode(self, text):
+        return str(text).split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+@pytest.fixture
+def word_tokenizer(monkeypatch):
+    """Stands in for cl100k_base, whose ranks tiktoken would download on first use"""
+    from src.utils import cost_calculator
+    tokenizer = WordTokenizer()
+    monkeypatch.setattr(cost_calculator, '_tokenizer', tokenizer)
+    return tokenizer
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    """The slice of the PostgREST query builder the app uses, over in-memory rows"""
+
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.action = 'select'
+        self.payload = None
+        self.on_conflict = None
+        self.filters = []
+
+    def select(self, columns='*'):
+        self.action = 'select'
+        return self
+
+    def insert(self, rows):
+        self.action, self.payload = 'insert', rows
+        return self
+
+    def upsert(self, rows, on_conflict=''):
+        self.action, self.payload, self.on_conflict = 'upsert', rows, on_conflict
+        return self
+
+    def update(self, values):
+        self.action, self.payload = 'update', values
+        return self
+
+    def delete(self):
+        self.action = 'delete'
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        values = list(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def _matches(self, row):
+        return all(check(row) for check in self.filters)
+
+    def execute(self):
+        self.db.calls.append((self.table, self.action))
+        if self.db.fail:
+            raise RuntimeError("supabase unavailable")
+        rows = self.db.tables.setdefault(self.table, [])
+        payload = self.payload if isinstance(self.payload, list) else [self.payload]
+        if self.action == 'select':
+            return FakeResult([dict(row) for row in rows if self._matches(row)])
+        if self.action == 'insert':
+            rows.extend(dict(row) for row in payload)
+            return FakeResult(payload)
+        if self.action == 'upsert':
+            keys = self.on_conflict.split(',')
+            for new in payload:
+                existing = next((row for row in rows if all(row.get(k) == new.get(k) for k in keys)), None)
+                if existing is None:
+                    rows.append(dict(new))
+                else:
+                    existing.update(new)
+            return FakeResult(payload)
+        if self.action == 'update':
+            for row in rows:
+                if self._matches(row):
+                    row.update(self.payload)
+            return FakeResult([])
+        kept = [row for row in rows if not self._matches(row)]
+        removed = len(rows) - len(kept)
+        rows[:] = kept
+        return FakeResult([{}] * removed)
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables = {}
+        self.calls = []
+        self.fail = False
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+@pytest.fixture
+def fake_supabase():
+    """In-memory Supabase client: tables are lists of row dicts"""
+    return FakeSupabase()
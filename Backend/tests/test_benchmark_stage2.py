@@ -0,0 +1,11 @@
+from scripts.benchmark_stage2 import rotated
+
+
+def test_every_mode_takes_every_position_over_a_full_rotation():
+    modes = ['monolithic', 'stream', 'parallel']
+    orders = [rotated(modes, run) for run in range(3)]
+
+    assert orders[0] == modes
+    for position in range(len(modes)):
+        assert sorted(order[position] for order in orders) == sorted(modes)
+    assert rotated(modes, 3) == modes
@@ -0,0 +1,114 @@
+import pytest
+
+from src.utils.context_cache import ContextCacheRegistry, StubContextCacheProvider
+from src.utils.llm_telemetry import llm_tags
+
+pytestmark = pytest.mark.usefixtures('word_tokenizer')
+
+LONG_PROMPT = "You judge whether reddit posts are leads for a product. " * 200
+
+
+class FailingProvider(StubContextCacheProvider):
+    def create(self, model, system_prompt, ttl_seconds):
+        self.created += 1
+        raise RuntimeError("quota exceeded")
+
+
+def test_reuses_handle_for_same_prompt():
+    provider = StubContextCacheProvider()
+    registry = ContextCacheRegistry(provider, min_tokens=10)
+
+    first = registry.get_or_create("gemini-2.5-flash", LONG_PROMPT)
+    second = registry.get_or_create("gemini-2.5-flash", LONG_PROMPT)
+
+    assert first is not None and first == second
+    assert provider.created == 1
+    stats = registry.stats()
+    assert stats["created"] == 1 and stats["reused"] == 1 and stats["saved_tokens"] > 0
+
+
+def test_small_prompt_goes_uncached():
+    provider = StubContextCacheProvider()
+    registry = ContextCacheRegistry(provider, min_tokens=1024)
+
+    assert registry.get_or_create("gemini-2.5-flash", "Short prompt") is None
+    assert registry.get_or_create("gemini-2.5-flash", "Short prompt") is None
+    assert provider.created == 0
+    assert registry.stats()["skipped_small"] == 2
+
+
+def test_failed_creation_is_not_retried_right_away():
+    provider = FailingProvider()
+    registry = ContextCacheRegistry(provider, min_tokens=10)
+
+    assert registry.get_or_create("gemini-2.5-flash", LONG_PROMPT) is None
+    assert registry.get_or_create("gemini-2.5-flash", LONG_PROMPT) is None
+    assert provider.created == 1
+    stats = registry.stats()
+    assert stats["failures"] == 1 and stats["skipped_failed"] == 1
+
+
+def test_invalidate_product_deletes_its_handles():
+    provider = StubContextCacheProvider()
+    registry = ContextCacheRegistry(provider, min_tokens=10)
+    with llm_tags(product_id="p1"):
+        name = registry.get_or_create("gemini-2.5-flash", LONG_PROMPT)
+    other = registry.get_or_create("gemini-2.5-flash", LONG_PROMPT + " Other product.")
+
+    registry.invalidate_product("p1")
+
+    assert name not in provider.contents and other in provider.contents
+    assert registry.get_or_create("gemini-2.5-flash", LONG_PROMPT) != name
+
+
+def test_discarded_handle_is_recreated():
+    provider = StubContextCacheProvider()
+    registry = ContextCacheRegistry(provider, min_tokens=10)
+    name = registry.get_or_create("gemini-2.5-flash", LONG_PROMPT)
+
+    registry.discard(name)
+
+    assert registry.get_or_create("gemini-2.5-flash", LONG_PROMPT) != name
+    assert provider.created == 2
+
+
+def test_reported_cached_tokens_are_counted_per_provider():
+    registry = ContextCacheRegistry(None)
+    registry.record_usage("gemini", {'input_tokens': 900, 'output_tokens': 50, 'cached_tokens': 512})
+    registry.record_usage("groq", {'input_tokens': 1400, 'output_tokens': 20, 'cached_tokens': 1024})
+    registry.record_usage("groq", None)
+    assert registry.stats()["provider_cached_tokens"] == {"gemini": 512, "groq": 1024}
+
+
+class CharTokenizer:
+    """Roughly four characters per token, as for English text in cl100k_base"""
+
+    def encode(self, text):
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+
+PRODUCT = {
+    'name': 'PostPilot',
+    'description': 'Schedules reddit posts and tracks replies',
+    'target_audience': 'indie founders',
+    'problem_solved': 'finding customers on reddit',
+}
+
+
+def test_lead_finding_system_prompt_is_cached(monkeypatch):
+    from src.utils import cost_calculator
+    from src.utils.context_cache import CONTEXT_CACHE_MIN_TOKENS
+    from src.utils.prompt_generator import lead_generation_prompt
+
+    monkeypatch.setattr(cost_calculator, '_tokenizer', CharTokenizer())
+    provider = StubContextCacheProvider()
+    registry = ContextCacheRegistry(provider, min_tokens=CONTEXT_CACHE_MIN_TOKENS)
+    small_batch = [{'post_id': 0, 'title': 'Any tool for this?', 'score': 3, 'total_comments': 1, 'content': 'Help'}]
+    large_batch = small_batch * 12
+
+    system_prompts = {lead_generation_prompt(PRODUCT, batch)[0]['content'] for batch in (small_batch, large_batch)}
+
+    # Batches of any size share one system prompt, and it is big enough for an explicit cache
+    assert len(system_prompts) == 1
+    assert registry.get_or_create("gemini-2.5-flash", system_prompts.pop()) is not None
+    assert provider.created == 1
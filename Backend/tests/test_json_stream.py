@@ -0,0 +1,42 @@
+import json
+
+from src.utils.json_stream import JsonArrayItemParser
+
+DOCUMENT = json.dumps({
+    "comments": [
+        {"post_id": 0, "comment": "Try a {braced} reply"},
+        {"post_id": 1, "comment": "Quote \" and ] inside"},
+        {"post_id": 2, "comment": "Nested", "meta": {"tags": ["a", "b"]}},
+    ],
+    "other": [{"post_id": 9}],
+})
+
+
+def feed_in_chunks(parser, text, size):
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(parser.feed(text[start:start + size]))
+    return items
+
+
+def test_items_are_emitted_as_they_close():
+    parser = JsonArrayItemParser('comments')
+    first_item_end = DOCUMENT.index('reply"}') + len('reply"}')
+
+    assert parser.feed(DOCUMENT[:first_item_end - 1]) == []
+    assert parser.feed(DOCUMENT[first_item_end - 1:first_item_end]) == [{"post_id": 0, "comment": "Try a {braced} reply"}]
+
+
+def test_chunk_boundaries_dont_matter():
+    expected = json.loads(DOCUMENT)["comments"]
+    for size in (1, 3, 7, len(DOCUMENT)):
+        parser = JsonArrayItemParser('comments')
+        assert feed_in_chunks(parser, DOCUMENT, size) == expected
+        assert parser.emitted == len(expected)
+        assert parser.text == DOCUMENT
+
+
+def test_other_keys_are_ignored():
+    parser = JsonArrayItemParser('posts')
+    assert feed_in_chunks(parser, DOCUMENT, 5) == []
+    assert parser.emitted == 0
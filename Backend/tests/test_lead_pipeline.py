@@ -0,0 +1,329 @@
+import re
+import threading
+
+import pytest
+
+from src.utils import lead_pipeline
+from src.utils.llm_schemas import LeadComment, LeadComments, PostSelection, StructuredOutputError
+from src.utils.retry_policy import LLMUnavailableError
+
+PRODUCT = {
+    'id': 'product-1',
+    'name': 'PostPilot',
+    'description': 'Schedules reddit posts and tracks replies',
+    'target_audience': 'indie founders',
+    'problem_solved': 'finding customers on reddit',
+}
+
+MESSAGES = [{'role': 'user', 'content': 'write comments'}]
+
+_HEADER_RE = re.compile(r"^\[id=(\d+) [^\]]*\] (.*)$", re.MULTILINE)
+
+
+class WordCounter:
+    def count_tokens(self, text):
+        return len(text.split())
+
+
+class FakeModel:
+    """
+    Classifier stand-in: selects the posts of a batch whose title contains
+    'lead', read back from the compact encoding of the prompt.
+    """
+
+    def __init__(self, fail_titles=(), on_call=None):
+        self.cost_calculator = WordCounter()
+        self.fail_titles = fail_titles
+        self.on_call = on_call
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def structured_completion(self, messages, schema, deadline=None, cache_ttl=None, classification=False):
+        if self.on_call is not None:
+            self.on_call()
+        posts = [(int(post_id), title) for post_id, title in _HEADER_RE.findall(messages[-1]['content'])]
+        with self._lock:
+            self.batches.append([title for _, title in posts])
+        if any(title in self.fail_titles for _, title in posts):
+            raise LLMUnavailableError("groq", "gave up")
+        return PostSelection(tuple(post_id for post_id, title in posts if 'lead' in title))
+
+
+def listed(subreddit, *titles):
+    return [
+        {
+            'title': title, 'score': 1, 'comments': 0, 'num_comments': 0, 'selftext': 'No text',
+            'url': f"https://www.reddit.com/r/{subreddit}/comments/{subreddit}{n}/",
+            'reddit_post_id': f"{subreddit}-{n}", 'subreddit': subreddit, 'created_utc': 1000 - n,
+        }
+        for n, title in enumerate(titles)
+    ]
+
+
+@pytest.fixture(autouse=True)
+def local_filters_off(monkeypatch, word_tokenizer):
+    # Each test opts in to the prefilters and the near-duplicate index it exercises
+    monkeypatch.setattr(lead_pipeline, 'LEXICAL_PREFILTER', False)
+    monkeypatch.setattr(lead_pipeline, 'SEMANTIC_PREFILTER', False)
+    monkeypatch.setattr(lead_pipeline, 'NEAR_DUPLICATE_FILTER', False)
+
+
+def test_posts_get_global_indexes_in_arrival_order():
+    stream = [listed('a', 'lead one', 'meme'), listed('b', 'question', 'lead two')]
+
+    unformatted, posts, selected, judged = lead_pipeline.select_lead_posts(PRODUCT, FakeModel(), stream, batch_size=3)
+
+    assert [post['title'] for post in unformatted] == ['lead one', 'meme', 'question', 'lead two']
+    assert [post['post_id'] for post in posts] == [0, 1, 2, 3]
+    assert selected == [0, 3]
+    assert judged == [0, 1, 2, 3]
+
+
+def test_batches_start_while_subreddits_are_still_loading():
+    first_batch_sent = threading.Event()
+    model = FakeModel(on_call=first_batch_sent.set)
+    waited = []
+
+    def stream():
+        yield listed('a', 'lead one', 'lead two')
+        # Only yields the next subreddit once the first batch is with the classifier
+        waited.append(first_batch_sent.wait(timeout=2))
+        yield listed('b', 'lead three')
+
+    _, _, selected, _ = lead_pipeline.select_lead_posts(PRODUCT, model, stream(), batch_size=2)
+
+    assert waited == [True]
+    assert selected == [0, 1, 2]
+
+
+def test_batches_are_packed_by_post_count_and_token_budget():
+    model = FakeModel()
+    long_title = 'long ' * 40
+    stream = [listed('a', 'one', 'two', 'three', long_title, 'four')]
+
+    lead_pipeline.select_lead_posts(PRODUCT, model, stream, batch_size=3, token_budget=30, max_workers=1)
+
+    # A post over the budget goes out on its own
+    assert sorted(model.batches, key=len) == sorted([['one', 'two', 'three'], [long_title.strip()], ['four']], key=len)
+
+
+def test_failed_batch_is_left_unjudged():
+    model = FakeModel(fail_titles={'lead broken'})
+    stream = [listed('a', 'lead ok', 'other'), listed('b', 'lead broken')]
+
+    _, _, selected, judged = lead_pipeline.select_lead_posts(PRODUCT, model, stream, batch_size=2)
+
+    assert selected == [0]
+    assert judged == [0, 1]
+
+
+class KnownVerdicts:
+    def __init__(self, known):
+        self.known = known
+        self.recorded = {}
+
+    def lookup(self, reddit_post_ids):
+        return {pid: self.known[pid] for pid in reddit_post_ids if pid in self.known}
+
+    def record(self, verdicts):
+        self.recorded.update(verdicts)
+
+    def flush(self):
+        pass
+
+
+def test_known_verdicts_skip_the_classifier():
+    model = FakeModel()
+    verdicts = KnownVerdicts({'a-0': True, 'a-1': False})
+    stream = [listed('a', 'cached pick', 'cached reject', 'lead new', 'other new')]
+
+    _, _, selected, judged = lead_pipeline.select_lead_posts(PRODUCT, model, stream, verdicts=verdicts)
+
+    assert model.batches == [['lead new', 'other new']]
+    assert selected == [0, 2]
+    assert judged == [0, 1, 2, 3]
+    assert verdicts.recorded == {'a-2': True, 'a-3': False}
+
+
+def test_posts_that_are_already_leads_are_not_selected_again():
+    model = FakeModel()
+    verdicts = KnownVerdicts({'a-0': True})
+    stream = [listed('a', 'cached pick', 'lead already saved', 'lead new')]
+
+    _, _, selected, judged = lead_pipeline.select_lead_posts(
+        PRODUCT, model, stream, verdicts=verdicts, existing_leads={'a-0', 'a-1'}
+    )
+
+    assert model.batches == [['lead new']]
+    assert selected == [2]
+    assert judged == [0, 1, 2]
+
+
+@pytest.mark.parametrize("post_tokens, batches", [
+    ([], 0),
+    ([5, 5, 5], 1),
+    ([5, 5, 5, 5], 2),
+    ([20, 20], 2),
+    ([5, 100, 5], 3),
+])
+def test_batch_counter_packs_like_the_pipeline(post_tokens, batches):
+    # At most 3 posts and 30 tokens per batch; an oversized post goes alone
+    counter = lead_pipeline._BatchCounter(batch_size=3, token_budget=30)
+    for tokens in post_tokens:
+        counter.add(tokens)
+    assert counter.total() == batches
+
+
+def test_post_payload_is_counted_in_the_prompt_encoding():
+    post = {'post_id': 0, 'title': 'need a lead', 'content': 'three word body', 'score': 1, 'total_comments': 0}
+    assert lead_pipeline.post_payload_tokens(FakeModel(), post) == len(lead_pipeline.encode_posts_compact([post]).split())
+
+
+@pytest.mark.parametrize("batch_size, cap", [(1, 1), (3, 2), (10, 6), (20, 12)])
+def test_selection_cap_scales_with_the_batch(batch_size, cap):
+    posts = [{'post_id': n, 'title': f'post {n}', 'content': 'No text'} for n in range(batch_size)]
+    messages = lead_pipeline.lead_generation_prompt(PRODUCT, posts)
+    assert f"(select at most {cap})" in messages[-1]['content']
+
+
+def test_no_prefilter_runs_by_default(monkeypatch):
+    from src.utils import lexical_prefilter, semantic_prefilter
+    monkeypatch.setattr(lead_pipeline, 'LEXICAL_PREFILTER', lexical_prefilter.LEXICAL_PREFILTER)
+    monkeypatch.setattr(lead_pipeline, 'SEMANTIC_PREFILTER', semantic_prefilter.SEMANTIC_PREFILTER)
+    model = FakeModel()
+    titles = [f'unrelated post {n}' for n in range(8)]
+
+    lead_pipeline.select_lead_posts(PRODUCT, model, [listed('a', *titles)], batch_size=20)
+
+    assert model.batches == [titles]
+
+
+def test_prefiltered_posts_are_judged_without_reaching_the_classifier():
+    class KeepFirst:
+        name = 'keep-first'
+
+        def select(self, posts):
+            return [0]
+
+    model = FakeModel()
+    _, _, selected, judged = lead_pipeline.select_lead_posts(
+        PRODUCT, model, [listed('a', 'lead kept', 'lead dropped')], prefilter=KeepFirst()
+    )
+
+    assert model.batches == [['lead kept']]
+    assert selected == [0]
+    assert judged == [0, 1]
+
+
+def test_near_copies_are_judged_without_reaching_the_classifier():
+    from src.utils.near_duplicates import NearDuplicateIndex
+
+    model = FakeModel()
+    question = 'lead looking for a tool that schedules reddit posts and tracks replies across several subreddits'
+    stream = [listed('a', question, 'unrelated keyboard question'), listed('b', question + ' thanks')]
+
+    _, _, selected, judged = lead_pipeline.select_lead_posts(
+        PRODUCT, model, stream, duplicates=NearDuplicateIndex(threshold=0.7)
+    )
+
+    assert sorted(title for batch in model.batches for title in batch) == [question, 'unrelated keyboard question']
+    assert selected == [0]
+    assert judged == [0, 1, 2]
+
+
+class CommentModel:
+    """
+    Stage-2 stand-in: one comment per post of the prompt, plus one for a post
+    that wasn't sent. `failures` maps a post_id to errors raised, in turn, by
+    calls whose unit contains it.
+    """
+
+    def __init__(self, failures=None):
+        self.failures = {post_id: list(errors) for post_id, errors in (failures or {}).items()}
+        self.units = []
+        self._lock = threading.Lock()
+
+    def structured_completion(self, messages, schema, deadline=None, cache_ttl=None, classification=False):
+        post_ids = [int(post_id) for post_id, _ in _HEADER_RE.findall(messages[-1]['content'])]
+        with self._lock:
+            self.units.append(post_ids)
+            for post_id in post_ids:
+                if self.failures.get(post_id):
+                    raise self.failures[post_id].pop(0)
+        comments = [LeadComment(post_id, f"comment {post_id}") for post_id in post_ids + [99]]
+        return LeadComments(tuple(comments))
+
+
+def shortlisted(count):
+    return [{'post_id': n, 'title': f'post {n}', 'content': 'No text', 'score': 1, 'total_comments': 0, 'top_comments': []} for n in range(count)]
+
+
+def test_unit_keeps_only_its_own_posts():
+    assert lead_pipeline.generate_comments_unit(PRODUCT, CommentModel(), shortlisted(2)) == {0: 'comment 0', 1: 'comment 1'}
+
+
+def test_parallel_generation_fans_out_over_units():
+    model = CommentModel()
+    comments = dict(lead_pipeline.generate_comments_parallel(PRODUCT, model, shortlisted(5), posts_per_call=2, max_workers=2))
+
+    assert comments == {n: f"comment {n}" for n in range(5)}
+    assert sorted(model.units) == [[0, 1], [2, 3], [4]]
+
+
+def test_failed_unit_is_retried_on_its_own():
+    model = CommentModel(failures={2: [StructuredOutputError("lead_comments", "bad")]})
+    comments = dict(lead_pipeline.generate_comments_parallel(PRODUCT, model, shortlisted(4), posts_per_call=2, max_attempts=2))
+
+    assert sorted(comments) == [0, 1, 2, 3]
+    assert sorted(model.units) == [[0, 1], [2, 3], [2, 3]]
+
+
+def test_other_units_are_kept_when_one_gives_up():
+    unavailable = LLMUnavailableError("gemini", "gave up")
+    model = CommentModel(failures={0: [unavailable, unavailable]})
+    comments = dict(lead_pipeline.generate_comments_parallel(PRODUCT, model, shortlisted(4), posts_per_call=2, max_attempts=2))
+
+    assert sorted(comments) == [2, 3]
+
+
+def test_every_unit_unavailable_raises():
+    unavailable = LLMUnavailableError("gemini", "gave up")
+    model = CommentModel(failures={0: [unavailable], 1: [unavailable]})
+    with pytest.raises(LLMUnavailableError):
+        list(lead_pipeline.generate_comments_parallel(PRODUCT, model, shortlisted(2), posts_per_call=1, max_attempts=1))
+
+
+class StreamingModel:
+    """Streams `chunks` as the stage-2 answer; a non-streamed re-ask answers `reask`"""
+
+    def __init__(self, chunks, reask=None):
+        self.chunks = chunks
+        self.reask = reask
+        self.reask_messages = None
+
+    def gemini_chat_completion(self, messages, deadline=None, stream=False, schema=None):
+        return iter(self.chunks)
+
+    def structured_completion(self, messages, schema, deadline=None, cache_ttl=None, classification=False):
+        self.reask_messages = messages
+        return schema.decode(self.reask)
+
+
+def test_streamed_comments_are_yielded_once_and_only_for_sent_posts():
+    chunks = [
+        '{"comments": [{"post_id": 1, "comment": "one"}, {"post_id": 7, "comm',
+        'ent": "not sent"}, {"post_id": "x", "comment": "bad id"}, ',
+        '{"post_id": 1, "comment": "again"}, {"post_id": 2, "comment": "two"}]}',
+    ]
+    model = StreamingModel(chunks)
+
+    assert list(lead_pipeline.stream_generated_comments(model, MESSAGES, {1, 2})) == [(1, 'one'), (2, 'two')]
+    assert model.reask_messages is None
+
+
+def test_undecodable_stream_is_asked_again_with_the_error():
+    model = StreamingModel(['Sure! Here are', ' the comments'], reask='{"comments": [{"post_id": 2, "comment": "two"}]}')
+
+    assert list(lead_pipeline.stream_generated_comments(model, MESSAGES, {1, 2})) == [(2, 'two')]
+    assert model.reask_messages[:1] == MESSAGES
+    assert model.reask_messages[1] == {"role": "assistant", "content": 'Sure! Here are the comments'}
@@ -0,0 +1,74 @@
+from src.utils import lead_verdicts
+from src.utils.lead_verdicts import VerdictStore, invalidate_verdicts, product_revision
+
+PRODUCT = {
+    'id': 'product-1',
+    'name': 'PostPilot',
+    'description': 'Schedules reddit posts',
+    'target_audience': 'indie founders',
+    'problem_solved': 'finding customers',
+}
+
+
+def test_revision_changes_with_classification_fields_only():
+    assert product_revision(PRODUCT) == product_revision({**PRODUCT, 'created_at': 'later'})
+    assert product_revision(PRODUCT) != product_revision({**PRODUCT, 'target_audience': 'agencies'})
+
+
+def test_recorded_verdicts_are_upserted_on_flush(fake_supabase):
+    store = VerdictStore(fake_supabase, PRODUCT)
+    store.record({'a': True, 'b': False})
+    assert 'lead_verdicts' not in fake_supabase.tables
+
+    store.flush()
+    rows = fake_supabase.tables['lead_verdicts']
+    assert {(row['reddit_post_id'], row['selected']) for row in rows} == {('a', True), ('b', False)}
+    assert {row['product_revision'] for row in rows} == {product_revision(PRODUCT)}
+
+    # A second verdict for the same post replaces the first
+    store.record({'a': False})
+    store.flush()
+    assert len(fake_supabase.tables['lead_verdicts']) == 2
+    assert VerdictStore(fake_supabase, PRODUCT).lookup(['a']) == {'a': False}
+
+
+def test_flush_without_verdicts_writes_nothing(fake_supabase):
+    VerdictStore(fake_supabase, PRODUCT).flush()
+    assert fake_supabase.calls == []
+
+
+def test_lookup_returns_known_posts_of_the_current_revision(fake_supabase):
+    store = VerdictStore(fake_supabase, PRODUCT)
+    store.record({'a': True, 'b': False})
+    store.flush()
+
+    assert store.lookup(['a', 'b', 'c', None]) == {'a': True, 'b': False}
+    assert store.reused == 2
+    # Editing the product's audience starts from a clean slate
+    assert VerdictStore(fake_supabase, {**PRODUCT, 'target_audience': 'agencies'}).lookup(['a', 'b']) == {}
+
+
+def test_lookup_is_chunked(fake_supabase, monkeypatch):
+    monkeypatch.setattr(lead_verdicts, 'LOOKUP_CHUNK_SIZE', 2)
+    store = VerdictStore(fake_supabase, PRODUCT)
+    store.record({pid: True for pid in 'abcde'})
+    store.flush()
+    fake_supabase.calls.clear()
+
+    assert len(store.lookup(list('abcde'))) == 5
+    assert fake_supabase.calls == [('lead_verdicts', 'select')] * 3
+
+
+def test_lookup_failure_means_no_known_verdicts(fake_supabase):
+    fake_supabase.fail = True
+    assert VerdictStore(fake_supabase, PRODUCT).lookup(['a']) == {}
+
+
+def test_invalidate_forgets_only_that_product(fake_supabase):
+    for product in (PRODUCT, {**PRODUCT, 'id': 'product-2'}):
+        store = VerdictStore(fake_supabase, product)
+        store.record({'a': True})
+        store.flush()
+
+    invalidate_verdicts(fake_supabase, 'product-1')
+    assert [row['product_id'] for row in fake_supabase.tables['lead_verdicts']] == ['product-2']
@@ -0,0 +1,38 @@
+from src.utils.lexical_prefilter import LexicalPrefilter, tokenize
+
+PRODUCT = {
+    'name': 'PostPilot',
+    'description': 'Schedules reddit posts and tracks replies',
+    'target_audience': 'indie founders marketing on reddit',
+    'problem_solved': 'finding customers on reddit without spending hours',
+}
+
+
+def test_tokenize_drops_stopwords_and_folds_plurals():
+    assert tokenize("How do I find customers for my apps?") == ['find', 'customer', 'app']
+
+
+def test_relevant_posts_are_kept_in_input_order():
+    posts = [
+        {'title': 'Best sourdough recipe', 'selftext': 'My starter is flat'},
+        {'title': 'How do indie founders find customers on reddit?', 'selftext': 'Spending hours posting'},
+        {'title': 'Weekend hiking trip', 'selftext': 'Any trails near Denver'},
+        {'title': 'Tool to schedule reddit posts', 'selftext': 'and track replies'},
+    ]
+    prefilter = LexicalPrefilter(PRODUCT, keep_fraction=0.5, min_keep=1)
+    assert prefilter.select(posts) == [1, 3]
+
+
+def test_min_keep_applies_to_small_batches():
+    posts = [{'title': f'Unrelated post {i}', 'selftext': ''} for i in range(3)]
+    prefilter = LexicalPrefilter(PRODUCT, keep_fraction=0.1, min_keep=5)
+    assert prefilter.select(posts) == [0, 1, 2]
+    assert prefilter.select([]) == []
+
+
+def test_corpus_statistics_accumulate():
+    prefilter = LexicalPrefilter(PRODUCT)
+    prefilter.score([{'title': 'reddit', 'selftext': ''}])
+    prefilter.score([{'title': 'reddit customers', 'selftext': ''}])
+    assert prefilter.doc_count == 2
+    assert prefilter.doc_freq[prefilter.term_index['reddit']] == 2
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from src.utils.listing_cache import ListingCache
+
+
+def listing(limit):
+    return {"limit": limit, "posts": list(range(limit))}
+
+
+def get_listing(cache, limit, fetches):
+    # How reddit_helpers.get_subreddit_listing reads the cache
+    def fetch():
+        fetches.append(limit)
+        return listing(limit)
+    entry = cache.get_or_fetch("r/test", fetch, accept=lambda cached: cached["limit"] >= limit)
+    return entry["posts"][:limit]
+
+
+def test_larger_cached_listing_serves_smaller_limit():
+    cache, fetches = ListingCache(), []
+    assert get_listing(cache, 25, fetches) == list(range(25))
+    assert get_listing(cache, 10, fetches) == list(range(10))
+    assert fetches == [25]
+
+
+def test_smaller_cached_listing_is_refetched():
+    cache, fetches = ListingCache(), []
+    get_listing(cache, 10, fetches)
+    assert get_listing(cache, 25, fetches) == list(range(25))
+    assert fetches == [10, 25]
+    assert cache.stats()["hits"] == 0
+
+
+def test_stale_entry_is_refetched():
+    cache, fetches = ListingCache(ttl_seconds=0), []
+    get_listing(cache, 10, fetches)
+    get_listing(cache, 10, fetches)
+    assert fetches == [10, 10]
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = ListingCache()
+    calls = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait(1)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch("key", fetch))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["value"] * 4
+    assert len(calls) == 1
+
+
+def test_fetch_error_is_not_cached():
+    cache = ListingCache()
+
+    def broken():
+        raise RuntimeError("reddit down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_fetch("key", broken)
+    assert cache.get_or_fetch("key", lambda: "value") == "value"
+
+
+def test_lru_eviction():
+    cache = ListingCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get_or_fetch("a", lambda: None)
+    cache.set("c", 3)
+    assert cache.get_or_fetch("b", lambda: "refetched") == "refetched"
+    assert cache.stats()["evictions"] >= 1
@@ -0,0 +1,71 @@
+from src.utils.llm_cache import LLMResponseCache, make_cache_key
+
+
+def test_cache_key_ignores_prompt_indentation_and_trailing_whitespace():
+    first = make_cache_key("m", [{"role": "user", "content": "  Line one  \n    Line two\n"}])
+    second = make_cache_key("m", [{"role": "user", "content": "Line one\nLine two"}])
+    assert first == second
+
+
+def test_cache_key_depends_on_model_config_and_content():
+    messages = [{"role": "user", "content": "hi"}]
+    key = make_cache_key("m", messages, {"temperature": 0})
+    assert key != make_cache_key("other", messages, {"temperature": 0})
+    assert key != make_cache_key("m", messages, {"temperature": 1})
+    assert key != make_cache_key("m", [{"role": "user", "content": "hello"}], {"temperature": 0})
+
+
+def test_memory_hit(tmp_path):
+    cache = LLMResponseCache(path=str(tmp_path / "cache.sqlite3"))
+    assert cache.get("k") is None
+    cache.set("k", "answer")
+    assert cache.get("k") == "answer"
+    assert cache.stats()["memory_hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    LLMResponseCache(path=path).set("k", "answer")
+
+    restarted = LLMResponseCache(path=path)
+    assert restarted.get("k") == "answer"
+    assert restarted.get("k") == "answer"
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.stats()["memory_hits"] == 1
+
+
+def test_expired_entries_are_misses(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite3")
+    clock = [1000.0]
+    monkeypatch.setattr('src.utils.llm_cache.time.time', lambda: clock[0])
+    cache = LLMResponseCache(path=path)
+    cache.set("k", "answer", ttl=60)
+
+    clock[0] += 61
+    assert cache.get("k") is None
+    assert LLMResponseCache(path=path).get("k") is None
+
+
+def test_memory_tier_is_lru_bounded(tmp_path):
+    cache = LLMResponseCache(path=str(tmp_path / "cache.sqlite3"), memory_entries=2)
+    for key in ("a", "b", "c"):
+        cache.set(key, key.upper())
+    assert cache.stats()["memory_entries"] == 2
+    # The evicted entry is still served from disk
+    assert cache.get("a") == "A"
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_disk_tier_keeps_the_newest_entries(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite3")
+    clock = [1000.0]
+    monkeypatch.setattr('src.utils.llm_cache.time.time', lambda: clock[0])
+    cache = LLMResponseCache(path=path, disk_entries=2)
+    for key in ("a", "b", "c"):
+        clock[0] += 1
+        cache.set(key, key.upper())
+
+    restarted = LLMResponseCache(path=path)
+    assert restarted.get("a") is None
+    assert restarted.get("c") == "C"
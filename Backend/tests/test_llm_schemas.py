@@ -0,0 +1,53 @@
+import pytest
+
+from src.utils.llm_schemas import (
+    LEAD_COMMENTS, POST_SELECTION, PRODUCT_DETAILS, SUBREDDIT_SUGGESTIONS,
+    LeadComment, StructuredOutputError, correction_messages,
+)
+
+
+def test_post_selection_decodes_into_its_record():
+    assert POST_SELECTION.decode('{"selected_post_ids": [0, "3"]}').selected_post_ids == (0, 3)
+
+
+@pytest.mark.parametrize("answer", [
+    'not json',
+    '[]',
+    '{"selected": [1]}',
+    '{"selected_post_ids": [-1]}',
+    '{"selected_post_ids": [true]}',
+    '{"selected_post_ids": ["three"]}',
+    '{"selected_post_ids": 1}',
+])
+def test_post_selection_rejects_off_schema_answers(answer):
+    with pytest.raises(StructuredOutputError) as raised:
+        POST_SELECTION.decode(answer)
+    assert raised.value.schema_name == 'post_selection'
+
+
+def test_lead_comments_decode():
+    answer = LEAD_COMMENTS.decode('{"comments": [{"post_id": 2, "comment": "Try this"}]}')
+    assert answer.comments == (LeadComment(2, "Try this"),)
+    with pytest.raises(StructuredOutputError):
+        LEAD_COMMENTS.decode('{"comments": [{"post_id": 2, "comment": 5}]}')
+
+
+def test_other_schemas_check_their_fields():
+    assert SUBREDDIT_SUGGESTIONS.decode('{"subreddits": ["freelance"]}').subreddits == ("freelance",)
+    with pytest.raises(StructuredOutputError):
+        PRODUCT_DETAILS.decode('{"target_audience": "a", "description": "b"}')
+
+
+def test_provider_formats():
+    assert POST_SELECTION.groq_response_format()['json_schema']['strict'] is True
+    assert 'additionalProperties' not in str(POST_SELECTION.gemini_schema)
+    assert POST_SELECTION.cache_config() != LEAD_COMMENTS.cache_config()
+
+
+def test_correction_messages_append_the_rejected_answer():
+    messages = [{"role": "user", "content": "pick posts"}]
+    corrected = correction_messages(messages, "oops", StructuredOutputError("post_selection", "invalid JSON"))
+    assert corrected[:1] == messages
+    assert corrected[1] == {"role": "assistant", "content": "oops"}
+    assert "post_selection: invalid JSON" in corrected[2]['content']
+    assert messages == [{"role": "user", "content": "pick posts"}]
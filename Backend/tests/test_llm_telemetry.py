@@ -0,0 +1,113 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.utils import llm_telemetry as telemetry_module
+from src.utils.llm_telemetry import LLMTelemetry, llm_tags, submit_in_context, usage_from_openai
+
+pytestmark = pytest.mark.usefixtures('word_tokenizer')
+
+USAGE = {'input_tokens': 1_000_000, 'output_tokens': 0, 'cached_tokens': 0}
+
+
+@pytest.fixture
+def telemetry(monkeypatch, fake_supabase):
+    telemetry = LLMTelemetry(batch_size=2, max_buffer=3, persist=True)
+    # Flushed by hand instead of from the background thread
+    monkeypatch.setattr(telemetry, '_ensure_flusher', lambda: None)
+    monkeypatch.setattr(telemetry, '_client', lambda: fake_supabase)
+    return telemetry
+
+
+def stage(stats, name):
+    return next(bucket for bucket in stats['by_stage'] if bucket['stage'] == name)
+
+
+def test_calls_are_aggregated_per_stage_and_user(telemetry):
+    with llm_tags(stage='classification', user_id='u1'):
+        telemetry.record('groq', 'openai/gpt-oss-20b', latency=0.2, usage=USAGE)
+        telemetry.record('groq', 'openai/gpt-oss-20b', latency=0.4, attempts=3, success=False, error='gave up')
+    with llm_tags(stage='comment_generation', user_id='u1'):
+        telemetry.record('gemini', 'gemini-2.5-flash', latency=1.0, usage=USAGE)
+
+    stats = telemetry.stats()
+    classification = stage(stats, 'classification')
+    assert classification['calls'] == 2
+    assert classification['failures'] == 1
+    assert classification['attempts'] == 4
+    assert classification['latency_ms_avg'] == 300.0
+    assert classification['latency_ms_max'] == 400.0
+    assert classification['cost_usd'] == pytest.approx(0.075)
+    assert stats['by_stage'][0]['stage'] == 'comment_generation'
+    assert [(user['user_id'], user['calls']) for user in stats['by_user']] == [('u1', 3)]
+    assert stats['total_cost_usd'] == pytest.approx(0.375)
+
+
+def test_cached_responses_cost_nothing(telemetry):
+    with llm_tags(stage='classification'):
+        telemetry.record('groq', 'openai/gpt-oss-20b', latency=0.0, usage=USAGE, from_cache=True)
+    bucket = stage(telemetry.stats(), 'classification')
+    assert bucket['cache_hits'] == 1
+    assert bucket['cost_usd'] == 0.0
+
+
+def test_provider_cached_tokens_are_priced_as_savings(telemetry):
+    with llm_tags(stage='classification'):
+        telemetry.record('gemini', 'gemini-2.5-flash', latency=0.1, usage={**USAGE, 'cached_tokens': 1_000_000})
+    bucket = stage(telemetry.stats(), 'classification')
+    assert bucket['cost_usd'] == pytest.approx(0.075)
+    assert bucket['cache_savings_usd'] == pytest.approx(0.225)
+
+
+def test_unpriced_models_are_counted_without_cost(telemetry):
+    with llm_tags(stage='other'):
+        telemetry.record('groq', 'some-new-model', latency=0.1, usage=USAGE)
+    assert stage(telemetry.stats(), 'other')['cost_usd'] == 0.0
+
+
+def test_tags_follow_work_onto_executor_threads(telemetry):
+    with llm_tags(stage='classification', product_id='p1'), ThreadPoolExecutor(max_workers=1) as executor:
+        submit_in_context(executor, telemetry.record, 'groq', 'openai/gpt-oss-20b', 0.1).result()
+    assert telemetry.stats()['by_stage'][0]['stage'] == 'classification'
+
+
+def test_flush_writes_rows_in_batches(telemetry, fake_supabase):
+    with llm_tags(stage='classification', product_id='p1'):
+        for _ in range(3):
+            telemetry.record('groq', 'openai/gpt-oss-20b', latency=0.1, usage=USAGE)
+
+    assert telemetry.flush() == 3
+    rows = fake_supabase.tables[telemetry_module.USAGE_TABLE]
+    assert [row['product_id'] for row in rows] == ['p1'] * 3
+    assert fake_supabase.calls == [(telemetry_module.USAGE_TABLE, 'insert')] * 2
+    assert telemetry.stats()['flushed_rows'] == 3
+
+
+def test_failed_flush_keeps_rows_and_drops_the_oldest_past_the_cap(telemetry, fake_supabase):
+    fake_supabase.fail = True
+    for n in range(2):
+        telemetry.record('groq', 'openai/gpt-oss-20b', latency=n)
+    assert telemetry.flush() == 0
+    assert telemetry.stats()['buffered_rows'] == 2
+
+    for n in range(2, 4):
+        telemetry.record('groq', 'openai/gpt-oss-20b', latency=n)
+    assert telemetry.stats()['buffered_rows'] == 3
+    assert telemetry.stats()['dropped_rows'] == 1
+
+    fake_supabase.fail = False
+    assert telemetry.flush() == 3
+    assert [row['latency_ms'] for row in fake_supabase.tables[telemetry_module.USAGE_TABLE]] == [1000.0, 2000.0, 3000.0]
+
+
+def test_nothing_is_buffered_without_persistence():
+    telemetry = LLMTelemetry(persist=False)
+    telemetry.record('groq', 'openai/gpt-oss-20b', latency=0.1)
+    assert telemetry.stats()['buffered_rows'] == 0
+
+
+def test_usage_from_openai_reads_cached_tokens():
+    details = type('Details', (), {'cached_tokens': 30})()
+    usage = type('Usage', (), {'prompt_tokens': 100, 'completion_tokens': 20, 'prompt_tokens_details': details})()
+    response = type('Response', (), {'usage': usage})()
+    assert usage_from_openai(response) == {'input_tokens': 100, 'output_tokens': 20, 'cached_tokens': 30}
@@ -0,0 +1,158 @@
+import threading
+import time
+
+import pytest
+
+from src.utils import models
+from src.utils.models import LatencyTracker, ProviderRoute
+from src.utils.llm_schemas import POST_SELECTION, StructuredOutputError
+from src.utils.retry_policy import CircuitBreaker, LLMUnavailableError
+
+MESSAGES = [{"role": "user", "content": "classify"}]
+
+
+@pytest.fixture
+def model(monkeypatch, word_tokenizer):
+    monkeypatch.setattr(models, 'GEMINI_API_KEY', 'test-key')
+    monkeypatch.setattr(models, 'GROQ_API_KEY', 'test-key')
+    monkeypatch.setattr(models, 'LLM_HEDGING', True)
+    monkeypatch.setattr(models, 'HEDGE_MIN_DELAY_SECONDS', 0.05)
+    return models.Model()
+
+
+def route(name, answer=None, error=None, delay=0.0, warm_latency=None):
+    """A route answering `answer` after `delay` seconds, or raising `error`"""
+    calls = []
+    released = threading.Event()
+
+    def generate(messages, deadline, schema=None):
+        calls.append(messages)
+        if delay:
+            released.wait(delay)
+        if error is not None:
+            raise error
+        return answer
+
+    provider_route = ProviderRoute(name, CircuitBreaker(name), generate)
+    provider_route.latency = LatencyTracker(min_samples=1)
+    if warm_latency is not None:
+        provider_route.latency.observe(warm_latency)
+    provider_route.calls = calls
+    provider_route.release = released.set
+    return provider_route
+
+
+def test_primary_answer_is_used_without_touching_the_alternate(model):
+    primary, alternate = route("primary", '{"from": "primary"}'), route("alternate", '{"from": "alternate"}')
+    assert model._route(primary, alternate, MESSAGES) == '{"from": "primary"}'
+    assert alternate.calls == []
+    assert primary.latency.percentile(0.5) is not None
+
+
+def test_slow_primary_is_hedged_and_the_alternate_wins(model):
+    primary = route("primary", '{"from": "primary"}', delay=2.0, warm_latency=0.01)
+    alternate = route("alternate", '{"from": "alternate"}')
+
+    started = time.monotonic()
+    assert model._route(primary, alternate, MESSAGES) == '{"from": "alternate"}'
+    assert time.monotonic() - started < 1.0
+    primary.release()
+
+    snapshot = model.routing_snapshot()
+    assert snapshot['hedges'] == {"alternate": 1}
+    assert snapshot['hedge_wins'] == {"alternate": 1}
+    assert snapshot['failovers'] == {}
+
+
+def test_no_hedge_until_the_primary_has_latency_samples(model):
+    primary = route("primary", '{"from": "primary"}', delay=0.2)
+    alternate = route("alternate", '{"from": "alternate"}')
+    assert model._route(primary, alternate, MESSAGES) == '{"from": "primary"}'
+    assert alternate.calls == []
+
+
+def test_failed_primary_fails_over(model):
+    primary = route("primary", error=LLMUnavailableError("primary", "gave up"))
+    alternate = route("alternate", '{"from": "alternate"}')
+    assert model._route(primary, alternate, MESSAGES) == '{"from": "alternate"}'
+    assert model.routing_snapshot()['failovers'] == {"alternate": 1}
+
+
+def test_invalid_json_fails_over(model):
+    primary, alternate = route("primary", "not json"), route("alternate", '{"from": "alternate"}')
+    assert model._route(primary, alternate, MESSAGES) == '{"from": "alternate"}'
+
+
+def test_invalid_answers_from_both_routes_return_the_first(model):
+    primary, alternate = route("primary", "not json"), route("alternate", "also not json")
+    assert model._route(primary, alternate, MESSAGES) == "not json"
+
+
+def test_open_circuit_goes_straight_to_the_alternate(model):
+    primary, alternate = route("primary", '{"from": "primary"}'), route("alternate", '{"from": "alternate"}')
+    primary.breaker = CircuitBreaker("primary", failure_threshold=1, reset_timeout=60)
+    primary.breaker.record_failure()
+
+    assert model._route(primary, alternate, MESSAGES) == '{"from": "alternate"}'
+    assert primary.calls == []
+
+
+def test_both_routes_failing_raises(model):
+    primary = route("primary", error=LLMUnavailableError("primary", "gave up"))
+    alternate = route("alternate", error=LLMUnavailableError("alternate", "gave up"))
+    with pytest.raises(LLMUnavailableError) as raised:
+        model._route(primary, alternate, MESSAGES)
+    assert raised.value.provider == "alternate"
+
+
+def test_without_hedging_only_the_primary_runs(model, monkeypatch):
+    monkeypatch.setattr(models, 'LLM_HEDGING', False)
+    primary = route("primary", error=LLMUnavailableError("primary", "gave up"))
+    alternate = route("alternate", '{"from": "alternate"}')
+    with pytest.raises(LLMUnavailableError):
+        model._route(primary, alternate, MESSAGES)
+    assert alternate.calls == []
+
+
+def test_classification_runs_on_groq_backed_by_gemini(model):
+    model.routes['groq_classification'] = route("groq", error=LLMUnavailableError("groq", "gave up"))
+    model.routes['gemini'] = route("gemini", '{"selected_post_ids": [1]}')
+    assert model.gemini_lead_checking(MESSAGES) == '{"selected_post_ids": [1]}'
+
+
+def test_open_gemini_circuit_streams_one_answer_from_the_alternate(model):
+    model.routes['gemini'].breaker = CircuitBreaker("gemini", failure_threshold=1, reset_timeout=60)
+    model.routes['gemini'].breaker.record_failure()
+    model.routes['groq_generation'] = route("groq", '{"comments": []}')
+    assert list(model.gemini_chat_completion(MESSAGES, stream=True)) == ['{"comments": []}']
+
+
+def answering(*answers):
+    """A route answering `answers` in turn, recording the messages of each call"""
+    answers = list(answers)
+    provider_route = route("scripted")
+    provider_route.generate = lambda messages, deadline, schema=None: provider_route.calls.append(messages) or answers.pop(0)
+    return provider_route
+
+
+def test_off_schema_answer_is_asked_again_with_the_error(model):
+    model.routes['groq_classification'] = answering('{"selected_post_ids": ["x"]}', '{"selected_post_ids": [2]}')
+
+    assert model.structured_completion(MESSAGES, POST_SELECTION, classification=True).selected_post_ids == (2,)
+
+    retry = model.routes['groq_classification'].calls[1]
+    assert retry[:1] == MESSAGES
+    assert retry[1] == {"role": "assistant", "content": '{"selected_post_ids": ["x"]}'}
+    assert model.routing_snapshot()['structured_output'] == {
+        'parse_failures': {'post_selection': 1}, 'recovered': {'post_selection': 1}
+    }
+
+
+def test_structured_output_error_after_the_last_attempt(model, monkeypatch):
+    monkeypatch.setattr(models, 'STRUCTURED_OUTPUT_ATTEMPTS', 2)
+    model.routes['groq_classification'] = answering('{"selected_post_ids": [-1]}', '{"selected_post_ids": [-2]}')
+    model.routes['gemini'] = answering('{}', '{}')
+
+    with pytest.raises(StructuredOutputError):
+        model.structured_completion(MESSAGES, POST_SELECTION, classification=True)
+    assert model.routing_snapshot()['structured_output']['parse_failures'] == {'post_selection': 2}
@@ -0,0 +1,45 @@
+from src.utils.near_duplicates import NearDuplicateIndex, minhash_signature, post_text
+
+POST = (
+    "Looking for a tool that schedules reddit posts and tracks replies across "
+    "several subreddits, ideally with a free tier for small teams"
+)
+
+
+def test_identical_text_has_identical_signature():
+    assert (minhash_signature(POST) == minhash_signature(POST.upper())).all()
+    assert minhash_signature("") is None
+
+
+def test_near_copy_is_reported():
+    index = NearDuplicateIndex(threshold=0.7)
+    assert index.check_and_add("a", POST) is None
+    assert index.check_and_add("b", POST + " thanks") == "a"
+    # The copy isn't indexed itself
+    assert len(index) == 1
+
+
+def test_unrelated_post_is_kept():
+    index = NearDuplicateIndex(threshold=0.7)
+    index.check_and_add("a", POST)
+    assert index.check_and_add("b", "What is the best budget mechanical keyboard for programming at home") is None
+    assert len(index) == 2
+
+
+def test_same_post_id_is_not_its_own_duplicate():
+    index = NearDuplicateIndex()
+    index.check_and_add("a", POST)
+    assert index.check_and_add("a", POST) is None
+
+
+def test_oldest_entries_are_evicted():
+    index = NearDuplicateIndex(max_entries=2)
+    index.check_and_add("a", POST)
+    index.check_and_add("b", "A completely different question about gardening tomatoes in pots")
+    index.check_and_add("c", "Another unrelated thread about learning rust for embedded work")
+    index.check_and_add("d", "Which running shoes work well for flat feet on trails")
+    assert index.check_and_add("e", POST) is None
+
+
+def test_link_post_placeholder_is_ignored():
+    assert post_text({'title': 'Title', 'selftext': 'No text'}) == "Title "
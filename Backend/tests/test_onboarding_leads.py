@@ -0,0 +1,66 @@
+import contextvars
+import threading
+
+from src.routes import onboarding
+from src.utils.lead_writer import ProgressiveLeadWriter
+
+
+def unformatted(n):
+    return {
+        'title': f'post {n}', 'selftext': 'body', 'url': f'https://www.reddit.com/r/a/comments/{n}/',
+        'reddit_post_id': f'p{n}', 'score': 1, 'num_comments': 0, 'author': 'op', 'subreddit': 'a', 'date': 0,
+    }
+
+
+def start(fake_supabase, comment_stream, expected):
+    writer = ProgressiveLeadWriter(fake_supabase, 'user-1', 10, immediate=0, batch_size=10, existing_ids=set())
+    posts = [unformatted(n) for n in range(expected)]
+    thread = onboarding._start_background_leads(contextvars.copy_context(), writer, posts, comment_stream, expected)
+    return writer, thread
+
+
+def test_background_thread_saves_the_rest_and_is_forgotten(fake_supabase):
+    writer, thread = start(fake_supabase, iter([(0, 'c0'), (1, 'c1')]), expected=2)
+    thread.join(timeout=2)
+
+    assert writer.saved == 2
+    assert len(fake_supabase.tables['leads']) == 2
+    assert onboarding._join_background_leads(timeout=0) == 0
+
+
+def test_failed_stream_reports_the_lost_leads(fake_supabase, capsys):
+    def stream():
+        yield 0, 'c0'
+        raise RuntimeError("stream broke")
+
+    writer, thread = start(fake_supabase, stream(), expected=3)
+    thread.join(timeout=2)
+
+    assert writer.saved == 1
+    out = capsys.readouterr().out
+    assert "stopped early for user user-1: stream broke" in out
+    assert "2 never generated, 0 failed to save" in out
+
+
+def test_failed_insert_is_reported(fake_supabase, capsys):
+    fake_supabase.fail = True
+    writer, thread = start(fake_supabase, iter([(0, 'c0')]), expected=1)
+    thread.join(timeout=2)
+    assert "0 never generated, 1 failed to save" in capsys.readouterr().out
+
+
+def test_shutdown_waits_for_and_reports_unfinished_threads(fake_supabase, capsys):
+    release = threading.Event()
+
+    def stream():
+        yield 0, 'c0'
+        release.wait(timeout=5)
+        yield 1, 'c1'
+
+    writer, thread = start(fake_supabase, stream(), expected=2)
+    assert onboarding._join_background_leads(timeout=0.05) == 1
+    assert "before onboarding leads for user user-1 finished: 0 of 2 saved" in capsys.readouterr().out
+
+    release.set()
+    assert onboarding._join_background_leads(timeout=2) == 0
+    assert writer.saved == 2
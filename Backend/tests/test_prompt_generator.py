@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from src.utils import prompt_generator
+from src.utils.prompt_generator import encode_posts_compact, serialize_posts
+
+pytestmark = pytest.mark.usefixtures('word_tokenizer')
+
+POST = {
+    'post_id': 3,
+    'title': 'Looking   for a\nscheduler',
+    'content': 'I post to five subreddits every week',
+    'score': 12,
+    'total_comments': 4,
+    'top_comments': [{'comment': 'Try a spreadsheet', 'score': 7}],
+}
+
+
+def test_compact_block_layout():
+    assert encode_posts_compact([POST]) == (
+        "[id=3 s=12 c=4] Looking for a scheduler\n"
+        "body: I post to five subreddits every week\n"
+        "tc(7): Try a spreadsheet"
+    )
+
+
+def test_missing_text_is_omitted_and_posts_are_separated():
+    empty = {'post_id': 4, 'title': 'Meme', 'content': 'No text', 'score': 1, 'total_comments': 0}
+    assert encode_posts_compact([POST, empty]).endswith("\n\n[id=4 s=1 c=0] Meme")
+
+
+def test_content_and_comments_are_cut_to_token_budgets():
+    encoded = encode_posts_compact([POST], content_token_budget=3, comment_token_budget=1)
+    assert "body: I post to…" in encoded
+    assert "tc(7): Try…" in encoded
+
+
+def test_serialize_posts_compact_starts_with_the_legend():
+    serialized = serialize_posts([POST], compact=True)
+    assert serialized.startswith(prompt_generator.COMPACT_POSTS_LEGEND)
+    assert serialized.endswith(encode_posts_compact([POST]))
+
+
+def test_serialize_posts_json_keeps_the_char_limit():
+    long_post = {**POST, 'content': 'x' * 5000}
+    decoded = json.loads(serialize_posts([long_post], compact=False))
+    assert decoded[0]['content'] == 'x' * prompt_generator.POST_CONTENT_MAX_CHARS
+    assert decoded[0]['title'] == POST['title']
+
+
+def test_compact_encoding_is_smaller_than_json():
+    product = {'name': 'P', 'description': 'd', 'target_audience': 't', 'problem_solved': 'p'}
+    savings = prompt_generator.measure_post_encoding_savings(product, [POST] * 5)
+    assert savings['saved_tokens'] > 0
+    assert savings['compact_tokens'] + savings['saved_tokens'] == savings['json_tokens']
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from src.utils import prompt_templates as templates_module
+from src.utils.prompt_templates import PromptTemplateError, PromptTemplateRegistry, VERBATIM_TEMPLATES
+
+
+@pytest.fixture(autouse=True)
+def reload_on_every_get(monkeypatch):
+    monkeypatch.setattr(templates_module, 'RELOAD_CHECK_SECONDS', 0)
+
+
+def write(path, text, mtime):
+    path.write_text(text, encoding='utf-8')
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def config_dir(tmp_path):
+    write(tmp_path / 'greeting.txt', 'Hello {name}, reply as {{"ok": true}}', 1000)
+    write(tmp_path / 'example.txt', 'Answer: {"selected_post_ids": [0]}', 1000)
+    return tmp_path
+
+
+def test_format_template_renders_fields_and_escaped_braces(config_dir):
+    registry = PromptTemplateRegistry(str(config_dir), verbatim={'example'})
+    assert registry.render('greeting', name='Ann') == 'Hello Ann, reply as {"ok": true}'
+    assert registry.get('greeting').fields == ('name',)
+    assert registry.get('greeting').static_text == 'Hello , reply as {"ok": true}'
+
+
+def test_verbatim_template_is_sent_as_is(config_dir):
+    registry = PromptTemplateRegistry(str(config_dir), verbatim={'example'})
+    assert registry.text('example') == 'Answer: {"selected_post_ids": [0]}'
+    assert registry.render('example') == registry.text('example')
+
+
+def test_undeclared_template_with_literal_braces_fails_to_load(config_dir):
+    with pytest.raises(PromptTemplateError):
+        PromptTemplateRegistry(str(config_dir), verbatim=set())
+
+
+def test_unknown_template():
+    with pytest.raises(KeyError):
+        PromptTemplateRegistry(templates_module.CONFIG_DIR).get('missing')
+
+
+def test_changed_file_is_reloaded(config_dir):
+    registry = PromptTemplateRegistry(str(config_dir), verbatim={'example'})
+    write(config_dir / 'greeting.txt', 'Hi {name}', 2000)
+    assert registry.render('greeting', name='Ann') == 'Hi Ann'
+
+
+def test_bad_reload_raises_and_keeps_the_last_good_version(config_dir):
+    registry = PromptTemplateRegistry(str(config_dir), verbatim={'example'})
+    template = registry.get('greeting')
+    good = template.compiled
+
+    # A stray brace must not silently turn the template verbatim
+    write(config_dir / 'greeting.txt', 'Hi {name}, reply as {"ok": true}', 2000)
+    with pytest.raises(PromptTemplateError):
+        template.load()
+    assert template.compiled is good
+
+    # The registry logs the broken edit and keeps serving the last good version
+    assert registry.render('greeting', name='Ann') == 'Hello Ann, reply as {"ok": true}'
+
+    write(config_dir / 'greeting.txt', 'Hi {name}', 3000)
+    assert registry.render('greeting', name='Ann') == 'Hi Ann'
+
+
+def test_static_token_count_follows_reloads(config_dir, word_tokenizer):
+    registry = PromptTemplateRegistry(str(config_dir), verbatim={'example'})
+    assert registry.get('greeting').static_token_count == 6
+    write(config_dir / 'greeting.txt', 'Hi {name}', 2000)
+    assert registry.get('greeting').static_token_count == 1
+
+
+def test_shipped_templates_load():
+    registry = PromptTemplateRegistry(templates_module.CONFIG_DIR)
+    for name in VERBATIM_TEMPLATES:
+        assert registry.get(name).fields == ()
+    assert registry.get('lead_finding_prompt').fields == (
+        'description', 'examples', 'name', 'problem_solved', 'target_audience'
+    )
@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+from src.utils.reddit_client_pool import RedditClientPool
+
+
+class Client:
+    pass
+
+
+def test_clients_are_reused():
+    pool = RedditClientPool(Client, size=2)
+    with pool.client() as first:
+        pass
+    with pool.client() as second:
+        pass
+    assert first is second
+    assert pool.stats()["created"] == 1
+
+
+def test_nested_checkout_reuses_the_held_client():
+    pool = RedditClientPool(Client, size=1)
+    with pool.client() as outer:
+        with pool.client() as inner:
+            assert inner is outer
+    assert pool.stats()["checkouts"] == 1
+    assert pool.stats()["idle"] == 1
+
+
+def test_threads_never_share_a_client_and_wait_when_pool_is_full():
+    pool = RedditClientPool(Client, size=2)
+    in_use, overlaps, lock = set(), [], threading.Lock()
+
+    def work():
+        with pool.client() as client:
+            with lock:
+                overlaps.append(id(client) in in_use)
+                in_use.add(id(client))
+            time.sleep(0.02)
+            with lock:
+                in_use.discard(id(client))
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not any(overlaps)
+    stats = pool.stats()
+    assert stats["created"] == 2 and stats["checkouts"] == 6 and stats["waits"] > 0
+
+
+def test_failed_creation_frees_its_slot():
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("reddit auth failed")
+        return Client()
+
+    pool = RedditClientPool(factory, size=1)
+    with pytest.raises(RuntimeError):
+        with pool.client():
+            pass
+    with pool.client() as client:
+        assert isinstance(client, Client)
@@ -0,0 +1,145 @@
+import time
+
+from src.utils import reddit_helpers
+
+
+def listed_post(subreddit, n):
+    return {
+        'title': f"{subreddit} post {n}", 'score': 1, 'comments': 0, 'num_comments': 0,
+        'url': f"https://www.reddit.com/r/{subreddit}/comments/{subreddit}{n}/", 'selftext': 'No text',
+        'reddit_post_id': f"{subreddit}{n}", 'subreddit': subreddit, 'created_utc': 100 - n,
+    }
+
+
+def fake_listing(delays):
+    """_list_subreddit_metadata stand-in whose subreddits finish in the order their delays give"""
+    def list_subreddit(subreddit_name, limit_per_sub, cursor=None):
+        time.sleep(delays[subreddit_name])
+        if subreddit_name == 'broken':
+            raise RuntimeError("403")
+        return [listed_post(subreddit_name, n) for n in range(2)]
+    return list_subreddit
+
+
+def test_listing_order_follows_subreddit_order(monkeypatch):
+    # The first subreddit finishes last
+    monkeypatch.setattr(reddit_helpers, '_list_subreddit_metadata', fake_listing({'a': 0.15, 'b': 0.05, 'c': 0.0}))
+
+    for _ in range(3):
+        listed = [posts[0]['subreddit'] for posts in reddit_helpers.iter_new_posts_metadata(['a', 'b', 'c'], max_workers=3)]
+        assert listed == ['a', 'b', 'c']
+
+
+def test_list_new_posts_metadata_is_deterministic(monkeypatch):
+    monkeypatch.setattr(reddit_helpers, '_list_subreddit_metadata', fake_listing({'a': 0.1, 'b': 0.0}))
+
+    post_content, formatted_posts = reddit_helpers.list_new_posts_metadata(['a', 'b'], max_workers=2)
+
+    assert [post['reddit_post_id'] for post in post_content] == ['a0', 'a1', 'b0', 'b1']
+    assert [post['post_id'] for post in formatted_posts] == [0, 1, 2, 3]
+    assert formatted_posts[2]['title'] == "b post 0"
+
+
+def test_failed_subreddit_is_skipped(monkeypatch):
+    monkeypatch.setattr(reddit_helpers, '_list_subreddit_metadata', fake_listing({'a': 0.05, 'broken': 0.0, 'c': 0.0}))
+
+    listed = [posts[0]['subreddit'] for posts in reddit_helpers.iter_new_posts_metadata(['a', 'broken', 'c'])]
+
+    assert listed == ['a', 'c']
+
+
+def test_comment_hydration_skips_posts_without_comments(monkeypatch):
+    fetched = []
+
+    def fetch_top_comments(reddit_post_id, comments_per_post):
+        fetched.append(reddit_post_id)
+        return [{"comment": f"top comment of {reddit_post_id}", "score": 5}][:comments_per_post]
+
+    monkeypatch.setattr(reddit_helpers, '_fetch_top_comments', fetch_top_comments)
+
+    comments = reddit_helpers.fetch_comments_for_posts(
+        ['p1', 'p2', 'p1', 'p3'], comments_per_post=3, num_comments_by_id={'p1': 4, 'p2': 0}
+    )
+
+    # Duplicates are fetched once, and a post known to have no comments isn't fetched at all
+    assert sorted(fetched) == ['p1', 'p3']
+    assert comments == {
+        'p1': [{"comment": "top comment of p1", "score": 5}],
+        'p2': [],
+        'p3': [{"comment": "top comment of p3", "score": 5}],
+    }
+
+
+def test_comment_hydration_error_leaves_other_posts(monkeypatch):
+    def fetch_top_comments(reddit_post_id, comments_per_post):
+        if reddit_post_id == 'gone':
+            raise RuntimeError("404")
+        return [{"comment": "ok", "score": 1}]
+
+    monkeypatch.setattr(reddit_helpers, '_fetch_top_comments', fetch_top_comments)
+
+    comments = reddit_helpers.fetch_comments_for_posts(['gone', 'here'])
+
+    assert comments == {'gone': [], 'here': [{"comment": "ok", "score": 1}]}
+
+
+def reddit_listing(count):
+    """A newest-first 'new' listing of `count` posts, one minute apart"""
+    return [
+        {
+            'id': f"p{n}", 'title': f"post {n}", 'score': 1, 'num_comments': 0, 'created': 10_000 - n * 60,
+            'created_utc': 10_000 - n * 60, 'selftext': '', 'over_18': False, 'author': 'op',
+        }
+        for n in range(count)
+    ]
+
+
+def paged_listing(monkeypatch, posts):
+    limits = []
+
+    def get_subreddit_listing(subreddit_name, listing_type='new', limit=10):
+        limits.append(limit)
+        return posts[:limit]
+
+    monkeypatch.setattr(reddit_helpers, 'get_subreddit_listing', get_subreddit_listing)
+    return limits
+
+
+def test_listing_pages_until_the_cursor(monkeypatch):
+    posts = reddit_listing(150)
+    limits = paged_listing(monkeypatch, posts)
+    # 25 posts arrived since the last run
+    cursor = {'last_post_id': 'p25', 'last_created_utc': posts[25]['created_utc']}
+
+    listed = reddit_helpers._list_subreddit_metadata('SaaS', 10, cursor)
+
+    assert [post['reddit_post_id'] for post in listed] == [f"p{n}" for n in range(25)]
+    assert limits == [10, reddit_helpers.REDDIT_CURSOR_MAX_POSTS]
+
+
+def test_listing_stops_at_a_cursor_in_the_first_page(monkeypatch):
+    posts = reddit_listing(150)
+    limits = paged_listing(monkeypatch, posts)
+    cursor = {'last_post_id': 'p4', 'last_created_utc': posts[4]['created_utc']}
+
+    listed = reddit_helpers._list_subreddit_metadata('SaaS', 10, cursor)
+
+    assert len(listed) == 4
+    assert limits == [10]
+
+
+def test_listing_without_cursor_keeps_the_first_page(monkeypatch):
+    limits = paged_listing(monkeypatch, reddit_listing(150))
+
+    assert len(reddit_helpers._list_subreddit_metadata('SaaS', 10)) == 10
+    assert limits == [10]
+
+
+def test_listing_is_capped_when_the_cursor_is_far_behind(monkeypatch):
+    posts = reddit_listing(150)
+    paged_listing(monkeypatch, posts)
+    cursor = {'last_post_id': 'p140', 'last_created_utc': posts[140]['created_utc']}
+
+    listed = reddit_helpers._list_subreddit_metadata('SaaS', 10, cursor)
+
+    assert len(listed) == reddit_helpers.REDDIT_CURSOR_MAX_POSTS
@@ -0,0 +1,34 @@
+import time
+
+from src.utils.reddit_rate_limiter import RedditRateLimiter
+
+
+def test_burst_is_served_without_waiting():
+    limiter = RedditRateLimiter(requests_per_minute=60, burst=3)
+    waits = [limiter.acquire() for _ in range(3)]
+    assert max(waits) < 0.05
+    assert limiter.stats()["total_requests"] == 3
+
+
+def test_callers_wait_for_refill_once_bucket_is_empty():
+    limiter = RedditRateLimiter(requests_per_minute=600, burst=1)
+    limiter.acquire()
+    # 10 tokens per second: the next one arrives after ~0.1s
+    assert 0.05 < limiter.acquire() < 0.5
+
+
+def test_headers_set_the_refill_rate():
+    limiter = RedditRateLimiter(requests_per_minute=90, burst=10)
+    limiter.update({'x-ratelimit-remaining': '30', 'x-ratelimit-reset': '60'})
+    stats = limiter.stats()
+    assert stats["rate_per_second"] == 0.5
+    assert stats["last_ratelimit_remaining"] == 30.0
+
+
+def test_throttled_response_blocks_until_retry_after():
+    limiter = RedditRateLimiter(requests_per_minute=600, burst=5)
+    limiter.update({'retry-after': '0.2'}, status_code=429)
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.15
+    assert limiter.stats()["throttled_responses"] == 1
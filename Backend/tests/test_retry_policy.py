@@ -0,0 +1,173 @@
+import threading
+
+import pytest
+
+from src.utils.retry_policy import (
+    CircuitBreaker, CircuitOpenError, LLMUnavailableError, RetryPolicy, is_retryable
+)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class TransportError(Exception):
+    """Named like httpx's base transport error"""
+
+
+def failing(*errors, result="ok"):
+    errors = list(errors)
+    timeouts = []
+
+    def fn(timeout):
+        timeouts.append(timeout)
+        if errors:
+            raise errors.pop(0)
+        return result
+    fn.timeouts = timeouts
+    return fn
+
+
+@pytest.mark.parametrize("error, retryable", [
+    (StatusError(429), True),
+    (StatusError(408), True),
+    (StatusError(503), True),
+    (StatusError(400), False),
+    (StatusError(401), False),
+    (TransportError(), True),
+    (TimeoutError(), True),
+    (ConnectionResetError(), True),
+    (ValueError("bad schema"), False),
+])
+def test_is_retryable(error, retryable):
+    assert is_retryable(error) is retryable
+
+
+def test_retries_until_success():
+    policy = RetryPolicy(max_attempts=3, base_delay=0)
+    fn = failing(StatusError(503), TransportError())
+    attempts = []
+    assert policy.call("test", fn, on_attempt=attempts.append) == "ok"
+    assert attempts == [1, 2, 3]
+
+
+def test_non_retryable_error_stops_at_once():
+    policy = RetryPolicy(max_attempts=3, base_delay=0)
+    with pytest.raises(LLMUnavailableError) as raised:
+        policy.call("test", failing(StatusError(400)))
+    assert raised.value.attempts == 1
+
+
+def test_gives_up_after_max_attempts():
+    policy = RetryPolicy(max_attempts=2, base_delay=0)
+    with pytest.raises(LLMUnavailableError) as raised:
+        policy.call("test", failing(StatusError(500), StatusError(500), StatusError(500)))
+    assert raised.value.attempts == 2
+
+
+def test_attempts_get_the_remaining_deadline_as_timeout():
+    policy = RetryPolicy(max_attempts=2, base_delay=0)
+    fn = failing(StatusError(500))
+    policy.call("test", fn, deadline=5.0)
+    assert 4.5 < fn.timeouts[0] <= 5.0
+    assert fn.timeouts[1] <= fn.timeouts[0]
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    policy = RetryPolicy(max_attempts=1, base_delay=0)
+    for _ in range(2):
+        with pytest.raises(LLMUnavailableError):
+            policy.call("test", failing(StatusError(503)), breaker=breaker)
+
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        policy.call("test", failing(), breaker=breaker)
+
+
+def test_non_retryable_errors_dont_open_the_breaker():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+    policy = RetryPolicy(max_attempts=1, base_delay=0)
+    with pytest.raises(LLMUnavailableError):
+        policy.call("test", failing(StatusError(400)), breaker=breaker)
+    assert breaker.state == 'closed'
+
+
+def test_half_open_trial_closes_or_reopens():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == 'half_open'
+
+    assert breaker.allow()
+    # Only one trial at a time
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+
+
+class RateLimited(StatusError):
+    def __init__(self, retry_after):
+        super().__init__(429)
+        self.response = type('Response', (), {'headers': {'retry-after': str(retry_after)}})()
+
+
+def test_retry_after_is_honored_in_full(monkeypatch):
+    slept = []
+    monkeypatch.setattr('src.utils.retry_policy.time.sleep', slept.append)
+    policy = RetryPolicy(max_attempts=2, max_delay=1.0)
+
+    assert policy.call("test", failing(RateLimited(12)), deadline=60) == "ok"
+    assert slept == [12.0]
+
+
+def test_retry_after_past_the_deadline_gives_up_at_once(monkeypatch):
+    slept = []
+    monkeypatch.setattr('src.utils.retry_policy.time.sleep', slept.append)
+    policy = RetryPolicy(max_attempts=4)
+    fn = failing(RateLimited(30))
+
+    with pytest.raises(LLMUnavailableError) as raised:
+        policy.call("test", fn, deadline=5)
+    assert raised.value.attempts == 1
+    assert slept == []
+    assert len(fn.timeouts) == 1
+
+
+def test_last_attempt_doesnt_wait_out_retry_after(monkeypatch):
+    slept = []
+    monkeypatch.setattr('src.utils.retry_policy.time.sleep', slept.append)
+    policy = RetryPolicy(max_attempts=1)
+
+    with pytest.raises(LLMUnavailableError):
+        policy.call("test", failing(RateLimited(2)), deadline=60)
+    assert slept == []
+
+
+def test_slot_wait_spends_the_deadline(monkeypatch):
+    from src.utils import models
+
+    monkeypatch.setattr(models, 'llm_concurrency', threading.BoundedSemaphore(1))
+    fn = failing()
+    models.llm_concurrency.acquire()
+    threading.Timer(0.2, models.llm_concurrency.release).start()
+
+    assert models._limited(fn)(5.0) == "ok"
+    assert fn.timeouts[0] <= 4.85
+
+
+def test_no_free_slot_before_the_deadline_gives_up_without_tripping_the_breaker(monkeypatch):
+    from src.utils import models
+
+    monkeypatch.setattr(models, 'llm_concurrency', threading.BoundedSemaphore(1))
+    models.llm_concurrency.acquire()
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+    fn = failing()
+
+    with pytest.raises(LLMUnavailableError):
+        RetryPolicy(max_attempts=3).call("test", models._limited(fn), breaker=breaker, deadline=0.1)
+    assert fn.timeouts == []
+    assert breaker.state == 'closed'
@@ -0,0 +1,69 @@
+import numpy as np
+
+from src.utils.lexical_prefilter import LexicalPrefilter, RankingPrefilter
+from src.utils.semantic_prefilter import HashingVectorizer, SemanticPrefilter, ProductVectorIndex, embed_product
+
+PRODUCT = {
+    'id': 'product-1',
+    'name': 'InvoiceFox',
+    'description': 'Invoicing and expense tracking for freelancers',
+    'target_audience': 'freelancers and contractors',
+    'problem_solved': 'clients paying invoices late',
+}
+
+POSTS = [
+    {'title': 'Best sourdough recipe', 'selftext': 'My starter is flat'},
+    {'title': 'Client has not paid my invoice in 90 days', 'selftext': 'Freelancer here, what can I do?'},
+    {'title': 'Weekend hiking trip', 'selftext': 'Any trails near Denver'},
+    {'title': 'How do you track expenses as a contractor?', 'selftext': 'Invoicing is a mess'},
+]
+
+
+def test_vectors_are_unit_length_and_stable():
+    vectors = HashingVectorizer(n_features=256).transform(["invoice reminders", "invoice reminders", ""])
+    assert np.allclose(np.linalg.norm(vectors[:2], axis=1), 1.0)
+    assert np.array_equal(vectors[0], vectors[1])
+    assert not vectors[2].any()
+
+
+def test_inflections_share_features():
+    vectorizer = HashingVectorizer()
+    invoicing, invoices, hiking = vectorizer.transform(["invoicing", "invoices", "hiking"])
+    assert invoicing @ invoices > invoicing @ hiking
+
+
+def test_relevant_posts_are_kept_in_input_order():
+    prefilter = SemanticPrefilter(PRODUCT, keep_fraction=0.5, min_keep=1)
+    assert prefilter.select(POSTS) == [1, 3]
+
+
+def test_min_keep_and_empty_batches():
+    prefilter = SemanticPrefilter(PRODUCT, keep_fraction=0.1, min_keep=5)
+    assert prefilter.select(POSTS) == [0, 1, 2, 3]
+    assert prefilter.select([]) == []
+
+
+def test_both_prefilters_share_the_keep_rule():
+    assert isinstance(SemanticPrefilter(PRODUCT), RankingPrefilter)
+    assert isinstance(LexicalPrefilter(PRODUCT), RankingPrefilter)
+
+    class Fixed(RankingPrefilter):
+        def score(self, posts):
+            return np.array([0.1, 0.9, 0.9, 0.5])
+
+    # Ties keep listing order
+    assert Fixed(keep_fraction=0.5, min_keep=1).select(POSTS) == [1, 2]
+    assert Fixed(keep_fraction=0.5, min_keep=3).select(POSTS) == [1, 2, 3]
+
+
+def test_product_vectors_follow_product_edits():
+    index = ProductVectorIndex()
+    first = index.get(PRODUCT)
+    assert index.get(PRODUCT) is first
+
+    edited = {**PRODUCT, 'problem_solved': 'tracking billable hours'}
+    assert np.allclose(index.get(edited), embed_product(edited))
+    assert index.stats()['products'] == 1
+
+    index.drop(PRODUCT['id'])
+    assert index.stats()['products'] == 0
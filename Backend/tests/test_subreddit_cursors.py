@@ -0,0 +1,44 @@
+from src.utils.subreddit_cursors import advance_subreddit_cursors, is_at_or_before_cursor
+
+
+def post(subreddit, created_utc):
+    return {'subreddit': subreddit, 'created_utc': created_utc, 'reddit_post_id': f"{subreddit}-{created_utc}"}
+
+
+def test_advances_to_newest_post_per_subreddit():
+    posts = [post('SaaS', 50), post('SaaS', 40), post('startups', 30)]
+    cursors = advance_subreddit_cursors({}, posts)
+    assert cursors == {
+        'saas': {'last_post_id': 'SaaS-50', 'last_created_utc': 50},
+        'startups': {'last_post_id': 'startups-30', 'last_created_utc': 30},
+    }
+
+
+def test_stops_below_oldest_unjudged_post():
+    posts = [post('SaaS', 50), post('SaaS', 40), post('SaaS', 30), post('SaaS', 20)]
+    # The batch holding the post at 40 failed
+    cursors = advance_subreddit_cursors({}, posts, judged_indexes=[0, 2, 3])
+    assert cursors['saas']['last_created_utc'] == 30
+
+
+def test_cursor_never_moves_back():
+    previous = {'saas': {'last_post_id': 'old', 'last_created_utc': 100}}
+    cursors = advance_subreddit_cursors(previous, [post('SaaS', 50)])
+    assert cursors['saas'] == previous['saas']
+    # The loaded cursors aren't modified
+    assert advance_subreddit_cursors(previous, [post('SaaS', 150)])['saas']['last_created_utc'] == 150
+    assert previous['saas']['last_created_utc'] == 100
+
+
+def test_unjudged_subreddit_keeps_its_cursor():
+    previous = {'saas': {'last_post_id': 'old', 'last_created_utc': 10}}
+    cursors = advance_subreddit_cursors(previous, [post('SaaS', 50)], judged_indexes=[])
+    assert cursors == previous
+
+
+def test_listing_stops_at_cursor():
+    cursor = {'last_post_id': 'abc', 'last_created_utc': 100}
+    assert is_at_or_before_cursor({'id': 'abc', 'created_utc': 200}, cursor)
+    assert is_at_or_before_cursor({'id': 'x', 'created_utc': 100}, cursor)
+    assert not is_at_or_before_cursor({'id': 'x', 'created_utc': 101}, cursor)
+    assert not is_at_or_before_cursor({'id': 'x', 'created_utc': 1}, None)
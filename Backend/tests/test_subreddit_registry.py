@@ -0,0 +1,85 @@
+import datetime
+
+import pytest
+
+from src.utils import subreddit_registry
+
+
+@pytest.fixture(autouse=True)
+def empty_registry(monkeypatch):
+    monkeypatch.setattr(subreddit_registry, '_entries', {})
+
+
+@pytest.fixture
+def reddit(monkeypatch):
+    """fetch_subreddit_metadata stand-in; statuses maps lowercased names to a status or an exception"""
+    statuses, fetched = {}, []
+
+    def fetch_subreddit_metadata(name):
+        fetched.append(name)
+        status = statuses.get(name.lower(), 'active')
+        if isinstance(status, Exception):
+            raise status
+        return {'status': status, 'subscribers': 1000 if status == 'active' else None, 'posts_per_day': 5.0}
+
+    monkeypatch.setattr(subreddit_registry, 'fetch_subreddit_metadata', fetch_subreddit_metadata)
+    return statuses, fetched
+
+
+def days_ago(days, aware=True):
+    checked = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
+    return (checked if aware else checked.replace(tzinfo=None)).isoformat()
+
+
+@pytest.mark.parametrize("entry, stale", [
+    ({'status': 'active', 'checked_at': days_ago(1)}, False),
+    ({'status': 'active', 'checked_at': days_ago(8)}, True),
+    # Naive timestamps are read as UTC instead of failing the comparison
+    ({'status': 'active', 'checked_at': days_ago(1, aware=False)}, False),
+    ({'status': 'private', 'checked_at': days_ago(8, aware=False)}, False),
+    ({'status': 'private', 'checked_at': days_ago(31)}, True),
+    ({'status': 'banned', 'checked_at': days_ago(365)}, False),
+    ({'status': 'active', 'checked_at': None}, True),
+    ({'status': 'active', 'checked_at': 'yesterday'}, True),
+])
+def test_is_stale(entry, stale):
+    assert subreddit_registry._is_stale(entry) is stale
+
+
+def test_clean_subreddit_name():
+    assert subreddit_registry.clean_subreddit_name(' r/SaaS/ ') == 'SaaS'
+    assert subreddit_registry.clean_subreddit_name('startups') == 'startups'
+
+
+def test_unusable_subreddits_are_filtered_and_remembered(fake_supabase, reddit):
+    statuses, fetched = reddit
+    statuses.update({'gone': 'not_found', 'secret': 'private'})
+
+    assert subreddit_registry.filter_live_subreddits(fake_supabase, ['r/SaaS', 'gone', 'secret']) == ['SaaS']
+    assert {row['subreddit']: row['status'] for row in fake_supabase.tables['subreddit_registry']} == {
+        'saas': 'active', 'gone': 'not_found', 'secret': 'private'
+    }
+
+    # A second call is served from the registry without asking Reddit again
+    assert subreddit_registry.filter_live_subreddits(fake_supabase, ['SaaS', 'gone']) == ['SaaS']
+    assert len(fetched) == 3
+
+
+def test_persisted_entries_are_loaded(fake_supabase, reddit):
+    _, fetched = reddit
+    fake_supabase.tables['subreddit_registry'] = [
+        {'subreddit': 'gone', 'status': 'banned', 'subscribers': None, 'posts_per_day': None, 'checked_at': days_ago(100)},
+        {'subreddit': 'saas', 'status': 'active', 'subscribers': 10, 'posts_per_day': 1.0, 'checked_at': days_ago(1, aware=False)},
+    ]
+
+    assert subreddit_registry.filter_live_subreddits(fake_supabase, ['SaaS', 'gone']) == ['SaaS']
+    assert fetched == []
+
+
+def test_transient_errors_keep_the_subreddit_for_now(fake_supabase, reddit):
+    statuses, fetched = reddit
+    statuses['flaky'] = RuntimeError("503")
+
+    assert subreddit_registry.filter_live_subreddits(fake_supabase, ['flaky']) == ['flaky']
+    subreddit_registry.filter_live_subreddits(fake_supabase, ['flaky'])
+    assert fetched == ['flaky', 'flaky']
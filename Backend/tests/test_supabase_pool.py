@@ -0,0 +1,82 @@
+import threading
+
+import httpx
+import pytest
+from flask import Flask
+
+from src.utils import supabase_pool
+from src.utils.supabase_pool import SupabasePool, get_supabase, get_supabase_pool, init_app
+
+
+class FakeClient:
+    def __init__(self, url, key, options=None):
+        self.url = url
+        self.options = options
+        statuses = iter([200, 503])
+        self.postgrest = type('PostgREST', (), {})()
+        self.postgrest.session = httpx.Client(
+            base_url=url, transport=httpx.MockTransport(lambda request: httpx.Response(next(statuses)))
+        )
+
+
+@pytest.fixture
+def created(monkeypatch):
+    clients = []
+
+    def create_client(url, key, options=None):
+        clients.append(FakeClient(url, key, options))
+        return clients[-1]
+
+    monkeypatch.setattr(supabase_pool, 'create_client', create_client)
+    return clients
+
+
+def test_one_client_is_shared_across_threads(created):
+    pool = SupabasePool('https://db.example', 'key')
+    handed_out = []
+    threads = [threading.Thread(target=lambda: handed_out.append(pool.client())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert all(client is created[0] for client in handed_out)
+    assert pool.stats()['clients_created'] == 1
+    assert pool.stats()['handouts'] == 8
+    assert created[0].options.postgrest_client_timeout == supabase_pool.SUPABASE_POSTGREST_TIMEOUT
+
+
+def test_forked_worker_builds_its_own_client(created, monkeypatch):
+    pool = SupabasePool('https://db.example', 'key')
+    parent = pool.client()
+
+    monkeypatch.setattr(supabase_pool.os, 'getpid', lambda: -1)
+    child = pool.client()
+
+    assert child is not parent
+    assert pool.client() is child
+    assert pool.stats()['pid'] == -1
+    assert pool.stats()['clients_created'] == 2
+
+
+def test_postgrest_requests_and_server_errors_are_counted(created):
+    pool = SupabasePool('https://db.example', 'key')
+    session = pool.client().postgrest.session
+    session.get('/rest/v1/leads')
+    session.get('/rest/v1/leads')
+
+    stats = pool.stats()
+    assert stats['postgrest_requests'] == 2
+    assert stats['postgrest_server_errors'] == 1
+
+
+def test_app_pool_is_used_inside_its_context(created):
+    app = Flask(__name__)
+    app.config['SUPABASE_URL'] = 'https://app-db.example'
+    init_app(app)
+
+    assert get_supabase_pool() is supabase_pool.default_pool
+    with app.app_context():
+        assert get_supabase_pool() is app.extensions[supabase_pool.POOL_EXTENSION]
+        assert get_supabase().url == 'https://app-db.example'